@@ -1,6 +1,20 @@
 from django.apps import AppConfig
+from django.core.signals import request_started
+from django.db.backends.signals import connection_created
 
 
 class CoreConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'core'
+
+    def ready(self):
+        from .db import check_connections, configure_sqlite
+        from .metrics import install_db_timer
+        from .querylog import install_query_logger
+        from .tracing import install_query_tracer
+
+        connection_created.connect(configure_sqlite)
+        connection_created.connect(install_query_logger)
+        connection_created.connect(install_db_timer)
+        connection_created.connect(install_query_tracer)
+        request_started.connect(check_connections)
@@ -0,0 +1,229 @@
+"""ASGI-приложение сайта и асинхронные views.
+
+В Django 2.2 нет ASGI, поэтому ASGIHandler переводит запрос ASGI в
+WSGI environ и выполняет обычное WSGI-приложение — middleware, сессии,
+CSRF — в пуле из ASGI_THREADS потоков; тело ответа отдаётся по мере
+чтения.
+
+Views, объявленные через async_view, — корутины. Поток обработчика
+передаёт корутину в цикл событий и ждёт её, а независимые запросы к
+базе внутри неё (gather) идут одновременно в пуле из
+ASGI_QUERY_THREADS потоков: страница ждёт самый долгий запрос, а не
+их сумму. Под WSGI и в тестах та же корутина выполняется в потоке
+запроса, gather вызывает функции по очереди, и view ведёт себя как
+обычный.
+
+Потоки пула держат свои соединения с базой открытыми, как поллер
+posts.live. Закрепление за основной базой (core.routers) переносится
+в них из потока запроса; SQL из пула в трассу запроса не попадает.
+"""
+import asyncio
+import contextvars
+import sys
+import tempfile
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from functools import wraps
+
+from django.conf import settings
+
+from .routers import is_pinned, pin_to_primary, unpin
+
+_local = threading.local()
+# (пул запросов, закреплён ли запрос за основной базой) для корутины
+# async_view; None — корутина выполняется под WSGI.
+_query_context = contextvars.ContextVar('query_context', default=None)
+
+
+async def run(function, *args, **kwargs):
+    """Вызывает блокирующую функцию в пуле запросов, под WSGI — сразу."""
+    context = _query_context.get()
+    if context is None:
+        return function(*args, **kwargs)
+    executor, pinned = context
+
+    def call():
+        if not pinned:
+            unpin()
+        try:
+            return function(*args, **kwargs)
+        finally:
+            pin_to_primary()
+    return await asyncio.get_event_loop().run_in_executor(executor, call)
+
+
+async def gather(*calls):
+    """Список результатов calls — функций без аргументов и корутин.
+
+    В цикле событий они выполняются одновременно, под WSGI — по очереди.
+    """
+    awaitables = [call if asyncio.iscoroutine(call) else run(call)
+                  for call in calls]
+    if _query_context.get() is not None:
+        return list(await asyncio.gather(*awaitables))
+    results = []
+    try:
+        for awaitable in awaitables:
+            results.append(await awaitable)
+    finally:
+        for awaitable in awaitables[len(results) + 1:]:
+            awaitable.close()
+    return results
+
+
+async def _run_with_context(coroutine, context):
+    _query_context.set(context)
+    return await coroutine
+
+
+def _run_inline(coroutine):
+    """Выполняет корутину, которая не ждёт ничего, кроме run и gather
+    под WSGI, — такая завершается за один шаг.
+    """
+    try:
+        coroutine.send(None)
+    except StopIteration as stop:
+        return stop.value
+    coroutine.close()
+    raise RuntimeError(f'{coroutine!r} ждёт вне цикла событий ASGI')
+
+
+def async_view(view):
+    """Django view из корутины view(request, *args, **kwargs)."""
+    @wraps(view)
+    def wrapper(request, *args, **kwargs):
+        # Ленивый пользователь загружается здесь, в потоке запроса:
+        # запрос к базе в цикле событий остановил бы все корутины.
+        if hasattr(request, 'user'):
+            request.user.is_authenticated
+        coroutine = view(request, *args, **kwargs)
+        loop = getattr(_local, 'loop', None)
+        if loop is None:
+            return _run_inline(coroutine)
+        context = (_local.query_executor, is_pinned())
+        return asyncio.run_coroutine_threadsafe(
+            _run_with_context(coroutine, context), loop).result()
+    return wrapper
+
+
+def wsgi_environ(scope, body):
+    server = scope.get('server') or ('localhost', 80)
+    environ = {
+        'REQUEST_METHOD': scope['method'],
+        'SCRIPT_NAME': scope.get('root_path', ''),
+        'PATH_INFO': scope['path'].encode().decode('latin1'),
+        'QUERY_STRING': scope.get('query_string', b'').decode('latin1'),
+        'SERVER_NAME': server[0],
+        'SERVER_PORT': str(server[1]),
+        'SERVER_PROTOCOL': f'HTTP/{scope.get("http_version", "1.1")}',
+        'wsgi.version': (1, 0),
+        'wsgi.url_scheme': scope.get('scheme', 'http'),
+        'wsgi.input': body,
+        'wsgi.errors': sys.stderr,
+        'wsgi.multithread': True,
+        'wsgi.multiprocess': True,
+        'wsgi.run_once': False,
+    }
+    if scope.get('client'):
+        environ['REMOTE_ADDR'] = scope['client'][0]
+    for name, value in scope.get('headers', ()):
+        key = name.decode('latin1').upper().replace('-', '_')
+        if key not in ('CONTENT_TYPE', 'CONTENT_LENGTH'):
+            key = f'HTTP_{key}'
+        value = value.decode('latin1')
+        environ[key] = f'{environ[key]},{value}' if key in environ else value
+    return environ
+
+
+async def read_body(receive):
+    """Тело запроса в файле (в памяти до FILE_UPLOAD_MAX_MEMORY_SIZE);
+    None, если клиент отключился.
+    """
+    body = tempfile.SpooledTemporaryFile(
+        settings.FILE_UPLOAD_MAX_MEMORY_SIZE)
+    while True:
+        message = await receive()
+        if message['type'] == 'http.disconnect':
+            body.close()
+            return None
+        body.write(message.get('body', b''))
+        if not message.get('more_body'):
+            body.seek(0)
+            return body
+
+
+class ASGIHandler:
+    """ASGI-приложение поверх WSGI-приложения сайта."""
+
+    def __init__(self, application, threads=None, query_threads=None):
+        self.application = application
+        self.executor = ThreadPoolExecutor(
+            threads or settings.ASGI_THREADS, 'asgi')
+        self.query_executor = ThreadPoolExecutor(
+            query_threads or settings.ASGI_QUERY_THREADS, 'asgi-query')
+
+    def close(self):
+        self.executor.shutdown()
+        self.query_executor.shutdown()
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] != 'http':
+            raise ValueError(f'ASGI-соединения {scope["type"]} '
+                             'не поддерживаются.')
+        body = await read_body(receive)
+        if body is None:
+            return
+        loop = asyncio.get_event_loop()
+        try:
+            status, headers, chunks = await loop.run_in_executor(
+                self.executor, self.handle, loop, wsgi_environ(scope, body))
+        finally:
+            body.close()
+        await send({'type': 'http.response.start', 'status': status,
+                    'headers': headers})
+        if isinstance(chunks, list):
+            await send({'type': 'http.response.body',
+                        'body': b''.join(chunks)})
+            return
+        try:
+            iterator = iter(chunks)
+            while True:
+                chunk = await loop.run_in_executor(
+                    self.executor, next, iterator, None)
+                if chunk is None:
+                    break
+                if chunk:
+                    await send({'type': 'http.response.body', 'body': chunk,
+                                'more_body': True})
+            await send({'type': 'http.response.body', 'body': b''})
+        finally:
+            if hasattr(chunks, 'close'):
+                await loop.run_in_executor(self.executor, chunks.close)
+
+    def handle(self, loop, environ):
+        """(статус, заголовки, тело) ответа WSGI-приложения.
+
+        Обычный ответ читается и закрывается здесь же, в потоке запроса,
+        чтобы request_finished закрыл соединения этого потока; потоковый
+        возвращается как есть.
+        """
+        started = {}
+
+        def start_response(status, headers, exc_info=None):
+            started['status'] = int(status.split(' ', 1)[0])
+            started['headers'] = [
+                (name.lower().encode('latin1'), value.encode('latin1'))
+                for name, value in headers]
+
+        _local.loop, _local.query_executor = loop, self.query_executor
+        try:
+            response = self.application(environ, start_response)
+            if getattr(response, 'streaming', True):
+                return started['status'], started['headers'], response
+            try:
+                chunks = list(response)
+            finally:
+                response.close()
+            return started['status'], started['headers'], chunks
+        finally:
+            _local.loop = _local.query_executor = None
@@ -0,0 +1,36 @@
+from django.core.cache.backends.locmem import LocMemCache
+
+from core.metrics import count_cache, measure
+
+MISSING = object()
+
+
+class InstrumentedCacheMixin:
+    """Считает попадания в кеш и время обращений к нему, см. core.metrics.
+    """
+
+    def get(self, key, default=None, version=None):
+        with measure('cache', 'cache.get'):
+            value = super().get(key, MISSING, version)
+        count_cache(value is not MISSING)
+        return default if value is MISSING else value
+
+    def set(self, *args, **kwargs):
+        with measure('cache', 'cache.set'):
+            return super().set(*args, **kwargs)
+
+    def add(self, *args, **kwargs):
+        with measure('cache', 'cache.add'):
+            return super().add(*args, **kwargs)
+
+    def delete(self, *args, **kwargs):
+        with measure('cache', 'cache.delete'):
+            return super().delete(*args, **kwargs)
+
+    def incr(self, *args, **kwargs):
+        with measure('cache', 'cache.incr'):
+            return super().incr(*args, **kwargs)
+
+
+class InstrumentedLocMemCache(InstrumentedCacheMixin, LocMemCache):
+    pass
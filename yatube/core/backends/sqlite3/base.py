@@ -0,0 +1,19 @@
+from django.db.backends.sqlite3 import base
+
+
+class DatabaseWrapper(base.DatabaseWrapper):
+    """SQLite-бэкенд, умеющий начинать транзакцию с блокировки записи.
+
+    Отложенная транзакция, которая сначала читает, а потом пишет, при
+    конкуренции сразу получает `database is locked`: SQLite не ждёт по
+    busy timeout, чтобы избежать взаимной блокировки. BEGIN IMMEDIATE
+    берёт блокировку записи в начале и честно ждёт своей очереди.
+    """
+
+    begin_immediate = False
+
+    def _start_transaction_under_autocommit(self):
+        if self.begin_immediate:
+            self.cursor().execute('BEGIN IMMEDIATE')
+        else:
+            super()._start_transaction_under_autocommit()
@@ -0,0 +1,49 @@
+from django.contrib.staticfiles.storage import ManifestStaticFilesStorage
+from django.core.files.base import ContentFile
+
+from core.compression import available_encodings, compress
+
+# Сжимаются только текстовые форматы: картинки и шрифты уже сжаты.
+COMPRESSIBLE = ('.css', '.js', '.map', '.svg', '.html', '.txt', '.json',
+                '.xml', '.ico')
+MIN_SIZE = 256
+
+
+# Статика сжимается один раз, поэтому с наибольшей степенью.
+LEVELS = {'gzip': 9, 'br': 11}
+EXTENSIONS = {'gzip': '.gz', 'br': '.br'}
+
+
+class CompressedManifestStaticFilesStorage(ManifestStaticFilesStorage):
+    """Хешированные имена с манифестом плюс заранее сжатые копии.
+
+    После хеширования collectstatic кладёт рядом с каждым текстовым
+    файлом file.gz и, если установлен brotli, file.br — только когда
+    сжатая копия заметно меньше. Раздаёт их core.static.StaticFiles.
+    """
+
+    def post_process(self, paths, dry_run=False, **options):
+        yield from super().post_process(paths, dry_run, **options)
+        if dry_run:
+            return
+        names = set(paths)
+        names.update(self.hashed_files.values())
+        for name in sorted(names):
+            if not name.endswith(COMPRESSIBLE):
+                continue
+            for compressed_name in self.compress(name):
+                yield name, compressed_name, True
+
+    def compress(self, name):
+        with self.open(name) as original:
+            data = original.read()
+        if len(data) < MIN_SIZE:
+            return
+        for encoding in available_encodings():
+            compressed = compress(data, encoding, LEVELS[encoding])
+            compressed_name = name + EXTENSIONS[encoding]
+            if self.exists(compressed_name):
+                self.delete(compressed_name)
+            if len(compressed) < len(data) * 0.95:
+                self._save(compressed_name, ContentFile(compressed))
+                yield compressed_name
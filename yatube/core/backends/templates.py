@@ -0,0 +1,26 @@
+from django.template import TemplateDoesNotExist
+from django.template.backends.django import DjangoTemplates, Template, reraise
+
+from core.metrics import measure
+
+
+class InstrumentedTemplate(Template):
+    def render(self, context=None, request=None):
+        name = self.template.origin.template_name or '<string>'
+        with measure('template', f'template {name}'):
+            return super().render(context, request)
+
+
+class InstrumentedDjangoTemplates(DjangoTemplates):
+    """Шаблоны Django, время рендера которых идёт в метрики."""
+
+    def from_string(self, template_code):
+        return InstrumentedTemplate(
+            self.engine.from_string(template_code), self)
+
+    def get_template(self, template_name):
+        try:
+            return InstrumentedTemplate(
+                self.engine.get_template(template_name), self)
+        except TemplateDoesNotExist as exc:
+            reraise(exc, self)
@@ -0,0 +1,9 @@
+from sorl.thumbnail.base import ThumbnailBackend
+
+from core.metrics import measure
+
+
+class InstrumentedThumbnailBackend(ThumbnailBackend):
+    def get_thumbnail(self, file_, geometry_string, **options):
+        with measure('thumbnail', 'thumbnail', geometry=geometry_string):
+            return super().get_thumbnail(file_, geometry_string, **options)
@@ -0,0 +1,118 @@
+import json
+import resource
+import subprocess
+import threading
+import time
+
+
+def percentile(values, percent):
+    """Перцентиль по методу ближайшего ранга; 0 для пустой выборки."""
+    if not values:
+        return 0
+    ordered = sorted(values)
+    rank = max(0, round(percent / 100 * len(ordered)) - 1)
+    return ordered[min(rank, len(ordered) - 1)]
+
+
+def peak_rss_kb():
+    """Пиковый RSS всего процесса с его запуска, КиБ (на Linux).
+
+    ru_maxrss не убывает, поэтому для нескольких замеров подряд это
+    максимум по всем уже выполненным, а не память последнего.
+    """
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+
+def run_concurrently(make_worker, requests, concurrency):
+    """Выполняет `requests` вызовов в `concurrency` потоках.
+
+    make_worker() вызывается в каждом потоке и возвращает функцию одного
+    запроса; та возвращает число SQL-запросов или None. Результат —
+    сводка по задержкам, пропускной способности и числу запросов к БД.
+    """
+    latencies, queries, errors = [], [], []
+    lock = threading.Lock()
+    remaining = [requests]
+
+    def worker():
+        request = make_worker()
+        while True:
+            with lock:
+                if remaining[0] <= 0:
+                    return
+                remaining[0] -= 1
+            start = time.perf_counter()
+            try:
+                count = request()
+            except Exception as error:
+                with lock:
+                    errors.append(repr(error))
+                continue
+            elapsed = time.perf_counter() - start
+            with lock:
+                latencies.append(elapsed)
+                if count is not None:
+                    queries.append(count)
+
+    threads = [threading.Thread(target=worker) for _ in range(concurrency)]
+    start = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - start
+    return {
+        'requests': len(latencies),
+        'errors': len(errors),
+        'first_error': errors[0] if errors else None,
+        'throughput': len(latencies) / elapsed if elapsed else 0,
+        'p50_ms': percentile(latencies, 50) * 1000,
+        'p95_ms': percentile(latencies, 95) * 1000,
+        'p99_ms': percentile(latencies, 99) * 1000,
+        'queries': sum(queries) / len(queries) if queries else None,
+        'peak_rss_kb': peak_rss_kb(),
+    }
+
+
+def current_commit():
+    try:
+        return subprocess.run(
+            ['git', 'rev-parse', '--short', 'HEAD'],
+            capture_output=True, text=True, check=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def write_results(path, results, **meta):
+    meta.setdefault('commit', current_commit())
+    meta.setdefault('date', time.strftime('%Y-%m-%dT%H:%M:%S'))
+    with open(path, 'w') as file:
+        json.dump({'meta': meta, 'results': results}, file,
+                  indent=2, ensure_ascii=False)
+
+
+def compare_results(baseline_path, results, threshold):
+    """Список регрессий относительно сохранённого baseline.
+
+    Регрессия — рост p95 или падение пропускной способности больше,
+    чем на долю threshold.
+    """
+    with open(baseline_path) as file:
+        baseline = json.load(file)['results']
+    regressions = []
+    for group, cases in results.items():
+        for name, current in cases.items():
+            previous = baseline.get(group, {}).get(name)
+            if not previous:
+                continue
+            if current['p95_ms'] > previous['p95_ms'] * (1 + threshold):
+                regressions.append(
+                    f'{group}/{name}: p95 {previous["p95_ms"]:.2f} → '
+                    f'{current["p95_ms"]:.2f} мс')
+            if (current['throughput']
+                    < previous['throughput'] * (1 - threshold)):
+                regressions.append(
+                    f'{group}/{name}: {previous["throughput"]:.1f} → '
+                    f'{current["throughput"]:.1f} запр/с')
+    return regressions
@@ -0,0 +1,156 @@
+"""Сжатие ответов gzip и brotli.
+
+CompressionMiddleware сжимает HTML, JSON, CSS, JS и прочие текстовые
+ответы, если клиент согласен на gzip или br (brotli — если установлен
+пакет brotli). Картинки, видео, архивы и ответы с Content-Encoding
+не трогаются.
+
+Обычный ответ сжимается целиком. Готовое сжатое тело кладётся в LRU
+на COMPRESSION_CACHE_SIZE байт по хешу исходного тела: одинаковые
+страницы — закешированные целиком или просто совпавшие у анонимов —
+не сжимаются заново: хеш тела в 4–9 раз дешевле gzip -6. Потоковый
+ответ сжимается gzip по кускам со сбросом после каждого, чтобы клиент
+получал данные сразу.
+
+Сжатие HTTPS-ответов с секретами уязвимо к BREACH; CSRF-токен Django
+маскируется на каждый ответ, других секретов в страницах нет.
+Стоимость уровней сжатия показывает `manage.py bench_compression`.
+"""
+import gzip
+import hashlib
+import threading
+import zlib
+from collections import OrderedDict
+
+from django.conf import settings
+from django.utils.cache import patch_vary_headers
+
+from .static import accepted_encodings
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+COMPRESSIBLE_TYPES = ('text/', 'application/json', 'application/javascript',
+                      'application/xml', 'image/svg+xml')
+
+
+def compress(data, encoding, level):
+    if encoding == 'br':
+        return brotli.compress(data, quality=level)
+    return gzip.compress(data, level, mtime=0)
+
+
+def available_encodings():
+    """Кодировки в порядке предпочтения."""
+    return ('br', 'gzip') if brotli is not None else ('gzip',)
+
+
+def compress_stream(chunks, level):
+    compressor = zlib.compressobj(level, zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+    for chunk in chunks:
+        data = compressor.compress(chunk) + compressor.flush(zlib.Z_SYNC_FLUSH)
+        if data:
+            yield data
+    yield compressor.flush()
+
+
+class CompressedCache:
+    """LRU сжатых тел, ограниченный суммарным размером в байтах."""
+
+    def __init__(self, size):
+        self.size = size
+        self.used = 0
+        self.items = OrderedDict()
+        self.lock = threading.Lock()
+        self.hits = self.misses = 0
+
+    def get(self, key):
+        with self.lock:
+            value = self.items.get(key)
+            if value is None:
+                self.misses += 1
+                return None
+            self.items.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def set(self, key, value):
+        if len(value) > self.size:
+            return
+        with self.lock:
+            previous = self.items.pop(key, None)
+            if previous is not None:
+                self.used -= len(previous)
+            self.items[key] = value
+            self.used += len(value)
+            while self.used > self.size:
+                _, evicted = self.items.popitem(last=False)
+                self.used -= len(evicted)
+
+    def clear(self):
+        with self.lock:
+            self.items.clear()
+            self.used = 0
+            self.hits = self.misses = 0
+
+
+compressed_cache = CompressedCache(settings.COMPRESSION_CACHE_SIZE)
+
+
+def compress_cached(content, encoding, level):
+    key = (hashlib.blake2b(content, digest_size=16).digest(), encoding,
+           level)
+    compressed = compressed_cache.get(key)
+    if compressed is None:
+        compressed = compress(content, encoding, level)
+        compressed_cache.set(key, compressed)
+    return compressed
+
+
+def choose_encoding(request, streaming=False):
+    """Лучшая из принятых клиентом кодировок; поток сжимается только
+    gzip.
+    """
+    accepted = accepted_encodings(request.META.get('HTTP_ACCEPT_ENCODING',
+                                                   ''))
+    for encoding in ('gzip',) if streaming else available_encodings():
+        if encoding in accepted:
+            return encoding
+    return None
+
+
+class CompressionMiddleware:
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        response = self.get_response(request)
+        if (response.has_header('Content-Encoding')
+                or response.has_header('Content-Range')
+                or not response.get('Content-Type', '').startswith(
+                    COMPRESSIBLE_TYPES)):
+            return response
+        patch_vary_headers(response, ('Accept-Encoding',))
+        encoding = choose_encoding(request, response.streaming)
+        if encoding is None:
+            return response
+        level = settings.COMPRESSION_LEVELS[encoding]
+        if response.streaming:
+            response.streaming_content = compress_stream(
+                response.streaming_content, level)
+            del response['Content-Length']
+        else:
+            if len(response.content) < settings.COMPRESSION_MIN_LENGTH:
+                return response
+            compressed = compress_cached(response.content, encoding, level)
+            if len(compressed) >= len(response.content):
+                return response
+            response.content = compressed
+            response['Content-Length'] = str(len(compressed))
+        etag = response.get('ETag')
+        if etag and etag.startswith('"'):
+            response['ETag'] = 'W/' + etag
+        response['Content-Encoding'] = encoding
+        return response
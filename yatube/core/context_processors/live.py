@@ -0,0 +1,7 @@
+from django.conf import settings
+
+
+def live_url(request):
+    return {
+        'live_url': settings.LIVE_URL
+    }
@@ -0,0 +1,15 @@
+from posts.notifications import unread_count
+
+
+def unread_notifications(request):
+    """Число непрочитанных уведомлений; считается, только если шаблон
+    его выводит.
+    """
+    def count():
+        if not request.user.is_authenticated:
+            return 0
+        return unread_count(request.user.id)
+
+    return {
+        'unread_notifications': count
+    }
@@ -0,0 +1,45 @@
+import threading
+from contextlib import contextmanager
+
+from django.conf import settings
+from django.db import connections, transaction
+
+_write_lock = threading.Lock()
+
+
+def configure_sqlite(sender, connection, **kwargs):
+    """Применяет SQLITE_PRAGMAS к каждому новому соединению с SQLite."""
+    if connection.vendor != 'sqlite':
+        return
+    with connection.cursor() as cursor:
+        for name, value in settings.SQLITE_PRAGMAS.items():
+            cursor.execute(f'PRAGMA {name} = {value}')
+
+
+def check_connections(sender, **kwargs):
+    """Закрывает постоянные соединения, которые перестали отвечать."""
+    for connection in connections.all():
+        if connection.connection is not None and not connection.is_usable():
+            connection.close()
+
+
+@contextmanager
+def serialized_write():
+    """Транзакция записи, по одной пишущей за раз в процессе.
+
+    SQLite допускает одного писателя; очередь на блокировке избавляет
+    потоки процесса от борьбы за неё и ошибок `database is locked`.
+    Между процессами запись разводит busy timeout: транзакция начинается
+    с BEGIN IMMEDIATE (см. core.backends.sqlite3). Оборачивайте только
+    сами изменения в базе: чтения и отрисовка шаблонов под блокировкой
+    задерживают всех остальных писателей.
+    """
+    connection = transaction.get_connection()
+    with _write_lock:
+        connection.begin_immediate = True
+        try:
+            with transaction.atomic():
+                connection.begin_immediate = False
+                yield
+        finally:
+            connection.begin_immediate = False
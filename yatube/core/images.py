@@ -0,0 +1,200 @@
+"""Картинки нужного размера по подписанным URL.
+
+`/img/<подпись>/<ширина>x<высота>/<путь в MEDIA_ROOT>` отдаёт картинку,
+обрезанную по центру до заданного размера (как sorl-thumbnail с
+crop="center" upscale=True). URL строит url() или тег
+`{% resized_url post.image 960 339 %}`; подпись — HMAC от SECRET_KEY,
+так что размеры задаёт только сам сайт, и перебором размеров диск
+не забить.
+
+Первый запрос сжимает картинку в пуле процессов (IMAGE_WORKERS, 0 —
+в процессе запроса); одновременные запросы одной картинки ждут одну
+задачу. Если рабочий процесс умер (например, его убил OOM killer), пул
+ломается целиком: его задачи завершаются BrokenProcessPool (ответ 503),
+а пул заменяется новым, так что следующие запросы снова сжимаются.
+
+Результат ложится в MEDIA_ROOT/IMAGE_CACHE_PREFIX, разложенный по
+подкаталогам по хешу; имя учитывает mtime исходника, так что замена
+файла даёт новую картинку. Дальше файл отдаётся как медиа, без
+копирования в Python (см. core.views.serve_file).
+
+Кеш ограничен IMAGE_CACHE_SIZE байт: процесс считает, сколько дописал,
+и при переполнении удаляет давно не использованные файлы, пока не
+останется 90%. Давность — mtime, который обновляется при попадании
+не чаще раза в IMAGE_CACHE_TOUCH секунд. `manage.py prune_images`
+делает то же по расписанию.
+"""
+import hashlib
+import os
+import threading
+import time
+from concurrent.futures import Future, ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+from django.conf import settings
+from django.urls import reverse
+from django.utils._os import safe_join
+from django.utils.crypto import constant_time_compare, salted_hmac
+from PIL import Image, ImageOps
+
+SALT = 'core.images'
+
+
+def signature(path, width, height):
+    return salted_hmac(SALT, f'{width}x{height}/{path}').hexdigest()[:16]
+
+
+def check_signature(value, path, width, height):
+    return constant_time_compare(value, signature(path, width, height))
+
+
+def url(path, width, height):
+    return reverse('image', args=[signature(path, width, height),
+                                  width, height, path])
+
+
+def resize(source, target, width, height, quality):
+    """Пишет в target картинку width x height; возвращает её размер."""
+    with Image.open(source) as image:
+        image = ImageOps.exif_transpose(image).convert('RGB')
+    image = ImageOps.fit(image, (width, height), Image.LANCZOS)
+    temporary = f'{target}.{os.getpid()}.tmp'
+    image.save(temporary, 'JPEG', quality=quality, optimize=True)
+    os.replace(temporary, target)
+    return os.path.getsize(target)
+
+
+def cached_files(root):
+    for directory, _, names in os.walk(root):
+        for name in names:
+            path = os.path.join(directory, name)
+            try:
+                stat = os.stat(path)
+            except FileNotFoundError:
+                continue
+            yield path, stat.st_size, stat.st_mtime
+
+
+def evict(root, limit):
+    """Удаляет самые старые файлы, пока кеш больше 90% limit.
+
+    Возвращает оставшийся размер кеша.
+    """
+    files = sorted(cached_files(root), key=lambda file: file[2])
+    total = sum(size for _, size, _ in files)
+    for path, size, _ in files:
+        if total <= limit * 0.9:
+            break
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
+        total -= size
+    return total
+
+
+class ResizeCache:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.pending = {}
+        self.pool = None
+        self.usage = None
+        self.evicting = False
+
+    @property
+    def root(self):
+        return os.path.join(settings.MEDIA_ROOT,
+                            settings.IMAGE_CACHE_PREFIX)
+
+    def name(self, path, mtime, width, height):
+        key = hashlib.sha256(
+            f'{path}\0{mtime}\0{width}x{height}'.encode()).hexdigest()[:32]
+        return (f'{settings.IMAGE_CACHE_PREFIX}{key[:2]}/{key[2:4]}/'
+                f'{key}.jpg')
+
+    def resized(self, path, width, height):
+        """Путь картинки в MEDIA_ROOT; сжимает её при первом запросе.
+
+        Исключения OSError и ValueError — исходника нет или это
+        не картинка.
+        """
+        source = safe_join(settings.MEDIA_ROOT, path)
+        name = self.name(path, os.stat(source).st_mtime_ns, width, height)
+        target = os.path.join(settings.MEDIA_ROOT, name)
+        try:
+            mtime = os.stat(target).st_mtime
+        except FileNotFoundError:
+            pass
+        else:
+            if time.time() - mtime > settings.IMAGE_CACHE_TOUCH:
+                os.utime(target)
+            return name
+        with self.lock:
+            future = self.pending.get(name)
+            submitted = future is None
+            if submitted:
+                os.makedirs(os.path.dirname(target), exist_ok=True)
+                future = self.submit(source, target, width, height)
+                self.pending[name] = future
+        if submitted:
+            future.add_done_callback(
+                lambda future: self.finished(name, future))
+        future.result(settings.IMAGE_RESIZE_TIMEOUT)
+        return name
+
+    def submit(self, source, target, width, height):
+        arguments = (source, target, width, height, settings.IMAGE_QUALITY)
+        if not settings.IMAGE_WORKERS:
+            future = Future()
+            try:
+                future.set_result(resize(*arguments))
+            except Exception as error:
+                future.set_exception(error)
+            return future
+        if self.pool is None:
+            self.pool = ProcessPoolExecutor(settings.IMAGE_WORKERS)
+        try:
+            return self.pool.submit(resize, *arguments)
+        except BrokenProcessPool:
+            self.drop_pool()
+            self.pool = ProcessPoolExecutor(settings.IMAGE_WORKERS)
+            return self.pool.submit(resize, *arguments)
+
+    def drop_pool(self):
+        if self.pool is not None:
+            self.pool.shutdown(wait=False)
+            self.pool = None
+
+    def finished(self, name, future):
+        with self.lock:
+            self.pending.pop(name, None)
+            error = future.exception()
+            if isinstance(error, BrokenProcessPool):
+                self.drop_pool()
+            if error is not None:
+                return
+            counted = self.usage is not None
+            if counted:
+                self.usage += future.result()
+        # Каталог кеша обходится без блокировки: отправка других
+        # картинок его не ждёт.
+        if not counted:
+            usage = sum(size for _, size, _ in cached_files(self.root))
+            with self.lock:
+                if self.usage is None:
+                    self.usage = usage
+                else:
+                    self.usage += future.result()
+        with self.lock:
+            if self.evicting or self.usage <= settings.IMAGE_CACHE_SIZE:
+                return
+            self.evicting = True
+        try:
+            usage = evict(self.root, settings.IMAGE_CACHE_SIZE)
+            with self.lock:
+                self.usage = usage
+        finally:
+            self.evicting = False
+
+
+cache = ResizeCache()
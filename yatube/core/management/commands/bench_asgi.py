@@ -0,0 +1,146 @@
+import asyncio
+import io
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.core.handlers.wsgi import WSGIHandler
+from django.core.management.base import BaseCommand
+from django.test import Client, override_settings
+
+from core.asgi import ASGIHandler, wsgi_environ
+from core.bench import percentile
+from core.management.commands import bench_views
+
+VIEWS = ('index', 'group_list', 'profile', 'post_detail', 'follow_index')
+
+
+async def drive(request, requests, concurrency):
+    """Выполняет `requests` корутин request() по `concurrency` сразу.
+
+    Задержка считается вместе с ожиданием свободного потока, как у
+    клиента перед сервером.
+    """
+    latencies, errors = [], []
+    remaining = [requests]
+
+    async def client():
+        while remaining[0] > 0:
+            remaining[0] -= 1
+            start = time.perf_counter()
+            try:
+                await request()
+            except Exception as error:
+                errors.append(repr(error))
+                continue
+            latencies.append(time.perf_counter() - start)
+
+    start = time.perf_counter()
+    await asyncio.gather(*(client() for _ in range(concurrency)))
+    elapsed = time.perf_counter() - start
+    return {
+        'throughput': len(latencies) / elapsed if elapsed else 0,
+        'p50_ms': percentile(latencies, 50) * 1000,
+        'p95_ms': percentile(latencies, 95) * 1000,
+        'errors': len(errors),
+        'first_error': errors[0] if errors else None,
+    }
+
+
+class Command(BaseCommand):
+    help = ('Пропускная способность страниц чтения под WSGI и ASGI при '
+            'одном бюджете потоков: WSGIHandler в --threads потоках '
+            'против core.asgi.ASGIHandler с теми же --threads потоками '
+            'обработчика, чьи async views выполняют независимые запросы '
+            'к базе одновременно в пуле --query-threads. Запросы идут '
+            'в процессе, без сети, --concurrency клиентов сразу. '
+            'Запускайте на базе, заполненной generate_dataset.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--requests', type=int, default=200)
+        parser.add_argument('--concurrency', type=int, default=32)
+        parser.add_argument('--threads', type=int,
+                            default=settings.ASGI_THREADS)
+        parser.add_argument('--query-threads', type=int,
+                            default=settings.ASGI_QUERY_THREADS)
+        parser.add_argument('--views', nargs='+', choices=VIEWS,
+                            default=VIEWS)
+
+    def handle(self, *args, **options):
+        with override_settings(DEBUG=False, RATE_LIMITS={}):
+            self.run(options)
+
+    def run(self, options):
+        targets = bench_views.Command()
+        urls = targets.targets()
+        client = Client()
+        client.force_login(targets.reader)
+        cookie = '; '.join(f'{name}={morsel.value}'
+                           for name, morsel in client.cookies.items())
+        wsgi = WSGIHandler()
+        wsgi_pool = ThreadPoolExecutor(options['threads'])
+        asgi = ASGIHandler(wsgi, options['threads'],
+                           options['query_threads'])
+        self.stdout.write(
+            f'Потоков обработчика: {options["threads"]}, пул запросов '
+            f'ASGI: {options["query_threads"]}, клиентов: '
+            f'{options["concurrency"]}')
+        try:
+            for name in options['views']:
+                _, url = urls[name]
+                scope = {
+                    'type': 'http', 'method': 'GET', 'path': url,
+                    'query_string': b'',
+                    'headers': [(b'cookie', cookie.encode())],
+                    'client': ('127.0.0.1', 50000),
+                    'server': ('127.0.0.1', 80),
+                }
+                results = {
+                    'wsgi': asyncio.run(drive(
+                        lambda: self.wsgi_request(wsgi, wsgi_pool, scope),
+                        options['requests'], options['concurrency'])),
+                    'asgi': asyncio.run(drive(
+                        lambda: self.asgi_request(asgi, scope),
+                        options['requests'], options['concurrency'])),
+                }
+                for mode, result in results.items():
+                    self.report(name, mode, result)
+        finally:
+            wsgi_pool.shutdown()
+            asgi.close()
+
+    async def wsgi_request(self, wsgi, pool, scope):
+        def request():
+            started = {}
+
+            def start_response(status, headers, exc_info=None):
+                started['status'] = status
+
+            response = wsgi(wsgi_environ(scope, io.BytesIO()),
+                            start_response)
+            try:
+                b''.join(response)
+            finally:
+                response.close()
+            if not started['status'].startswith('200'):
+                raise RuntimeError(f'{scope["path"]}: {started["status"]}')
+        await asyncio.get_event_loop().run_in_executor(pool, request)
+
+    async def asgi_request(self, asgi, scope):
+        messages = []
+
+        async def receive():
+            return {'type': 'http.request', 'body': b''}
+
+        async def send(message):
+            messages.append(message)
+
+        await asgi(scope, receive, send)
+        if messages[0]['status'] != 200:
+            raise RuntimeError(f'{scope["path"]}: {messages[0]["status"]}')
+
+    def report(self, name, mode, result):
+        self.stdout.write(
+            f'{name:>13} {mode}: {result["throughput"]:7.1f} запр/с  '
+            f'p50 {result["p50_ms"]:7.2f}  p95 {result["p95_ms"]:7.2f} мс  '
+            f'ошибок {result["errors"]}')
@@ -0,0 +1,75 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db.models import Count
+from django.test import Client, override_settings
+from django.urls import reverse
+
+from core.compression import (available_encodings, compress,
+                              compress_cached, compressed_cache)
+from posts.models import Group, Post, User
+
+LEVELS = {'gzip': (1, 6, 9), 'br': (1, 5, 11)}
+
+
+def timed(function, repeat):
+    start = time.perf_counter()
+    for _ in range(repeat):
+        result = function()
+    return result, (time.perf_counter() - start) / repeat
+
+
+class Command(BaseCommand):
+    help = ('Стоимость сжатия страниц ленты: время CPU на уровнях gzip '
+            'и brotli против сэкономленных байт, и цена повторной '
+            'страницы из кеша сжатых тел. Запускайте на базе, '
+            'заполненной generate_dataset.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--repeat', type=int, default=20)
+
+    def handle(self, *args, **options):
+        repeat = options['repeat']
+        for name, content in self.pages():
+            self.stdout.write(f'{name}: {len(content) / 1024:.1f} КиБ')
+            for encoding in available_encodings():
+                for level in LEVELS[encoding]:
+                    compressed, elapsed = timed(
+                        lambda: compress(content, encoding, level), repeat)
+                    saved = 1 - len(compressed) / len(content)
+                    self.stdout.write(
+                        f'  {encoding:>4} {level:>2}: '
+                        f'{len(compressed) / 1024:6.1f} КиБ, '
+                        f'экономия {saved:4.0%}, '
+                        f'{elapsed * 1000:6.2f} мс, '
+                        f'{len(content) / elapsed / 2 ** 20:6.1f} МиБ/с')
+                compressed_cache.clear()
+                compress_cached(content, encoding, LEVELS[encoding][1])
+                _, elapsed = timed(
+                    lambda: compress_cached(content, encoding,
+                                            LEVELS[encoding][1]),
+                    repeat)
+                self.stdout.write(
+                    f'  {encoding:>4} из кеша: {elapsed * 1e6:6.1f} мкс')
+        compressed_cache.clear()
+
+    def pages(self):
+        group = Group.objects.annotate(
+            total=Count('posts')).order_by('-total').first()
+        author = User.objects.annotate(
+            total=Count('posts')).order_by('-total').first()
+        post = Post.objects.annotate(
+            total=Count('comments')).order_by('-total').first()
+        if not (group and author and post):
+            raise CommandError(
+                'База пуста, сначала запустите generate_dataset.')
+        client = Client()
+        urls = {
+            'index': reverse('posts:index'),
+            'group_list': reverse('posts:group_list', args=[group.slug]),
+            'profile': reverse('posts:profile', args=[author.username]),
+            'post_detail': reverse('posts:post_detail', args=[post.id]),
+        }
+        with override_settings(DEBUG=False):
+            for name, url in urls.items():
+                yield name, client.get(url).content
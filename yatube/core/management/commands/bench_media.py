@@ -0,0 +1,95 @@
+import os
+import tempfile
+import threading
+from wsgiref.simple_server import make_server
+
+import requests
+from django.conf import settings
+from django.core.handlers.wsgi import WSGIHandler
+from django.core.management.base import BaseCommand
+from django.test import override_settings
+from django.urls import path
+from django.views.static import serve
+
+from core.bench import run_concurrently
+from core.management.commands.bench_views import (QuietHandler,
+                                                  ThreadingWSGIServer)
+from core.views import media
+
+# Свой urlconf: отладочный static.serve и core.views.media рядом.
+urlpatterns = [
+    path('debug/<path:path>', serve,
+         {'document_root': settings.MEDIA_ROOT}),
+    path('media/<path:path>', media),
+]
+
+FILES = {
+    'thumbnail': ('cache/ab/cd/thumb.jpg', 50 * 1024),
+    'image': ('posts/image.jpg', 5 * 1024 * 1024),
+}
+
+
+class Command(BaseCommand):
+    help = ('Пропускная способность раздачи медиа: core.views.media '
+            'против отладочного django.views.static.serve, целые файлы '
+            'и диапазоны, через HTTP.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--requests', type=int, default=200)
+        parser.add_argument('--concurrency', type=int, default=8)
+
+    def handle(self, *args, **options):
+        with tempfile.TemporaryDirectory() as root:
+            for name, size in FILES.values():
+                os.makedirs(os.path.join(root, os.path.dirname(name)),
+                            exist_ok=True)
+                with open(os.path.join(root, name), 'wb') as file:
+                    file.write(os.urandom(size))
+            urlpatterns[0].default_args['document_root'] = root
+            with override_settings(DEBUG=False, MEDIA_ROOT=root,
+                                   ROOT_URLCONF=__name__):
+                self.run(options)
+
+    def run(self, options):
+        server = make_server('127.0.0.1', 0, WSGIHandler(),
+                             ThreadingWSGIServer, QuietHandler)
+        thread = threading.Thread(target=server.serve_forever, daemon=True)
+        thread.start()
+        base_url = f'http://127.0.0.1:{server.server_port}'
+        cases = []
+        for label, (name, _) in FILES.items():
+            cases += [(label, name, None), (f'{label} range', name,
+                                            'bytes=0-65535')]
+        try:
+            for label, name, byte_range in cases:
+                for prefix in ('debug', 'media'):
+                    self.measure(label, prefix, f'{base_url}/{prefix}/{name}',
+                                 byte_range, options)
+            # Тело отдал бы nginx: остаётся только цена ответа Django.
+            with override_settings(MEDIA_SENDFILE_HEADER='X-Accel-Redirect'):
+                name, _ = FILES['image']
+                self.measure('image', 'accel', f'{base_url}/media/{name}',
+                             None, options)
+        finally:
+            server.shutdown()
+            server.server_close()
+
+    def measure(self, label, prefix, url, byte_range, options):
+        result = run_concurrently(lambda: self.worker(url, byte_range),
+                                  options['requests'],
+                                  options['concurrency'])
+        self.stdout.write(
+            f'{label:>15} {prefix:>5}: '
+            f'{result["throughput"]:7.1f} запр/с  '
+            f'p50 {result["p50_ms"]:7.2f}  '
+            f'p95 {result["p95_ms"]:7.2f} мс  '
+            f'ошибок {result["errors"]}')
+
+    def worker(self, url, byte_range):
+        session = requests.Session()
+        headers = {'Range': byte_range} if byte_range else {}
+
+        def request():
+            response = session.get(url, headers=headers)
+            response.raise_for_status()
+        return request
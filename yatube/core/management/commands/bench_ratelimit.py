@@ -0,0 +1,73 @@
+import timeit
+from itertools import count
+from types import SimpleNamespace
+
+from django.core.management.base import BaseCommand
+from django.http import HttpResponse
+from django.test import RequestFactory, override_settings
+from django.urls import resolve, reverse
+
+from core.bench import run_concurrently
+from core.ratelimit import RateLimitMiddleware
+
+UNLIMITED = '1000000/s'
+
+
+class Command(BaseCommand):
+    help = ('Накладные расходы core.ratelimit: проверка лимита '
+            'в middleware и конкуренция потоков за корзины в хранилище '
+            '--store: кеше или таблице основной базы.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--number', type=int, default=20000)
+        parser.add_argument('--threads', type=int, default=8)
+        parser.add_argument('--store', choices=('cache', 'database'),
+                            default='cache')
+
+    def handle(self, *args, **options):
+        with override_settings(RATE_LIMIT_STORE=options['store']):
+            self.run(options)
+
+    def run(self, options):
+        self.path = reverse('posts:add_comment', args=[1])
+        self.middleware = RateLimitMiddleware(lambda request: HttpResponse())
+        number = options['number']
+        rules = {
+            'без правила': {},
+            'одна корзина': {'posts:add_comment': {'ip': UNLIMITED}},
+            'две корзины': {'posts:add_comment': {'ip': UNLIMITED,
+                                                  'user': UNLIMITED}},
+        }
+        request = self.request('127.0.0.1')
+        for name, limits in rules.items():
+            with override_settings(RATE_LIMITS=limits):
+                seconds = min(timeit.repeat(
+                    lambda: self.middleware.process_view(
+                        request, None, (), {}),
+                    number=number, repeat=5))
+            self.stdout.write(
+                f'{name:>14}: {seconds / number * 1e6:6.2f} мкс на запрос')
+
+        addresses = count()
+        workers = {
+            'один адрес': lambda: self.checker(self.request('127.0.0.1')),
+            'свои адреса': lambda: self.checker(
+                self.request(f'10.0.0.{next(addresses)}')),
+        }
+        with override_settings(RATE_LIMITS=rules['одна корзина']):
+            for name, make_worker in workers.items():
+                result = run_concurrently(make_worker, number,
+                                          options['threads'])
+                self.stdout.write(
+                    f'{name:>14}: {result["throughput"]:9.0f} проверок/с, '
+                    f'p99 {result["p99_ms"] * 1000:6.1f} мкс, '
+                    f'{options["threads"]} потоков')
+
+    def request(self, address):
+        request = RequestFactory().post(self.path, REMOTE_ADDR=address)
+        request.user = SimpleNamespace(is_authenticated=True, pk=1)
+        request.resolver_match = resolve(self.path)
+        return request
+
+    def checker(self, request):
+        return lambda: self.middleware.process_view(request, None, (), {})
@@ -0,0 +1,114 @@
+import os
+import random
+import sqlite3
+import tempfile
+import threading
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from core.bench import percentile
+
+SCHEMA = (
+    'CREATE TABLE post (id INTEGER PRIMARY KEY, author INTEGER, text TEXT)',
+    'CREATE TABLE comment (id INTEGER PRIMARY KEY, post INTEGER, text TEXT)',
+    'CREATE INDEX comment_post ON comment (post)',
+)
+
+
+class Command(BaseCommand):
+    help = ('Смешанная нагрузка чтения и записи на SQLite '
+            'с настройками по умолчанию и с production-профилем.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--threads', type=int, default=8)
+        parser.add_argument('--seconds', type=float, default=5)
+        parser.add_argument(
+            '--write-ratio', type=float, default=0.2,
+            help='Доля операций записи.',
+        )
+        parser.add_argument('--posts', type=int, default=10000)
+
+    def handle(self, *args, **options):
+        timeout = settings.DATABASES['default']['OPTIONS']['timeout']
+        profiles = {
+            'default': ({}, 5),
+            'production': (settings.SQLITE_PRODUCTION_PRAGMAS, timeout),
+        }
+        for name, (pragmas, timeout) in profiles.items():
+            with tempfile.TemporaryDirectory() as directory:
+                path = os.path.join(directory, 'bench.sqlite3')
+                self.prepare(path, options['posts'])
+                result = self.run(path, pragmas, timeout, options)
+            self.stdout.write(
+                f'{name:>10}: {result["ops"] / options["seconds"]:8.0f} оп/с, '
+                f'чтение p95 {result["read_p95"] * 1000:7.2f} мс, '
+                f'запись p95 {result["write_p95"] * 1000:7.2f} мс, '
+                f'locked: {result["locked"]}'
+            )
+
+    def prepare(self, path, posts):
+        conn = sqlite3.connect(path)
+        with conn:
+            for statement in SCHEMA:
+                conn.execute(statement)
+            conn.executemany(
+                'INSERT INTO post (author, text) VALUES (?, ?)',
+                ((number % 100, 'x' * 200) for number in range(posts)),
+            )
+        conn.close()
+
+    def connect(self, path, pragmas, timeout):
+        conn = sqlite3.connect(path, timeout=timeout,
+                               check_same_thread=False)
+        for pragma, value in pragmas.items():
+            conn.execute(f'PRAGMA {pragma} = {value}')
+        return conn
+
+    def run(self, path, pragmas, timeout, options):
+        reads, writes = [], []
+        locked = [0]
+        lock = threading.Lock()
+        deadline = time.perf_counter() + options['seconds']
+
+        def worker(seed):
+            rng = random.Random(seed)
+            conn = self.connect(path, pragmas, timeout)
+            while time.perf_counter() < deadline:
+                post = rng.randrange(1, options['posts'])
+                is_write = rng.random() < options['write_ratio']
+                start = time.perf_counter()
+                try:
+                    if is_write:
+                        with conn:
+                            conn.execute(
+                                'INSERT INTO comment (post, text) '
+                                'VALUES (?, ?)', (post, 'comment'))
+                    else:
+                        conn.execute(
+                            'SELECT p.text, COUNT(c.id) FROM post p '
+                            'LEFT JOIN comment c ON c.post = p.id '
+                            'WHERE p.author = ? GROUP BY p.id LIMIT 10',
+                            (post % 100,)).fetchall()
+                except sqlite3.OperationalError:
+                    with lock:
+                        locked[0] += 1
+                    continue
+                elapsed = time.perf_counter() - start
+                with lock:
+                    (writes if is_write else reads).append(elapsed)
+            conn.close()
+
+        threads = [threading.Thread(target=worker, args=(seed,))
+                   for seed in range(options['threads'])]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        return {
+            'ops': len(reads) + len(writes),
+            'read_p95': percentile(reads, 95),
+            'write_p95': percentile(writes, 95),
+            'locked': locked[0],
+        }
@@ -0,0 +1,178 @@
+import threading
+from socketserver import ThreadingMixIn
+from wsgiref.simple_server import WSGIRequestHandler, WSGIServer, make_server
+
+import requests
+from django.core.handlers.wsgi import WSGIHandler
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.db.models import Count
+from django.test import Client, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from core.bench import compare_results, run_concurrently, write_results
+from posts.models import Group, Post, User
+
+VIEWS = (
+    'index', 'group_list', 'profile', 'post_detail', 'follow_index',
+    'add_comment',
+)
+
+
+def check_status(url, method, status):
+    """GET должен отдать страницу, POST формы — перенаправить на неё."""
+    expected = 302 if method == 'post' else 200
+    if status != expected:
+        raise RuntimeError(f'{method.upper()} {url}: {status}')
+
+
+class ThreadingWSGIServer(ThreadingMixIn, WSGIServer):
+    daemon_threads = True
+
+
+class QuietHandler(WSGIRequestHandler):
+    def log_message(self, *args):
+        pass
+
+
+class Command(BaseCommand):
+    help = ('Нагрузочный тест views постов: задержки, пропускная '
+            'способность, запросы к БД и пиковый RSS всего процесса '
+            '(максимум с начала запуска, а не память отдельного view). '
+            'Запускайте на базе, заполненной generate_dataset.')
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--mode', choices=('inprocess', 'http', 'both'),
+            default='both',
+        )
+        parser.add_argument('--requests', type=int, default=200)
+        parser.add_argument('--concurrency', type=int, default=8)
+        parser.add_argument('--views', nargs='+', choices=VIEWS,
+                            default=VIEWS)
+        parser.add_argument('--output', help='Файл для JSON-результатов.')
+        parser.add_argument(
+            '--compare', help='JSON прошлого запуска для сравнения.')
+        parser.add_argument(
+            '--threshold', type=float, default=0.1,
+            help='Допустимое ухудшение, доля (0.1 = 10%%).',
+        )
+
+    def handle(self, *args, **options):
+        # Лимиты частоты превратили бы POST-замер в замер ответов 429.
+        with override_settings(DEBUG=False, RATE_LIMITS={}):
+            targets = self.targets()
+            results = {}
+            if options['mode'] in ('inprocess', 'both'):
+                results['inprocess'] = self.bench(
+                    self.inprocess_worker, targets, options)
+            if options['mode'] in ('http', 'both'):
+                server = make_server('127.0.0.1', 0, WSGIHandler(),
+                                     ThreadingWSGIServer, QuietHandler)
+                thread = threading.Thread(target=server.serve_forever,
+                                          daemon=True)
+                thread.start()
+                self.base_url = f'http://127.0.0.1:{server.server_port}'
+                try:
+                    results['http'] = self.bench(
+                        self.http_worker, targets, options)
+                finally:
+                    server.shutdown()
+                    server.server_close()
+
+        if options['output']:
+            write_results(options['output'], results,
+                          requests=options['requests'],
+                          concurrency=options['concurrency'])
+        if options['compare']:
+            regressions = compare_results(
+                options['compare'], results, options['threshold'])
+            if regressions:
+                raise CommandError(
+                    'Регрессии:\n' + '\n'.join(regressions))
+            self.stdout.write('Регрессий нет.')
+
+    def targets(self):
+        """Самые тяжёлые объекты базы для каждого view."""
+        group = Group.objects.annotate(
+            total=Count('posts')).order_by('-total').first()
+        author = User.objects.annotate(
+            total=Count('posts')).order_by('-total').first()
+        reader = User.objects.annotate(
+            total=Count('follower')).order_by('-total').first()
+        post = Post.objects.annotate(
+            total=Count('comments')).order_by('-total').first()
+        if not (group and author and reader and post):
+            raise CommandError(
+                'База пуста, сначала запустите generate_dataset.')
+        self.reader = reader
+        self.form_url = reverse('posts:post_detail', args=[post.id])
+        return {
+            'index': ('get', reverse('posts:index')),
+            'group_list': ('get', reverse('posts:group_list',
+                                          args=[group.slug])),
+            'profile': ('get', reverse('posts:profile',
+                                       args=[author.username])),
+            'post_detail': ('get', reverse('posts:post_detail',
+                                           args=[post.id])),
+            'follow_index': ('get', reverse('posts:follow_index')),
+            'add_comment': ('post', reverse('posts:add_comment',
+                                            args=[post.id])),
+        }
+
+    def bench(self, make_worker, targets, options):
+        results = {}
+        for name in options['views']:
+            method, url = targets[name]
+            results[name] = run_concurrently(
+                lambda: make_worker(method, url),
+                options['requests'], options['concurrency'],
+            )
+            self.report(name, results[name])
+        return results
+
+    def inprocess_worker(self, method, url):
+        client = Client()
+        client.force_login(self.reader)
+
+        def request():
+            with CaptureQueriesContext(connection) as context:
+                response = getattr(client, method)(
+                    url, {'text': 'Комментарий'} if method == 'post' else {})
+            check_status(url, method, response.status_code)
+            return len(context)
+        return request
+
+    def http_worker(self, method, url):
+        client = Client()
+        client.force_login(self.reader)
+        session = requests.Session()
+        for name, cookie in client.cookies.items():
+            session.cookies.set(name, cookie.value)
+        # Токен выдаёт страница с формой комментария.
+        session.get(self.base_url + self.form_url).raise_for_status()
+        csrf = session.cookies.get('csrftoken')
+        if method == 'post' and not csrf:
+            raise CommandError(f'{self.form_url} не выдала csrftoken.')
+
+        def request():
+            response = session.request(
+                method, self.base_url + url,
+                data={'text': 'Комментарий'} if method == 'post' else None,
+                headers={'X-CSRFToken': csrf},
+                allow_redirects=False,
+            )
+            check_status(url, method, response.status_code)
+        return request
+
+    def report(self, name, result):
+        queries = result['queries']
+        self.stdout.write(
+            f'{name:>13}: {result["throughput"]:7.1f} запр/с  '
+            f'p50 {result["p50_ms"]:7.2f}  p95 {result["p95_ms"]:7.2f}  '
+            f'p99 {result["p99_ms"]:7.2f} мс  '
+            f'SQL {"-" if queries is None else f"{queries:.1f}"}  '
+            f'RSS процесса {result["peak_rss_kb"] // 1024} МБ  '
+            f'ошибок {result["errors"]}'
+        )
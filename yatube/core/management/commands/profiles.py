@@ -0,0 +1,90 @@
+import json
+import os
+from collections import Counter
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from core.profiling import make_token
+
+SPEEDSCOPE_SCHEMA = 'https://www.speedscope.app/file-format-schema.json'
+
+
+class Command(BaseCommand):
+    help = ('Сводит профили всех процессов по именам URL в '
+            'PROFILER_DIR/<имя>.folded и, по желанию, в формат speedscope.')
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--speedscope', action='store_true',
+            help='Дополнительно записать <имя>.speedscope.json.',
+        )
+        parser.add_argument(
+            '--token', action='store_true',
+            help='Вывести значение заголовка X-Profile и выйти.',
+        )
+
+    def handle(self, *args, **options):
+        if options['token']:
+            self.stdout.write(make_token())
+            return
+        if not os.path.isdir(settings.PROFILER_DIR):
+            self.stdout.write('Профилей нет.')
+            return
+        for name in sorted(os.listdir(settings.PROFILER_DIR)):
+            directory = os.path.join(settings.PROFILER_DIR, name)
+            if not os.path.isdir(directory):
+                continue
+            samples, requests = self.merge(directory)
+            path = os.path.join(settings.PROFILER_DIR, f'{name}.folded')
+            with open(path, 'w') as file:
+                for stack, count in samples.most_common():
+                    file.write(f'{stack} {count}\n')
+            if options['speedscope']:
+                self.write_speedscope(name, samples)
+            self.stdout.write(
+                f'{name}: {requests} запросов, '
+                f'{sum(samples.values())} сэмплов')
+
+    def merge(self, directory):
+        samples = Counter()
+        requests = 0
+        for filename in os.listdir(directory):
+            if not filename.endswith('.folded'):
+                continue
+            requests += 1
+            with open(os.path.join(directory, filename)) as file:
+                for line in file:
+                    stack, _, count = line.rstrip('\n').rpartition(' ')
+                    samples[stack] += int(count)
+        return samples, requests
+
+    def write_speedscope(self, name, samples):
+        frames, index = [], {}
+        stacks, weights = [], []
+        for stack, count in samples.items():
+            ids = []
+            for frame in stack.split(';'):
+                if frame not in index:
+                    index[frame] = len(frames)
+                    frames.append({'name': frame})
+                ids.append(index[frame])
+            stacks.append(ids)
+            weights.append(count)
+        profile = {
+            '$schema': SPEEDSCOPE_SCHEMA,
+            'shared': {'frames': frames},
+            'profiles': [{
+                'type': 'sampled',
+                'name': name,
+                'unit': 'none',
+                'startValue': 0,
+                'endValue': sum(weights),
+                'samples': stacks,
+                'weights': weights,
+            }],
+        }
+        path = os.path.join(settings.PROFILER_DIR,
+                            f'{name}.speedscope.json')
+        with open(path, 'w') as file:
+            json.dump(profile, file)
@@ -0,0 +1,13 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from core import images
+
+
+class Command(BaseCommand):
+    help = ('Удаляет давно не использованные картинки из кеша '
+            'core.images, пока он больше 90% IMAGE_CACHE_SIZE.')
+
+    def handle(self, *args, **options):
+        total = images.evict(images.cache.root, settings.IMAGE_CACHE_SIZE)
+        self.stdout.write(f'Размер кеша картинок: {total / 2 ** 20:.1f} МиБ')
@@ -0,0 +1,35 @@
+import sqlite3
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+
+class Command(BaseCommand):
+    help = 'Копирует основную SQLite-базу в файлы реплик.'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--interval', type=float, default=0,
+            help='Повторять копирование каждые N секунд.',
+        )
+
+    def handle(self, *args, **options):
+        while True:
+            self.sync()
+            if not options['interval']:
+                break
+            time.sleep(options['interval'])
+
+    def sync(self):
+        source = sqlite3.connect(settings.DATABASES['default']['NAME'])
+        try:
+            for alias in settings.REPLICA_DATABASES:
+                target = sqlite3.connect(settings.DATABASES[alias]['NAME'])
+                try:
+                    source.backup(target)
+                finally:
+                    target.close()
+                self.stdout.write(f'{alias}: синхронизирована')
+        finally:
+            source.close()
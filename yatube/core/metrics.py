@@ -0,0 +1,254 @@
+"""Метрики запросов в формате Prometheus.
+
+MetricsMiddleware замеряет каждый запрос и раскладывает его время по
+фазам: SQL (execute wrapper), шаблоны, кеш и миниатюры (бэкенды из
+core.backends вызывают measure). Фазы могут вкладываться: запросы
+sorl к кешу и базе попадут и в thumbnail, и в cache/db.
+
+Каждый процесс копит гистограммы у себя и не чаще раза
+в METRICS_FLUSH_INTERVAL секунд сбрасывает их в METRICS_DIR/<pid>.json;
+view metrics складывает файлы живых процессов и удаляет файлы
+завершившихся: их счётчики пропадают из сумм, как при перезапуске
+процесса. Без METRICS_DIR (в тестах) метрики не сбрасываются.
+"""
+import json
+import os
+import threading
+import time
+from contextlib import contextmanager
+
+from django.conf import settings
+
+from . import tracing
+
+PHASES = ('total', 'db', 'template', 'cache', 'thumbnail')
+LATENCY_BUCKETS = (
+    0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10,
+)
+SIZE_BUCKETS = (
+    1024, 4096, 16384, 65536, 262144, 1048576, 4194304,
+)
+
+_request = threading.local()
+
+
+@contextmanager
+def measure(phase, name=None, **attributes):
+    """Добавляет время блока к фазе текущего запроса.
+
+    Вложенные блоки одной фазы считаются один раз. С именем блок
+    становится ещё и спаном трассы, см. core.tracing.
+    """
+    with tracing.span(name, **attributes) if name else tracing.NO_SPAN:
+        timings = getattr(_request, 'timings', None)
+        if timings is None or phase in _request.active:
+            yield
+            return
+        _request.active.add(phase)
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            timings[phase] += time.perf_counter() - start
+            _request.active.discard(phase)
+
+
+def count_cache(hit):
+    counters = getattr(_request, 'cache', None)
+    if counters is not None:
+        counters['hit' if hit else 'miss'] += 1
+
+
+def db_timer(execute, sql, params, many, context):
+    with measure('db'):
+        return execute(sql, params, many, context)
+
+
+def install_db_timer(sender, connection, **kwargs):
+    if db_timer not in connection.execute_wrappers:
+        connection.execute_wrappers.append(db_timer)
+
+
+def empty_histogram(buckets):
+    return {'buckets': [0] * len(buckets), 'sum': 0, 'count': 0}
+
+
+def observe(histogram, buckets, value):
+    for index, bound in enumerate(buckets):
+        if value <= bound:
+            histogram['buckets'][index] += 1
+    histogram['sum'] += value
+    histogram['count'] += 1
+
+
+class Registry:
+    """Метрики одного процесса."""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.views = {}
+        self.flushed = 0
+
+    def record(self, view, timings, cache, size):
+        with self.lock:
+            entry = self.views.get(view)
+            if entry is None:
+                entry = self.views[view] = {
+                    'latency': {phase: empty_histogram(LATENCY_BUCKETS)
+                                for phase in PHASES},
+                    'size': empty_histogram(SIZE_BUCKETS),
+                    'cache': {'hit': 0, 'miss': 0},
+                }
+            for phase in PHASES:
+                observe(entry['latency'][phase], LATENCY_BUCKETS,
+                        timings[phase])
+            if size is not None:
+                observe(entry['size'], SIZE_BUCKETS, size)
+            for result, count in cache.items():
+                entry['cache'][result] += count
+
+    def flush(self, force=False):
+        if not settings.METRICS_DIR:
+            return
+        now = time.time()
+        if not force and now - self.flushed < settings.METRICS_FLUSH_INTERVAL:
+            return
+        with self.lock:
+            snapshot = json.dumps(self.views)
+            self.flushed = now
+        os.makedirs(settings.METRICS_DIR, exist_ok=True)
+        path = os.path.join(settings.METRICS_DIR, f'{os.getpid()}.json')
+        with open(f'{path}.tmp', 'w') as file:
+            file.write(snapshot)
+        os.replace(f'{path}.tmp', path)
+
+
+registry = Registry()
+
+
+def read_snapshots():
+    """Метрики живых процессов из METRICS_DIR; файлы завершившихся
+    удаляются.
+    """
+    if not settings.METRICS_DIR or not os.path.isdir(settings.METRICS_DIR):
+        return
+    for name in os.listdir(settings.METRICS_DIR):
+        pid, extension = os.path.splitext(name)
+        if extension != '.json' or not pid.isdigit():
+            continue
+        path = os.path.join(settings.METRICS_DIR, name)
+        try:
+            if not process_alive(int(pid)):
+                os.remove(path)
+                continue
+            with open(path) as file:
+                yield json.load(file)
+        except FileNotFoundError:
+            continue
+
+
+def merge_snapshots():
+    """Сумма метрик всех процессов из METRICS_DIR."""
+    merged = {}
+    for views in read_snapshots():
+        for view, entry in views.items():
+            target = merged.get(view)
+            if target is None:
+                merged[view] = entry
+                continue
+            for phase, histogram in entry['latency'].items():
+                add_histogram(target['latency'][phase], histogram)
+            add_histogram(target['size'], entry['size'])
+            for result, count in entry['cache'].items():
+                target['cache'][result] += count
+    return merged
+
+
+def process_alive(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+    return True
+
+
+def add_histogram(target, histogram):
+    target['buckets'] = [a + b for a, b in
+                         zip(target['buckets'], histogram['buckets'])]
+    target['sum'] += histogram['sum']
+    target['count'] += histogram['count']
+
+
+def histogram_lines(name, labels, histogram, buckets):
+    for bound, count in zip(buckets, histogram['buckets']):
+        yield f'{name}_bucket{{{labels},le="{bound}"}} {count}'
+    yield f'{name}_bucket{{{labels},le="+Inf"}} {histogram["count"]}'
+    yield f'{name}_sum{{{labels}}} {histogram["sum"]}'
+    yield f'{name}_count{{{labels}}} {histogram["count"]}'
+
+
+def render_prometheus(views):
+    lines = [
+        '# HELP yatube_request_seconds Request time by view and phase.',
+        '# TYPE yatube_request_seconds histogram',
+    ]
+    for view, entry in sorted(views.items()):
+        for phase in PHASES:
+            lines.extend(histogram_lines(
+                'yatube_request_seconds',
+                f'view="{view}",phase="{phase}"',
+                entry['latency'][phase], LATENCY_BUCKETS))
+    lines += [
+        '# HELP yatube_response_bytes Response body size by view.',
+        '# TYPE yatube_response_bytes histogram',
+    ]
+    for view, entry in sorted(views.items()):
+        lines.extend(histogram_lines(
+            'yatube_response_bytes', f'view="{view}"',
+            entry['size'], SIZE_BUCKETS))
+    lines += [
+        '# HELP yatube_cache_requests_total Cache lookups by result.',
+        '# TYPE yatube_cache_requests_total counter',
+    ]
+    for view, entry in sorted(views.items()):
+        for result, count in entry['cache'].items():
+            lines.append(f'yatube_cache_requests_total'
+                         f'{{view="{view}",result="{result}"}} {count}')
+    lines += [
+        '# HELP yatube_cache_hit_ratio Share of cache lookups that hit.',
+        '# TYPE yatube_cache_hit_ratio gauge',
+    ]
+    for view, entry in sorted(views.items()):
+        total = entry['cache']['hit'] + entry['cache']['miss']
+        if total:
+            lines.append(f'yatube_cache_hit_ratio{{view="{view}"}} '
+                         f'{entry["cache"]["hit"] / total}')
+    return '\n'.join(lines) + '\n'
+
+
+class MetricsMiddleware:
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        _request.timings = dict.fromkeys(PHASES, 0)
+        _request.active = set()
+        _request.cache = {'hit': 0, 'miss': 0}
+        start = time.perf_counter()
+        try:
+            response = self.get_response(request)
+            timings, cache = _request.timings, _request.cache
+        finally:
+            _request.timings = _request.active = _request.cache = None
+        timings['total'] = time.perf_counter() - start
+        match = request.resolver_match
+        registry.record(
+            match.view_name if match else 'unresolved',
+            timings,
+            cache,
+            None if response.streaming else len(response.content),
+        )
+        registry.flush()
+        return response
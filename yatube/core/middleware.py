@@ -0,0 +1,38 @@
+from django.conf import settings
+
+from .routers import pin_to_primary, unpin
+
+PIN_COOKIE = 'pin_primary'
+
+
+class ReplicaPinMiddleware:
+    """Закрепляет пользователя за основной базой после записи.
+
+    Пока жива cookie, все чтения идут в основную базу, и пользователь
+    видит собственные изменения, даже если реплики ещё отстают.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        request.wrote_primary = False
+        if PIN_COOKIE not in request.COOKIES:
+            unpin()
+        try:
+            response = self.get_response(request)
+        finally:
+            pin_to_primary()
+        if request.wrote_primary:
+            response.set_cookie(
+                PIN_COOKIE, '1',
+                max_age=settings.REPLICA_PIN_SECONDS,
+                httponly=True,
+            )
+        return response
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        view_name = request.resolver_match.view_name
+        if view_name in settings.REPLICA_STICKY_VIEWS:
+            request.wrote_primary = True
+            pin_to_primary()
@@ -0,0 +1,9 @@
+from django.db import models
+
+
+class RateLimitCounter(models.Model):
+    """Счётчик окна ограничения частоты, см. core.ratelimit."""
+    key = models.CharField(max_length=255, primary_key=True)
+    count = models.PositiveIntegerField(default=0)
+    # Unix-время, после которого окно не нужно и как прошлое.
+    expires = models.FloatField(db_index=True)
@@ -0,0 +1,115 @@
+"""Сэмплирующий профилировщик запросов.
+
+Пока запрос выполняется, отдельный поток с интервалом PROFILER_INTERVAL
+снимает стек потока запроса. Стеки пишутся в формате collapsed stacks
+(`a;b;c 12`), который понимают flamegraph.pl и speedscope, — по файлу на
+запрос в PROFILER_DIR/<имя URL>/.
+"""
+import os
+import random
+import sys
+import threading
+import time
+from collections import Counter
+
+from django.conf import settings
+from django.core import signing
+
+SALT = 'core.profiling'
+
+
+def make_token():
+    """Значение заголовка X-Profile, включающее профилирование запроса."""
+    return signing.dumps('profile', salt=SALT)
+
+
+def frame_name(frame):
+    code = frame.f_code
+    return (f'{code.co_name} '
+            f'({os.path.basename(code.co_filename)}:{frame.f_lineno})')
+
+
+class StackSampler(threading.Thread):
+    def __init__(self, thread_id, interval):
+        super().__init__(daemon=True)
+        self.thread_id = thread_id
+        self.interval = interval
+        self.samples = Counter()
+        self._stopped = threading.Event()
+
+    def run(self):
+        self.sample()
+        while not self._stopped.wait(self.interval):
+            self.sample()
+
+    def sample(self):
+        frame = sys._current_frames().get(self.thread_id)
+        stack = []
+        while frame is not None:
+            stack.append(frame_name(frame))
+            frame = frame.f_back
+        if stack:
+            self.samples[';'.join(reversed(stack))] += 1
+
+    def stop(self):
+        self._stopped.set()
+        self.join()
+        return self.samples
+
+
+def write_samples(view_name, samples):
+    directory = os.path.join(settings.PROFILER_DIR,
+                             view_name.replace(':', '.'))
+    os.makedirs(directory, exist_ok=True)
+    path = os.path.join(directory, f'{time.time_ns()}-{os.getpid()}.folded')
+    with open(path, 'w') as file:
+        for stack, count in samples.items():
+            file.write(f'{stack} {count}\n')
+    rotate(directory)
+
+
+def rotate(directory):
+    """Оставляет PROFILER_MAX_FILES самых свежих профилей."""
+    files = sorted(name for name in os.listdir(directory)
+                   if name.endswith('.folded'))
+    for name in files[:-settings.PROFILER_MAX_FILES]:
+        try:
+            os.remove(os.path.join(directory, name))
+        except FileNotFoundError:
+            pass
+
+
+class SamplingProfilerMiddleware:
+    """Профилирует долю PROFILER_SAMPLE_RATE запросов и запросы
+    с подписанным заголовком X-Profile (см. make_token).
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        if not self.should_profile(request):
+            return self.get_response(request)
+        sampler = StackSampler(threading.get_ident(),
+                               settings.PROFILER_INTERVAL)
+        sampler.start()
+        try:
+            response = self.get_response(request)
+        finally:
+            samples = sampler.stop()
+        if samples:
+            match = request.resolver_match
+            write_samples(match.view_name if match else 'unresolved',
+                          samples)
+        return response
+
+    def should_profile(self, request):
+        token = request.META.get('HTTP_X_PROFILE')
+        if token:
+            try:
+                signing.loads(token, salt=SALT,
+                              max_age=settings.PROFILER_TOKEN_MAX_AGE)
+                return True
+            except signing.BadSignature:
+                pass
+        return random.random() < settings.PROFILER_SAMPLE_RATE
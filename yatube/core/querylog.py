@@ -0,0 +1,151 @@
+"""Журнал медленных SQL-запросов, работающий и без DEBUG.
+
+query_logger подключается к каждому соединению как execute wrapper.
+Запросы дольше SLOW_QUERY_MS пишутся в лог с отпечатком, числом
+параметров и местом вызова: строкой проекта и шаблоном. По всем
+запросам копится статистика по отпечаткам, раз в QUERY_STATS_INTERVAL
+секунд она дописывается в QUERY_STATS_FILE строками JSON.
+"""
+import atexit
+import json
+import logging
+import os
+import random
+import re
+import sys
+import threading
+import time
+from functools import lru_cache
+
+from django.conf import settings
+
+from .bench import percentile
+
+logger = logging.getLogger(__name__)
+
+# Обёртки и middleware core не считаются местом вызова запроса.
+CORE_DIR = os.path.dirname(os.path.abspath(__file__))
+
+RESERVOIR_SIZE = 1000
+
+STRING_RE = re.compile(r"'(?:[^']|'')*'")
+NUMBER_RE = re.compile(r'\b\d+(?:\.\d+)?\b')
+LIST_RE = re.compile(r'\((?:\s*(?:%s|\?)\s*,)+\s*(?:%s|\?)\s*\)')
+SPACE_RE = re.compile(r'\s+')
+
+
+@lru_cache(maxsize=2048)
+def fingerprint(sql):
+    """Нормализованный текст запроса: литералы и списки IN заменены."""
+    sql = STRING_RE.sub('?', sql)
+    sql = NUMBER_RE.sub('?', sql)
+    sql = sql.replace('%s', '?')
+    sql = LIST_RE.sub('(...)', sql)
+    return SPACE_RE.sub(' ', sql).strip()
+
+
+def origin():
+    """Ближайшие к запросу строка кода проекта и узел шаблона."""
+    code, template = None, None
+    frame = sys._getframe(2)
+    while frame is not None and not (code and template):
+        filename = frame.f_code.co_filename
+        if template is None and frame.f_code.co_name == 'render_annotated':
+            node = frame.f_locals.get('self')
+            token = getattr(node, 'token', None)
+            if token is not None and getattr(node, 'origin', None):
+                template = f'{node.origin.template_name}:{token.lineno}'
+        elif (code is None and filename.startswith(settings.BASE_DIR)
+                and not filename.startswith(CORE_DIR)):
+            code = (f'{os.path.relpath(filename, settings.BASE_DIR)}:'
+                    f'{frame.f_lineno} in {frame.f_code.co_name}')
+        frame = frame.f_back
+    return code, template
+
+
+class QueryStats:
+    """Счётчики по отпечаткам в пределах процесса."""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        self.started = time.time()
+        self.fingerprints = {}
+
+    def add(self, sql, duration):
+        with self.lock:
+            entry = self.fingerprints.setdefault(
+                fingerprint(sql), {'count': 0, 'total': 0, 'sample': []})
+            entry['count'] += 1
+            entry['total'] += duration
+            sample = entry['sample']
+            if len(sample) < RESERVOIR_SIZE:
+                sample.append(duration)
+            else:
+                index = random.randrange(entry['count'])
+                if index < RESERVOIR_SIZE:
+                    sample[index] = duration
+            if time.time() - self.started >= settings.QUERY_STATS_INTERVAL:
+                self.flush()
+
+    def flush(self):
+        fingerprints, started = self.fingerprints, self.started
+        self.reset()
+        if not fingerprints:
+            return
+        directory = os.path.dirname(settings.QUERY_STATS_FILE)
+        os.makedirs(directory, exist_ok=True)
+        with open(settings.QUERY_STATS_FILE, 'a') as file:
+            for sql, entry in fingerprints.items():
+                file.write(json.dumps({
+                    'start': started,
+                    'end': time.time(),
+                    'pid': os.getpid(),
+                    'fingerprint': sql,
+                    'count': entry['count'],
+                    'total_ms': entry['total'] * 1000,
+                    'p95_ms': percentile(entry['sample'], 95) * 1000,
+                }, ensure_ascii=False) + '\n')
+
+
+stats = QueryStats()
+
+
+def flush_stats():
+    with stats.lock:
+        stats.flush()
+
+
+atexit.register(flush_stats)
+
+
+def param_count(params, many):
+    if not isinstance(params, (list, tuple, dict)):
+        return 0
+    if many:
+        return len(params[0]) if params else 0
+    return len(params)
+
+
+def query_logger(execute, sql, params, many, context):
+    start = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        duration = time.perf_counter() - start
+        stats.add(sql, duration)
+        if duration * 1000 >= settings.SLOW_QUERY_MS:
+            code, template = origin()
+            logger.warning(
+                'Медленный запрос %.1f мс, параметров: %d, код: %s, '
+                'шаблон: %s\n%s',
+                duration * 1000, param_count(params, many), code, template,
+                fingerprint(sql),
+            )
+
+
+def install_query_logger(sender, connection, **kwargs):
+    if query_logger not in connection.execute_wrappers:
+        connection.execute_wrappers.append(query_logger)
@@ -0,0 +1,185 @@
+"""Ограничение частоты запросов скользящим окном.
+
+RATE_LIMITS сопоставляет имени URL правило вида
+`{'user': '10/m', 'ip': '30/m', 'methods': ('POST',)}`: не больше N
+запросов за период на вошедшего пользователя и на IP-адрес. Счётчики
+заводятся на текущее и прошлое окно длиной в период; число запросов за
+последний период оценивается как текущий счётчик плюс доля прошлого,
+ещё попадающая в период.
+
+Где лежат счётчики, решает RATE_LIMIT_STORE:
+
+- 'database' — таблица RateLimitCounter в основной базе, общая для всех
+  процессов. Проверка и `UPDATE count = count + 1` идут в одной
+  транзакции core.db.serialized_write, так что счёт точный.
+- 'cache' — кеш RATE_LIMIT_CACHE. Нужен атомарный incr, сохраняющий
+  срок ключа: locmem (лимиты свои у процесса), memcached, Redis.
+  DatabaseCache и файловый кеш не годятся: их incr — чтение и set со
+  сроком по умолчанию, и часовое окно прожило бы пять минут.
+
+Сначала проверяются все корзины запроса, и только если во всех есть
+место, счётчики увеличиваются; в кеше, если между проверкой и incr
+другой процесс успел занять место, увеличенные счётчики откатываются.
+Так отказ по лимиту адреса не тратит лимит пользователя. Ответ на
+превышение — 429 с заголовком Retry-After.
+"""
+import math
+import time
+from functools import lru_cache
+
+from django.conf import settings
+from django.core.cache import caches
+from django.core.cache.backends.db import DatabaseCache
+from django.core.cache.backends.filebased import FileBasedCache
+from django.core.exceptions import ImproperlyConfigured
+from django.db.models import F
+from django.shortcuts import render
+
+from .db import serialized_write
+from .models import RateLimitCounter
+
+PERIODS = {'s': 1, 'm': 60, 'h': 60 * 60, 'd': 24 * 60 * 60}
+DEFAULT_METHODS = ('POST',)
+
+
+@lru_cache(maxsize=None)
+def parse_rate(rate):
+    """'10/m' -> (запросов, период в секундах)."""
+    count, period = rate.split('/')
+    return int(count), PERIODS[period]
+
+
+def estimate(previous, current, elapsed, period):
+    """Запросов за последний период по счётчикам двух окон."""
+    return previous * (1 - elapsed / period) + current
+
+
+def retry_after(previous, current, capacity, elapsed, period):
+    """Через сколько секунд в окне найдётся место для запроса."""
+    remaining = period - elapsed
+    if current + 1 > capacity or not previous:
+        return remaining
+    needed = (1 - (capacity - current - 1) / previous) * period
+    return min(remaining, max(0, needed - elapsed))
+
+
+class Counter:
+    def __init__(self, prefix, rate, now):
+        self.capacity, self.period = parse_rate(rate)
+        window, self.elapsed = divmod(now, self.period)
+        self.key = f'{prefix}:{int(window)}'
+        self.previous_key = f'{prefix}:{int(window) - 1}'
+        # Окно живёт ещё период после своего конца как прошлое.
+        self.expires = now - self.elapsed + 2 * self.period
+
+    def over(self, previous, current):
+        return estimate(previous, current, self.elapsed,
+                        self.period) > self.capacity
+
+    def retry_after(self, previous, current):
+        return retry_after(previous, current, self.capacity,
+                           self.elapsed, self.period)
+
+
+class RateLimitMiddleware:
+    """Ставьте после AuthenticationMiddleware."""
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        return self.get_response(request)
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        view_name = request.resolver_match.view_name
+        rule = settings.RATE_LIMITS.get(view_name)
+        if (rule is None
+                or request.method not in rule.get('methods',
+                                                  DEFAULT_METHODS)):
+            return None
+        owners = []
+        if 'user' in rule and request.user.is_authenticated:
+            owners.append((f'user:{request.user.pk}', rule['user']))
+        if 'ip' in rule:
+            address = request.META.get(settings.RATE_LIMIT_IP_META, '')
+            owners.append((f'ip:{address}', rule['ip']))
+        now = time.time()
+        counters = [Counter(f'ratelimit:{view_name}:{owner}', rate, now)
+                    for owner, rate in owners]
+        if settings.RATE_LIMIT_STORE == 'database':
+            wait = take_from_database(counters, now)
+        else:
+            wait = take_from_cache(caches[settings.RATE_LIMIT_CACHE],
+                                   counters)
+        if wait:
+            response = render(request, 'core/429.html', status=429)
+            response['Retry-After'] = str(max(1, math.ceil(wait)))
+            return response
+        return None
+
+
+def over_limit(counters, counts):
+    """Через сколько секунд повторить запрос или 0, если место есть."""
+    for counter in counters:
+        previous = counts.get(counter.previous_key, 0)
+        current = counts.get(counter.key, 0)
+        if counter.over(previous, current + 1):
+            return counter.retry_after(previous, current)
+    return 0
+
+
+def take_from_database(counters, now):
+    """Занимает место во всех счётчиках таблицы или ни в одном."""
+    keys = [key for counter in counters
+            for key in (counter.key, counter.previous_key)]
+    with serialized_write():
+        counts = dict(RateLimitCounter.objects.filter(
+            key__in=keys, expires__gt=now).values_list('key', 'count'))
+        wait = over_limit(counters, counts)
+        if wait:
+            return wait
+        created = False
+        for counter in counters:
+            if counter.key in counts:
+                RateLimitCounter.objects.filter(key=counter.key).update(
+                    count=F('count') + 1)
+            else:
+                RateLimitCounter.objects.create(
+                    key=counter.key, count=1, expires=counter.expires)
+                created = True
+        if created:
+            RateLimitCounter.objects.filter(expires__lte=now).delete()
+    return 0
+
+
+def take_from_cache(cache, counters):
+    """Занимает место во всех счётчиках кеша или ни в одном.
+
+    Возвращает 0 или через сколько секунд повторить запрос.
+    """
+    if isinstance(cache, (DatabaseCache, FileBasedCache)):
+        raise ImproperlyConfigured(
+            f'{type(cache).__name__} не сохраняет срок ключа при incr; '
+            "для общих лимитов задайте RATE_LIMIT_STORE = 'database'.")
+    counts = cache.get_many(
+        [key for counter in counters
+         for key in (counter.key, counter.previous_key)])
+    wait = over_limit(counters, counts)
+    if wait:
+        return wait
+    taken = []
+    for counter in counters:
+        previous = counts.get(counter.previous_key, 0)
+        timeout = math.ceil(2 * counter.period - counter.elapsed)
+        cache.add(counter.key, 0, timeout=timeout)
+        try:
+            current = cache.incr(counter.key)
+        except ValueError:
+            cache.set(counter.key, 1, timeout=timeout)
+            current = 1
+        taken.append(counter)
+        if counter.over(previous, current):
+            for taken_counter in taken:
+                cache.decr(taken_counter.key)
+            return counter.retry_after(previous, current - 1)
+    return 0
@@ -0,0 +1,64 @@
+import random
+import threading
+from contextlib import contextmanager
+
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS
+
+_state = threading.local()
+
+
+def pin_to_primary():
+    """Направляет все чтения текущего потока в основную базу."""
+    _state.pinned = True
+
+
+def unpin():
+    """Разрешает текущему потоку читать с реплик — на время запроса."""
+    _state.pinned = False
+
+
+def is_pinned():
+    # Вне запроса — воркеры, команды, фоновые потоки — поток читает из
+    # основной базы: задачу с только что созданной строкой реплика
+    # может ещё не увидеть.
+    return getattr(_state, 'pinned', True)
+
+
+@contextmanager
+def primary():
+    """Читает из основной базы внутри блока или декорированной функции."""
+    pinned = is_pinned()
+    pin_to_primary()
+    try:
+        yield
+    finally:
+        if not pinned:
+            unpin()
+
+
+class ReplicaRouter:
+    """Читает модели из REPLICA_READ_MODELS с реплик, пишет в основную
+    базу.
+
+    Если реплики не настроены или поток закреплён за основной базой,
+    решение остаётся за Django.
+    """
+
+    def db_for_read(self, model, **hints):
+        if (not settings.REPLICA_DATABASES
+                or is_pinned()
+                or 'instance' in hints
+                or (model._meta.label_lower
+                    not in settings.REPLICA_READ_MODELS)):
+            return None
+        return random.choice(settings.REPLICA_DATABASES)
+
+    def db_for_write(self, model, **hints):
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        return True
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        return db == DEFAULT_DB_ALIAS
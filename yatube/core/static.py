@@ -0,0 +1,185 @@
+"""Раздача собранной статики прямо из WSGI, до Django.
+
+StaticFiles оборачивает WSGI-приложение (см. yatube.wsgi, профиль
+production) и отвечает на GET и HEAD под STATIC_URL файлами из
+STATIC_ROOT. Каталог сканируется один раз при старте: после
+collectstatic процесс нужно перезапустить. Для каждого файла заранее
+известны размер, ETag, тип и сжатые копии file.br и file.gz от
+core.backends.storage; копия выбирается по Accept-Encoding. Файлы
+с хешем в имени (из манифеста staticfiles.json) отдаются с
+`Cache-Control: max-age=31536000, immutable`, остальные — с коротким
+сроком. Поддерживаются If-None-Match и один диапазон Range (по
+несжатому файлу); неизвестные пути уходят в приложение.
+"""
+import json
+import mimetypes
+import os
+import re
+
+from django.conf import settings
+
+RANGE = re.compile(r'bytes=(\d*)-(\d*)')
+IMMUTABLE = 'public, max-age=31536000, immutable'
+ENCODINGS = (('br', '.br'), ('gzip', '.gz'))
+CHUNK_SIZE = 64 * 1024
+
+
+def parse_range(header, size):
+    """Заголовок Range -> (начало, конец включительно).
+
+    None — диапазона нет или он составной, отдаётся весь файл;
+    ValueError — диапазон вне файла (416).
+    """
+    match = RANGE.fullmatch(header.strip()) if header else None
+    if match is None or match.group(1) == match.group(2) == '':
+        return None
+    start, end = match.groups()
+    if start == '':
+        start, end = max(0, size - int(end)), size - 1
+    else:
+        start = int(start)
+        end = min(int(end), size - 1) if end else size - 1
+    if start > end or start >= size:
+        raise ValueError(header)
+    return start, end
+
+
+def accepted_encodings(header):
+    """Кодировки из Accept-Encoding, кроме запрещённых q=0."""
+    accepted = set()
+    for item in header.split(','):
+        name, _, params = item.strip().partition(';')
+        q = params.strip()
+        if q.startswith('q='):
+            try:
+                if float(q[2:]) == 0:
+                    continue
+            except ValueError:
+                continue
+        accepted.add(name.strip().lower())
+    return accepted
+
+
+def read_range(path, start, length):
+    with open(path, 'rb') as file:
+        file.seek(start)
+        while length > 0:
+            chunk = file.read(min(CHUNK_SIZE, length))
+            if not chunk:
+                return
+            length -= len(chunk)
+            yield chunk
+
+
+class StaticFile:
+    def __init__(self, path, immutable):
+        stat = os.stat(path)
+        self.path = path
+        self.size = stat.st_size
+        self.etag = f'"{stat.st_size:x}-{int(stat.st_mtime):x}"'
+        content_type, _ = mimetypes.guess_type(path)
+        self.headers = [
+            ('Content-Type', content_type or 'application/octet-stream'),
+            ('Cache-Control', IMMUTABLE if immutable else
+             f'public, max-age={settings.STATIC_MAX_AGE}'),
+            ('Accept-Ranges', 'bytes'),
+        ]
+        self.variants = []
+        for encoding, extension in ENCODINGS:
+            if os.path.isfile(path + extension):
+                self.variants.append(
+                    (encoding, path + extension,
+                     os.path.getsize(path + extension)))
+        if self.variants:
+            self.headers.append(('Vary', 'Accept-Encoding'))
+
+    def choose(self, environ):
+        """(путь, размер, кодировка или None, Range) для запроса.
+
+        Диапазоны считаются по несжатому файлу; If-Range с чужим ETag
+        отменяет диапазон.
+        """
+        range_header = environ.get('HTTP_RANGE')
+        if environ.get('HTTP_IF_RANGE', self.etag) != self.etag:
+            range_header = None
+        accept_encoding = environ.get('HTTP_ACCEPT_ENCODING')
+        if accept_encoding and not range_header:
+            accepted = accepted_encodings(accept_encoding)
+            for encoding, path, size in self.variants:
+                if encoding in accepted:
+                    return path, size, encoding, None
+        return self.path, self.size, None, range_header
+
+
+def scan(root):
+    """{относительный путь: StaticFile} для файлов каталога root."""
+    immutable = set()
+    manifest = os.path.join(root, 'staticfiles.json')
+    if os.path.isfile(manifest):
+        with open(manifest) as file:
+            immutable.update(json.load(file).get('paths', {}).values())
+    files = {}
+    for directory, _, names in os.walk(root):
+        for name in names:
+            if name.endswith(('.br', '.gz')) and os.path.isfile(
+                    os.path.join(directory, name[:-3])):
+                continue
+            path = os.path.join(directory, name)
+            relative = os.path.relpath(path, root).replace(os.sep, '/')
+            files[relative] = StaticFile(path, relative in immutable)
+    return files
+
+
+class StaticFiles:
+    """WSGI-обёртка, отдающая STATIC_ROOT под STATIC_URL."""
+
+    def __init__(self, application, root=None, prefix=None):
+        self.application = application
+        self.prefix = prefix or settings.STATIC_URL
+        self.files = scan(root or settings.STATIC_ROOT)
+
+    def __call__(self, environ, start_response):
+        path = environ.get('PATH_INFO', '')
+        if (not path.startswith(self.prefix)
+                or environ['REQUEST_METHOD'] not in ('GET', 'HEAD')):
+            return self.application(environ, start_response)
+        static_file = self.files.get(path[len(self.prefix):])
+        if static_file is None:
+            return self.application(environ, start_response)
+        return self.serve(static_file, environ, start_response)
+
+    def serve(self, static_file, environ, start_response):
+        headers = list(static_file.headers)
+        path, size, encoding, range_header = static_file.choose(environ)
+        etag = static_file.etag
+        if encoding is not None:
+            etag = f'{etag[:-1]}-{encoding}"'
+            headers.append(('Content-Encoding', encoding))
+        headers.append(('ETag', etag))
+        if etag in environ.get('HTTP_IF_NONE_MATCH', ''):
+            start_response('304 Not Modified', headers)
+            return []
+        try:
+            byte_range = parse_range(range_header, size)
+        except ValueError:
+            start_response('416 Range Not Satisfiable', [
+                ('Content-Range', f'bytes */{size}'),
+                ('Content-Length', '0'),
+            ])
+            return []
+        if byte_range is not None:
+            start, end = byte_range
+            headers += [('Content-Range', f'bytes {start}-{end}/{size}'),
+                        ('Content-Length', str(end - start + 1))]
+            start_response('206 Partial Content', headers)
+            if environ['REQUEST_METHOD'] == 'HEAD':
+                return []
+            return read_range(path, start, end - start + 1)
+        headers.append(('Content-Length', str(size)))
+        start_response('200 OK', headers)
+        if environ['REQUEST_METHOD'] == 'HEAD':
+            return []
+        file_wrapper = environ.get('wsgi.file_wrapper')
+        if file_wrapper is not None:
+            return file_wrapper(open(path, 'rb'), CHUNK_SIZE)
+        return read_range(path, 0, size)
@@ -0,0 +1,11 @@
+from django import template
+
+from core import images
+
+register = template.Library()
+
+
+@register.simple_tag
+def resized_url(image, width, height):
+    """Подписанный URL картинки image размера width x height."""
+    return images.url(getattr(image, 'name', image), width, height)
@@ -0,0 +1,850 @@
+import asyncio
+import gzip
+import io
+import json
+import os
+import re
+import shutil
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import Future
+from concurrent.futures.process import BrokenProcessPool
+from unittest import mock
+from urllib.parse import quote
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.contrib.sessions.models import Session
+from django.core.cache import cache
+from django.core.exceptions import ImproperlyConfigured
+from django.core.handlers.wsgi import WSGIHandler
+from django.core.management import call_command
+from django.db import connection
+from django.http import HttpResponse, StreamingHttpResponse
+from django.test import (Client, RequestFactory, SimpleTestCase, TestCase,
+                         TransactionTestCase, override_settings)
+from django.test.utils import CaptureQueriesContext
+from django.urls import re_path, reverse
+from PIL import Image
+
+from jobs import queue
+from jobs.models import Job
+from posts.models import (Change, Follow, Group, GroupStats, Notification,
+                          Post, PostScore)
+
+from . import images, metrics
+from .asgi import ASGIHandler, async_view, gather
+from .compression import CompressionMiddleware, compressed_cache
+from .db import configure_sqlite, serialized_write
+from .middleware import PIN_COOKIE
+from .profiling import make_token
+from .querylog import fingerprint
+from .ratelimit import estimate, retry_after
+from .routers import ReplicaRouter, pin_to_primary, primary, unpin
+from .static import StaticFiles, parse_range
+from .tracing import exporter
+
+User = get_user_model()
+
+
+@async_view
+async def barrier_view(request):
+    barrier = threading.Barrier(2, timeout=5)
+    await gather(barrier.wait, barrier.wait)
+    return HttpResponse('ok')
+
+
+urlpatterns = [re_path(r'^barrier/$', barrier_view)]
+TEMP_PROFILER_DIR = tempfile.mkdtemp(dir=settings.BASE_DIR)
+TEMP_METRICS_DIR = tempfile.mkdtemp(dir=settings.BASE_DIR)
+TEMP_TRACING_DIR = tempfile.mkdtemp(dir=settings.BASE_DIR)
+
+
+@override_settings(REPLICA_DATABASES=['replica1'])
+class ReplicaRouterTest(SimpleTestCase):
+    def setUp(self):
+        self.router = ReplicaRouter()
+        # Как в запросе после ReplicaPinMiddleware.
+        unpin()
+
+    def tearDown(self):
+        pin_to_primary()
+
+    def test_reads_go_to_replica(self):
+        self.assertEqual(self.router.db_for_read(Post), 'replica1')
+        self.assertEqual(self.router.db_for_write(Post), 'default')
+
+    def test_pinned_reads_stay_on_primary(self):
+        pin_to_primary()
+        self.assertIsNone(self.router.db_for_read(Post))
+
+    def test_sessions_are_never_read_from_replica(self):
+        self.assertIsNone(self.router.db_for_read(Session))
+
+    def test_users_are_never_read_from_replica(self):
+        self.assertIsNone(self.router.db_for_read(User))
+
+    def test_only_read_models_use_replica(self):
+        for model in (Notification, PostScore, GroupStats, Change):
+            with self.subTest(model=model):
+                self.assertIsNone(self.router.db_for_read(model))
+
+    def test_reads_outside_requests_stay_on_primary(self):
+        """ Потоки воркеров и команд читают из основной базы. """
+        result = []
+        thread = threading.Thread(
+            target=lambda: result.append(self.router.db_for_read(Post)))
+        thread.start()
+        thread.join()
+        self.assertEqual(result, [None])
+
+    def test_primary_block_restores_replica_reads(self):
+        with primary():
+            self.assertIsNone(self.router.db_for_read(Post))
+        self.assertEqual(self.router.db_for_read(Post), 'replica1')
+
+
+# Алиаса 'lagging' нет в DATABASES: любое чтение, отправленное на эту
+# реплику, падает.
+@override_settings(REPLICA_DATABASES=['lagging'])
+class ReplicaReadsOutsideViewsTest(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = User.objects.create_user(username='author')
+        cls.follower = User.objects.create_user(username='follower')
+        cls.group = Group.objects.create(title='Группа', slug='group')
+        Follow.objects.create(user=cls.follower, author=cls.author)
+
+    def setUp(self):
+        unpin()
+        self.addCleanup(pin_to_primary)
+
+    def test_signal_handlers_read_primary(self):
+        post = Post.objects.create(author=self.author, text='Пост')
+        post.group = self.group
+        post.save()
+        self.assertEqual(
+            GroupStats.objects.get(group=self.group).post_count, 1)
+
+    def test_jobs_read_primary(self):
+        Post.objects.create(author=self.author, text='Пост')
+        job = Job.objects.get(name='posts.notify_followers')
+        self.assertTrue(queue.run(job, 'worker'))
+        self.assertTrue(
+            Notification.objects.filter(user=self.follower).exists())
+
+
+class ReplicaPinMiddlewareTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='auth')
+        cls.author = User.objects.create_user(username='author')
+
+    def setUp(self):
+        self.authorized_client = Client()
+        self.authorized_client.force_login(self.user)
+
+    def test_write_views_set_pin_cookie(self):
+        response = self.authorized_client.get(
+            reverse('posts:profile_follow',
+                    kwargs={'username': self.author.username}))
+        self.assertIn(PIN_COOKIE, response.cookies)
+
+    def test_read_views_dont_set_pin_cookie(self):
+        response = self.authorized_client.get(reverse('posts:index'))
+        self.assertNotIn(PIN_COOKIE, response.cookies)
+
+
+class ASGIHandlerTest(TransactionTestCase):
+    def setUp(self):
+        self.handler = ASGIHandler(WSGIHandler(), threads=2, query_threads=2)
+        self.addCleanup(self.handler.close)
+
+    def get(self, url):
+        messages = []
+
+        async def receive():
+            return {'type': 'http.request', 'body': b''}
+
+        async def send(message):
+            messages.append(message)
+
+        scope = {
+            'type': 'http', 'method': 'GET', 'path': url,
+            'query_string': b'', 'headers': [],
+            'client': ('127.0.0.1', 50000), 'server': ('testserver', 80),
+        }
+        asyncio.run(self.handler(scope, receive, send))
+        return messages[0]['status'], b''.join(
+            message.get('body', b'') for message in messages[1:])
+
+    def test_read_views(self):
+        """ Страницы чтения отдаются через ASGI. """
+        author = User.objects.create_user(username='author')
+        post = Post.objects.create(author=author, text='Пост через ASGI')
+        for url in (reverse('posts:profile', args=[author.username]),
+                    reverse('posts:post_detail', args=[post.id])):
+            with self.subTest(url=url):
+                status, body = self.get(url)
+                self.assertEqual(status, 200)
+                self.assertIn('Пост через ASGI', body.decode())
+        self.assertEqual(
+            self.get(reverse('posts:profile', args=['nobody']))[0], 404)
+
+    @override_settings(ROOT_URLCONF=__name__)
+    def test_lookups_run_concurrently(self):
+        """ Под ASGI вызовы gather выполняются одновременно. """
+        self.assertEqual(self.get('/barrier/'), (200, b'ok'))
+
+
+class SerializedWriteTest(TransactionTestCase):
+    def test_write_begins_immediate(self):
+        """ Запись начинается с BEGIN IMMEDIATE под блокировкой. """
+        with CaptureQueriesContext(connection) as queries:
+            with serialized_write():
+                self.assertTrue(connection.in_atomic_block)
+                User.objects.create_user(username='writer')
+        self.assertEqual(queries[0]['sql'], 'BEGIN IMMEDIATE')
+        self.assertFalse(connection.begin_immediate)
+
+    def test_error_rolls_back(self):
+        """ Исключение откатывает запись и отпускает блокировку. """
+        with self.assertRaises(ValueError):
+            with serialized_write():
+                User.objects.create_user(username='writer')
+                raise ValueError
+        self.assertFalse(User.objects.exists())
+        with serialized_write():
+            User.objects.create_user(username='writer')
+        self.assertTrue(User.objects.exists())
+
+
+class SerializedWriteViewsTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='auth')
+        cls.author = User.objects.create_user(username='author')
+
+    def setUp(self):
+        self.authorized_client = Client()
+        self.authorized_client.force_login(self.user)
+        patcher = mock.patch('core.db._write_lock')
+        self.lock = patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_form_page_is_rendered_without_lock(self):
+        """ Страница формы не ждёт пишущих. """
+        response = self.authorized_client.get(reverse('posts:post_create'))
+        self.assertEqual(response.status_code, 200)
+        self.lock.__enter__.assert_not_called()
+
+    def test_follow_takes_lock(self):
+        self.authorized_client.get(
+            reverse('posts:profile_follow',
+                    kwargs={'username': self.author.username}))
+        self.lock.__enter__.assert_called_once()
+
+
+class ConfigureSqliteTest(TestCase):
+    @override_settings(SQLITE_PRAGMAS={'cache_size': -1234})
+    def test_pragmas_applied_to_new_connection(self):
+        """ SQLITE_PRAGMAS применяются к каждому новому соединению. """
+        new_connection = connection.copy()
+        try:
+            with new_connection.cursor() as cursor:
+                cursor.execute('PRAGMA cache_size')
+                self.assertEqual(cursor.fetchone()[0], -1234)
+        finally:
+            new_connection.close()
+
+    def test_other_vendors_are_skipped(self):
+        other = mock.Mock(vendor='postgresql')
+        configure_sqlite(None, other)
+        other.cursor.assert_not_called()
+
+
+@override_settings(PROFILER_DIR=TEMP_PROFILER_DIR, PROFILER_INTERVAL=0.0001)
+class SamplingProfilerMiddlewareTest(TestCase):
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        shutil.rmtree(TEMP_PROFILER_DIR, ignore_errors=True)
+
+    def setUp(self):
+        shutil.rmtree(TEMP_PROFILER_DIR, ignore_errors=True)
+        self.profiles = os.path.join(TEMP_PROFILER_DIR, 'posts.index')
+
+    def test_signed_header_enables_profiling(self):
+        self.client.get(reverse('posts:index'), HTTP_X_PROFILE=make_token())
+        self.assertTrue(os.listdir(self.profiles))
+
+    def test_unsigned_header_is_ignored(self):
+        self.client.get(reverse('posts:index'), HTTP_X_PROFILE='profile')
+        self.assertFalse(os.path.exists(self.profiles))
+
+    @override_settings(PROFILER_SAMPLE_RATE=1, PROFILER_MAX_FILES=2)
+    def test_sampled_profiles_are_rotated(self):
+        for _ in range(4):
+            self.client.get(reverse('posts:index'))
+        self.assertEqual(len(os.listdir(self.profiles)), 2)
+
+
+class QueryLogTest(TestCase):
+    def test_fingerprint_normalizes_literals(self):
+        self.assertEqual(
+            fingerprint("SELECT * FROM t WHERE a = 'x''y' AND b IN "
+                        "(%s, %s,  %s) LIMIT 21"),
+            'SELECT * FROM t WHERE a = ? AND b IN (...) LIMIT ?',
+        )
+
+    def test_slow_query_is_logged_with_origin(self):
+        author = User.objects.create_user(username='author')
+        post = Post.objects.create(author=author, text='Тестовый пост')
+        with override_settings(SLOW_QUERY_MS=0), \
+                self.assertLogs('core.querylog', 'WARNING') as logs:
+            self.client.get(reverse('posts:post_detail', args=[post.id]))
+        output = '\n'.join(logs.output)
+        self.assertIn('код: posts/views.py', output)
+        self.assertIn('шаблон: posts/post_detail.html', output)
+
+    @override_settings(QUERY_STATS_INTERVAL=0)
+    def test_stats_are_flushed_to_file(self):
+        with tempfile.TemporaryDirectory(dir=settings.BASE_DIR) as path:
+            with override_settings(
+                    QUERY_STATS_FILE=os.path.join(path, 'stats.jsonl')):
+                Post.objects.count()
+                with open(settings.QUERY_STATS_FILE) as file:
+                    self.assertIn('"count": 1', file.read())
+
+
+@override_settings(METRICS_DIR=TEMP_METRICS_DIR)
+class MetricsTest(TestCase):
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        shutil.rmtree(TEMP_METRICS_DIR, ignore_errors=True)
+
+    def test_metrics_break_down_request_time(self):
+        self.client.get(reverse('posts:index'))
+        content = self.client.get('/metrics').content.decode()
+        for phase in ('total', 'db', 'template', 'cache'):
+            with self.subTest(phase=phase):
+                sum_line = re.search(
+                    r'^yatube_request_seconds_sum'
+                    rf'{{view="posts:index",phase="{phase}"}} (\S+)$',
+                    content, re.MULTILINE)
+                self.assertGreater(float(sum_line.group(1)), 0)
+        self.assertIn(
+            'yatube_cache_requests_total{view="posts:index",result="miss"}',
+            content)
+        self.assertIn('yatube_response_bytes_count{view="posts:index"}',
+                      content)
+
+    def test_files_of_finished_processes_are_pruned(self):
+        """ Метрики завершившегося процесса не суммируются вечно. """
+        process = subprocess.Popen([sys.executable, '-c', ''])
+        process.wait()
+        self.client.get(reverse('posts:index'))
+        metrics.registry.flush(force=True)
+        dead = os.path.join(TEMP_METRICS_DIR, f'{process.pid}.json')
+        with open(os.path.join(TEMP_METRICS_DIR,
+                               f'{os.getpid()}.json')) as file:
+            snapshot = json.load(file)
+        with open(dead, 'w') as file:
+            json.dump(snapshot, file)
+        count = re.compile(r'^yatube_request_seconds_count'
+                           r'{view="posts:index",phase="total"} (\d+)$',
+                           re.MULTILINE)
+        before = int(count.search(metrics.render_prometheus(
+            {'posts:index': snapshot['posts:index']})).group(1))
+        content = self.client.get('/metrics').content.decode()
+        self.assertEqual(int(count.search(content).group(1)), before)
+        self.assertFalse(os.path.exists(dead))
+
+    @override_settings(METRICS_DIR=None)
+    def test_metrics_are_not_flushed_without_dir(self):
+        """ Без METRICS_DIR, как во всём прогоне тестов, файлов нет. """
+        self.client.get(reverse('posts:index'))
+        with mock.patch('core.metrics.os.replace') as replace:
+            metrics.registry.flush(force=True)
+        replace.assert_not_called()
+        self.assertEqual(metrics.merge_snapshots(), {})
+
+    def test_metrics_are_not_public(self):
+        response = self.client.get('/metrics', REMOTE_ADDR='10.0.0.1')
+        self.assertEqual(response.status_code, 403)
+
+
+@override_settings(TRACING_DIR=TEMP_TRACING_DIR,
+                   TRACING_TRUSTED_IPS=('127.0.0.1',))
+class TracingTest(TestCase):
+    trace_id = '4bf92f3577b34da6a3ce929d0e0e4736'
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        shutil.rmtree(TEMP_TRACING_DIR, ignore_errors=True)
+
+    def get_index(self, flags, address='127.0.0.1'):
+        return self.client.get(
+            reverse('posts:index'), REMOTE_ADDR=address,
+            HTTP_TRACEPARENT=f'00-{self.trace_id}-00f067aa0ba902b7-{flags}')
+
+    def test_sampled_request_is_exported_with_nested_spans(self):
+        response = self.get_index('01')
+        self.assertTrue(
+            response['traceresponse'].startswith(f'00-{self.trace_id}-'))
+        exporter.flush()
+        spans = []
+        for name in os.listdir(TEMP_TRACING_DIR):
+            with open(os.path.join(TEMP_TRACING_DIR, name)) as file:
+                for line in file:
+                    for resource in json.loads(line)['resourceSpans']:
+                        for scope in resource['scopeSpans']:
+                            spans.extend(scope['spans'])
+        by_id = {span['spanId']: span for span in spans}
+        names = {span['name'] for span in spans}
+        for name in ('GET posts:index', 'view posts:index',
+                     'template posts/index.html', 'db.query'):
+            with self.subTest(name=name):
+                self.assertIn(name, names)
+        for span in spans:
+            self.assertEqual(span['traceId'], self.trace_id)
+            if span['name'] != 'GET posts:index':
+                self.assertIn(span['parentSpanId'], by_id)
+
+    def test_unsampled_request_is_not_traced(self):
+        response = self.get_index('00')
+        self.assertNotIn('traceresponse', response)
+
+    @override_settings(TRACING_SAMPLE_RATE=0)
+    def test_untrusted_sampled_flag_is_ignored(self):
+        """ Флаг sampled от недоверенного адреса не включает трассу. """
+        response = self.get_index('01', address='10.0.0.1')
+        self.assertNotIn('traceresponse', response)
+
+
+@override_settings(RATE_LIMITS={
+    'posts:add_comment': {'user': '2/m', 'ip': '3/m'},
+})
+class RateLimitTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.users = [User.objects.create_user(username=f'user{i}')
+                     for i in range(2)]
+        cls.post = Post.objects.create(author=cls.users[0], text='Пост')
+
+    def setUp(self):
+        cache.clear()
+        # Середина минутного окна.
+        patcher = mock.patch('core.ratelimit.time')
+        self.time = patcher.start().time
+        self.time.return_value = 60 * 1000 + 30
+        self.addCleanup(patcher.stop)
+
+    def comment(self, user, address='127.0.0.1'):
+        client = Client(REMOTE_ADDR=address)
+        client.force_login(user)
+        return client.post(
+            reverse('posts:add_comment', args=[self.post.id]),
+            {'text': 'Комментарий'})
+
+    def test_user_and_ip_buckets(self):
+        """ Лимит пользователя и общий лимит адреса отвечают 429. """
+        first, second = self.users
+        self.assertEqual(self.comment(first).status_code, 302)
+        self.assertEqual(self.comment(first).status_code, 302)
+        response = self.comment(first)
+        self.assertEqual(response.status_code, 429)
+        self.assertEqual(response['Retry-After'], '30')
+        self.assertEqual(self.comment(second).status_code, 302)
+        self.assertEqual(self.comment(second).status_code, 429)
+
+    @override_settings(RATE_LIMIT_STORE='database')
+    def test_rejected_request_takes_no_tokens(self):
+        """ Отказ по адресу не тратит лимит пользователя; таблица. """
+        first, second = self.users
+        for _ in range(2):
+            self.assertEqual(self.comment(first).status_code, 302)
+        self.assertEqual(self.comment(second).status_code, 302)
+        self.assertEqual(self.comment(second).status_code, 429)
+        self.assertEqual(self.comment(second, '10.0.0.1').status_code, 302)
+        self.assertEqual(self.comment(second, '10.0.0.1').status_code, 429)
+
+    @override_settings(RATE_LIMIT_STORE='database', RATE_LIMITS={
+        'posts:add_comment': {'user': '2/h'},
+    })
+    def test_long_window_outlives_cache_timeout(self):
+        """ Часовое окно в таблице живёт дольше 300 с и потом
+        учитывается как прошлое.
+        """
+        self.time.return_value = 3600 * 1000
+        user = self.users[0]
+        for _ in range(2):
+            self.assertEqual(self.comment(user).status_code, 302)
+        self.time.return_value += 400
+        self.assertEqual(self.comment(user).status_code, 429)
+        self.time.return_value += 3600
+        self.assertEqual(self.comment(user).status_code, 429)
+        self.time.return_value += 1800
+        self.assertEqual(self.comment(user).status_code, 302)
+
+    @override_settings(RATE_LIMIT_CACHE='database_cache', CACHES={
+        'default': settings.CACHES['default'],
+        'database_cache': {
+            'BACKEND': 'django.core.cache.backends.db.DatabaseCache',
+            'LOCATION': 'yatube_cache',
+        },
+    })
+    def test_database_cache_is_rejected(self):
+        with self.assertRaises(ImproperlyConfigured):
+            self.comment(self.users[0])
+
+    def test_reads_are_not_limited(self):
+        client = Client()
+        client.force_login(self.users[0])
+        url = reverse('posts:add_comment', args=[self.post.id])
+        for _ in range(4):
+            self.assertEqual(client.get(url).status_code, 302)
+
+    def test_sliding_window(self):
+        """ Прошлое окно учитывается долей, ещё попадающей в период. """
+        self.assertEqual(estimate(10, 2, elapsed=15, period=60), 9.5)
+        self.assertEqual(retry_after(0, 2, 2, elapsed=15, period=60), 45)
+        self.assertEqual(retry_after(4, 0, 2, elapsed=15, period=60), 30)
+
+
+class StaticFilesTest(SimpleTestCase):
+    CSS = 'body { color: black; }\n' * 100
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.directory = tempfile.TemporaryDirectory(dir=settings.BASE_DIR)
+        source = os.path.join(cls.directory.name, 'source')
+        cls.root = os.path.join(cls.directory.name, 'root')
+        os.makedirs(os.path.join(source, 'css'))
+        with open(os.path.join(source, 'css', 'site.css'), 'w') as file:
+            file.write(cls.CSS)
+        with override_settings(
+                STATICFILES_DIRS=[source], STATIC_ROOT=cls.root,
+                STATICFILES_STORAGE='core.backends.storage.'
+                                    'CompressedManifestStaticFilesStorage'):
+            call_command('collectstatic', interactive=False, verbosity=0)
+        with open(os.path.join(cls.root, 'staticfiles.json')) as file:
+            cls.hashed = json.load(file)['paths']['css/site.css']
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.directory.cleanup()
+        super().tearDownClass()
+
+    def request(self, path, **environ):
+        def application(environ, start_response):
+            start_response('404 Not Found', [])
+            return [b'django']
+
+        def start_response(status, headers):
+            response.update(status=status, headers=dict(headers))
+
+        response = {}
+        environ.setdefault('REQUEST_METHOD', 'GET')
+        body = b''.join(StaticFiles(application, self.root)(
+            dict(environ, PATH_INFO=path), start_response))
+        return response['status'], response['headers'], body
+
+    def test_collectstatic_hashes_and_compresses(self):
+        """ collectstatic кладёт хешированный файл и его gzip-копию. """
+        self.assertRegex(self.hashed, r'^css/site\.[0-9a-f]{12}\.css$')
+        with gzip.open(os.path.join(self.root, self.hashed + '.gz')) as file:
+            self.assertEqual(file.read().decode(), self.CSS)
+
+    def test_hashed_file_is_immutable(self):
+        """ Хешированный файл кешируется навсегда, исходный — ненадолго. """
+        status, headers, body = self.request('/static/' + self.hashed)
+        self.assertEqual(status, '200 OK')
+        self.assertEqual(body.decode(), self.CSS)
+        self.assertIn('immutable', headers['Cache-Control'])
+        self.assertEqual(headers['Content-Type'], 'text/css')
+        _, headers, _ = self.request('/static/css/site.css')
+        self.assertEqual(headers['Cache-Control'], 'public, max-age=60')
+
+    def test_precompressed_variant(self):
+        """ Сжатая копия выбирается по Accept-Encoding. """
+        status, headers, body = self.request(
+            '/static/' + self.hashed, HTTP_ACCEPT_ENCODING='gzip, br;q=0')
+        self.assertEqual(headers['Content-Encoding'], 'gzip')
+        self.assertEqual(headers['Vary'], 'Accept-Encoding')
+        self.assertEqual(gzip.decompress(body).decode(), self.CSS)
+        status, _, _ = self.request(
+            '/static/' + self.hashed, HTTP_ACCEPT_ENCODING='gzip',
+            HTTP_IF_NONE_MATCH=headers['ETag'])
+        self.assertEqual(status, '304 Not Modified')
+
+    def test_range_requests(self):
+        """ Range отдаёт часть несжатого файла или 416. """
+        status, headers, body = self.request(
+            '/static/' + self.hashed, HTTP_RANGE='bytes=5-9',
+            HTTP_ACCEPT_ENCODING='gzip')
+        self.assertEqual(status, '206 Partial Content')
+        self.assertEqual(body.decode(), self.CSS[5:10])
+        self.assertEqual(headers['Content-Range'],
+                         f'bytes 5-9/{len(self.CSS)}')
+        self.assertNotIn('Content-Encoding', headers)
+        status, _, _ = self.request('/static/' + self.hashed,
+                                    HTTP_RANGE='bytes=100000-')
+        self.assertEqual(status, '416 Range Not Satisfiable')
+
+    def test_unknown_paths_reach_application(self):
+        self.assertEqual(self.request('/static/missing.css')[2], b'django')
+        self.assertEqual(self.request('/about/')[2], b'django')
+
+    def test_parse_range(self):
+        self.assertEqual(parse_range('bytes=-10', 100), (90, 99))
+        self.assertEqual(parse_range('bytes=90-200', 100), (90, 99))
+        self.assertIsNone(parse_range('bytes=0-1,5-6', 100))
+        self.assertIsNone(parse_range(None, 100))
+
+
+class CompressionMiddlewareTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        author = User.objects.create_user(username='author')
+        Post.objects.create(author=author, text='Текст поста')
+
+    def setUp(self):
+        compressed_cache.clear()
+
+    def respond(self, response, **headers):
+        request = RequestFactory().get('/', **headers)
+        return CompressionMiddleware(lambda request: response)(request)
+
+    def test_pages_are_compressed_once(self):
+        """ Повтор той же страницы берёт сжатое тело из кеша. """
+        client = Client()
+        plain = client.get(reverse('posts:index'))
+        self.assertFalse(plain.has_header('Content-Encoding'))
+        self.assertIn('Accept-Encoding', plain['Vary'])
+        for _ in range(2):
+            response = client.get(reverse('posts:index'),
+                                  HTTP_ACCEPT_ENCODING='gzip, deflate')
+            self.assertEqual(response['Content-Encoding'], 'gzip')
+            self.assertEqual(gzip.decompress(response.content),
+                             plain.content)
+        self.assertEqual((compressed_cache.hits, compressed_cache.misses),
+                         (1, 1))
+
+    def test_streaming_response(self):
+        """ Потоковый ответ сжимается по кускам. """
+        chunks = [b'<p>chunk</p>' * 50] * 3
+        response = self.respond(StreamingHttpResponse(iter(chunks)),
+                                HTTP_ACCEPT_ENCODING='gzip')
+        self.assertEqual(response['Content-Encoding'], 'gzip')
+        parts = list(response.streaming_content)
+        self.assertGreaterEqual(len(parts), 3)
+        self.assertEqual(gzip.decompress(b''.join(parts)), b''.join(chunks))
+
+    def test_skips_media_and_small_responses(self):
+        """ Картинки, короткие и уже сжатые ответы не сжимаются. """
+        body = b'x' * 1000
+        encoded = HttpResponse(body)
+        encoded['Content-Encoding'] = 'br'
+        for response in (HttpResponse(body, content_type='image/png'),
+                         HttpResponse(b'short'), encoded):
+            response = self.respond(response, HTTP_ACCEPT_ENCODING='gzip')
+            self.assertNotEqual(response.get('Content-Encoding'), 'gzip')
+
+
+class MediaViewTest(SimpleTestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.directory = tempfile.TemporaryDirectory(dir=settings.BASE_DIR)
+        cls.settings = override_settings(MEDIA_ROOT=cls.directory.name)
+        cls.settings.enable()
+        os.makedirs(os.path.join(cls.directory.name, 'cache', 'ab'))
+        os.makedirs(os.path.join(cls.directory.name, 'posts'))
+        cls.data = bytes(range(256)) * 40
+        for name in ('cache/ab/thumb.jpg', 'posts/image.jpg',
+                     'posts/фото 1.jpg'):
+            with open(os.path.join(cls.directory.name, name), 'wb') as file:
+                file.write(cls.data)
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.settings.disable()
+        cls.directory.cleanup()
+        super().tearDownClass()
+
+    def test_file_and_cache_headers(self):
+        """ Миниатюры кешируются навсегда, загрузки — на сутки. """
+        response = self.client.get('/media/cache/ab/thumb.jpg')
+        self.assertEqual(b''.join(response.streaming_content), self.data)
+        self.assertEqual(response['Content-Type'], 'image/jpeg')
+        self.assertIn('immutable', response['Cache-Control'])
+        response = self.client.get('/media/posts/image.jpg')
+        self.assertEqual(response['Cache-Control'], 'public, max-age=86400')
+
+    def test_conditional_and_range(self):
+        """ ETag даёт 304, Range — часть файла или 416. """
+        etag = self.client.get('/media/posts/image.jpg')['ETag']
+        response = self.client.get('/media/posts/image.jpg',
+                                   HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+        response = self.client.get('/media/posts/image.jpg',
+                                   HTTP_RANGE='bytes=256-511')
+        self.assertEqual(response.status_code, 206)
+        self.assertEqual(b''.join(response.streaming_content),
+                         self.data[256:512])
+        self.assertEqual(response['Content-Range'],
+                         f'bytes 256-511/{len(self.data)}')
+        response = self.client.get('/media/posts/image.jpg',
+                                   HTTP_RANGE=f'bytes={len(self.data)}-')
+        self.assertEqual(response.status_code, 416)
+
+    @override_settings(MEDIA_SENDFILE_HEADER='X-Accel-Redirect')
+    def test_accel_redirect(self):
+        response = self.client.get('/media/cache/ab/thumb.jpg')
+        self.assertEqual(response['X-Accel-Redirect'],
+                         '/protected-media/cache/ab/thumb.jpg')
+        self.assertEqual(response.content, b'')
+
+    def test_sendfile_headers_are_quoted(self):
+        """ Кириллица и пробел в имени файла кодируются в заголовке. """
+        url = '/media/posts/фото 1.jpg'
+        with override_settings(MEDIA_SENDFILE_HEADER='X-Accel-Redirect'):
+            response = self.client.get(url)
+        self.assertEqual(
+            response['X-Accel-Redirect'],
+            '/protected-media/posts/%D1%84%D0%BE%D1%82%D0%BE%201.jpg')
+        with override_settings(MEDIA_SENDFILE_HEADER='X-Sendfile'):
+            response = self.client.get(url)
+        self.assertEqual(
+            response['X-Sendfile'],
+            quote(os.path.join(self.directory.name, 'posts', 'фото 1.jpg')))
+
+    def test_missing_and_outside_files(self):
+        for path in ('/media/posts/missing.jpg', '/media/posts/'):
+            self.assertEqual(self.client.get(path).status_code, 404)
+        self.assertEqual(self.client.get('/media/../manage.py').status_code,
+                         400)
+
+
+@override_settings(IMAGE_WORKERS=0)
+class ImageEndpointTest(SimpleTestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.directory = tempfile.TemporaryDirectory(dir=settings.BASE_DIR)
+        cls.settings = override_settings(MEDIA_ROOT=cls.directory.name)
+        cls.settings.enable()
+        os.makedirs(os.path.join(cls.directory.name, 'posts'))
+        Image.new('RGB', (300, 200), 'red').save(
+            os.path.join(cls.directory.name, 'posts', 'photo.png'))
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.settings.disable()
+        cls.directory.cleanup()
+        super().tearDownClass()
+
+    def setUp(self):
+        patcher = mock.patch.object(images, 'cache', images.ResizeCache())
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        shutil.rmtree(images.cache.root, ignore_errors=True)
+
+    def get(self, response):
+        return Image.open(io.BytesIO(b''.join(response.streaming_content)))
+
+    def test_resized_once(self):
+        """ Картинка сжимается при первом запросе и берётся из кеша. """
+        url = images.url('posts/photo.png', 60, 20)
+        with mock.patch.object(images, 'resize',
+                               wraps=images.resize) as resize:
+            first = self.client.get(url)
+            second = self.client.get(url)
+        self.assertEqual(resize.call_count, 1)
+        self.assertEqual(self.get(first).size, (60, 20))
+        self.assertEqual(self.get(second).format, 'JPEG')
+        self.assertIn('immutable', second['Cache-Control'])
+
+    def test_signature_and_size_are_checked(self):
+        """ Без подписи или сверх IMAGE_MAX_SIZE — 404. """
+        url = images.url('posts/photo.png', 60, 20)
+        self.assertEqual(
+            self.client.get(url.replace('60x20', '61x20')).status_code, 404)
+        self.assertEqual(self.client.get(
+            images.url('posts/photo.png', 3000, 20)).status_code, 404)
+        self.assertEqual(self.client.get(
+            images.url('posts/missing.png', 60, 20)).status_code, 404)
+
+    @override_settings(IMAGE_WORKERS=1)
+    def test_process_pool(self):
+        """ С IMAGE_WORKERS картинку сжимает пул процессов. """
+        response = self.client.get(images.url('posts/photo.png', 30, 30))
+        images.cache.pool.shutdown()
+        self.assertEqual(self.get(response).size, (30, 30))
+
+    @override_settings(IMAGE_WORKERS=1)
+    def test_broken_pool_is_replaced(self):
+        """ Сломанный пул заменяется новым, задача отправляется снова. """
+        broken = mock.Mock()
+        broken.submit.side_effect = BrokenProcessPool
+        images.cache.pool = broken
+        response = self.client.get(images.url('posts/photo.png', 30, 30))
+        broken.shutdown.assert_called_once_with(wait=False)
+        images.cache.pool.shutdown()
+        self.assertEqual(self.get(response).size, (30, 30))
+
+    def test_dead_worker_drops_pool(self):
+        """ Задача, упавшая вместе с пулом, сбрасывает пул. """
+        pool = images.cache.pool = mock.Mock()
+        future = Future()
+        future.set_exception(BrokenProcessPool())
+        images.cache.finished('name', future)
+        pool.shutdown.assert_called_once_with(wait=False)
+        self.assertIsNone(images.cache.pool)
+
+    @override_settings(IMAGE_WORKERS=1)
+    def test_dead_worker_gives_503(self):
+        """ Запрос, чья задача умерла вместе с пулом, получает 503. """
+        future = Future()
+        future.set_exception(BrokenProcessPool())
+        pool = images.cache.pool = mock.Mock()
+        pool.submit.return_value = future
+        response = self.client.get(images.url('posts/photo.png', 30, 30))
+        self.assertEqual(response.status_code, 503)
+        self.assertEqual(response['Retry-After'], '1')
+        self.assertIsNone(images.cache.pool)
+
+    def test_cache_is_measured_outside_lock(self):
+        """ Первый подсчёт размера кеша не держит блокировку. """
+        locked = []
+
+        def cached_files(root):
+            locked.append(images.cache.lock.locked())
+            return iter(())
+        with mock.patch.object(images, 'cached_files', cached_files):
+            images.cache.resized('posts/photo.png', 10, 10)
+        self.assertEqual(locked, [False])
+
+    def test_evict_oldest(self):
+        """ Переполненный кеш теряет давно не использованные файлы. """
+        names = [images.cache.resized('posts/photo.png', size, size)
+                 for size in (10, 20, 30)]
+        paths = [os.path.join(settings.MEDIA_ROOT, name) for name in names]
+        now = time.time()
+        for age, path in zip((300, 100, 200), paths):
+            os.utime(path, (now - age, now - age))
+        sizes = [os.path.getsize(path) for path in paths]
+        images.evict(images.cache.root, (sizes[1] + sizes[2]) / 0.9)
+        self.assertEqual([os.path.exists(path) for path in paths],
+                         [False, True, True])
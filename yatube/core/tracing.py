@@ -0,0 +1,252 @@
+"""Трассировка запросов со вложенными спанами.
+
+TracingMiddleware открывает корневой спан запроса, если запрос выбран
+при сэмплировании: по флагу из заголовка `traceparent` (W3C Trace
+Context) или с вероятностью TRACING_SAMPLE_RATE. Флагу верим только
+от адресов из TRACING_TRUSTED_IPS; иначе любой клиент мог бы включить
+трассировку каждого своего запроса, и для чужих заголовков решает
+TRACING_SAMPLE_RATE, хотя trace id продолжается. Дочерние спаны
+создают TracingViewMiddleware (view), execute wrapper (SQL) и
+core.metrics.measure (шаблоны, кеш, миниатюры). Для невыбранных
+запросов span() ничего не делает.
+
+Готовые трассы пачками пишет фоновый поток: строки JSON в формате
+OTLP/JSON, как у file exporter OpenTelemetry Collector.
+"""
+import atexit
+import json
+import os
+import queue
+import random
+import re
+import threading
+import time
+from contextlib import contextmanager
+
+from django.conf import settings
+
+TRACEPARENT_RE = re.compile(
+    r'^00-([0-9a-f]{32})-([0-9a-f]{16})-([0-9a-f]{2})$')
+
+SPAN_KIND_INTERNAL = 1
+SPAN_KIND_SERVER = 2
+SPAN_KIND_CLIENT = 3
+STATUS_ERROR = 2
+
+_trace = threading.local()
+
+
+class Span:
+    __slots__ = ('trace_id', 'span_id', 'parent_id', 'name', 'kind',
+                 'start', 'end', 'attributes', 'error')
+
+    def __init__(self, trace_id, parent_id, name, kind, attributes):
+        self.trace_id = trace_id
+        self.span_id = os.urandom(8).hex()
+        self.parent_id = parent_id
+        self.name = name
+        self.kind = kind
+        self.attributes = attributes
+        self.error = False
+        self.start = time.time_ns()
+        self.end = None
+
+    def to_otlp(self):
+        span = {
+            'traceId': self.trace_id,
+            'spanId': self.span_id,
+            'name': self.name,
+            'kind': self.kind,
+            'startTimeUnixNano': str(self.start),
+            'endTimeUnixNano': str(self.end),
+            'attributes': [
+                {'key': key, 'value': otlp_value(value)}
+                for key, value in self.attributes.items()
+            ],
+            'status': {'code': STATUS_ERROR} if self.error else {},
+        }
+        if self.parent_id:
+            span['parentSpanId'] = self.parent_id
+        return span
+
+
+def otlp_value(value):
+    if isinstance(value, bool):
+        return {'boolValue': value}
+    if isinstance(value, int):
+        return {'intValue': str(value)}
+    if isinstance(value, float):
+        return {'doubleValue': value}
+    return {'stringValue': str(value)}
+
+
+@contextmanager
+def _span(name, kind, attributes):
+    stack = _trace.stack
+    span = Span(stack[-1].trace_id, stack[-1].span_id, name, kind,
+                attributes)
+    stack.append(span)
+    try:
+        yield span
+    except BaseException:
+        span.error = True
+        raise
+    finally:
+        span.end = time.time_ns()
+        stack.pop()
+        _trace.spans.append(span)
+
+
+class _NoSpan:
+    def __enter__(self):
+        return None
+
+    def __exit__(self, *exc_info):
+        return False
+
+
+NO_SPAN = _NoSpan()
+
+
+def span(name, kind=SPAN_KIND_INTERNAL, **attributes):
+    """Дочерний спан текущей трассы; без трассы — пустой контекст."""
+    if getattr(_trace, 'stack', None) is None:
+        return NO_SPAN
+    return _span(name, kind, attributes)
+
+
+def trace_query(execute, sql, params, many, context):
+    if getattr(_trace, 'stack', None) is None:
+        return execute(sql, params, many, context)
+    with _span('db.query', SPAN_KIND_CLIENT,
+               {'db.system': context['connection'].vendor,
+                'db.statement': sql}):
+        return execute(sql, params, many, context)
+
+
+def install_query_tracer(sender, connection, **kwargs):
+    if trace_query not in connection.execute_wrappers:
+        connection.execute_wrappers.insert(0, trace_query)
+
+
+class Exporter:
+    """Фоновая пакетная запись трасс в TRACING_DIR."""
+
+    def __init__(self):
+        self.queue = queue.Queue(maxsize=10000)
+        self.thread = None
+        self.lock = threading.Lock()
+
+    def export(self, spans):
+        if self.thread is None:
+            with self.lock:
+                if self.thread is None:
+                    self.thread = threading.Thread(target=self.run,
+                                                   daemon=True)
+                    self.thread.start()
+        try:
+            self.queue.put_nowait(spans)
+        except queue.Full:
+            pass
+
+    def run(self):
+        while True:
+            time.sleep(settings.TRACING_EXPORT_INTERVAL)
+            self.flush()
+
+    def flush(self):
+        batch = []
+        while True:
+            try:
+                batch.extend(self.queue.get_nowait())
+            except queue.Empty:
+                break
+        if not batch:
+            return
+        os.makedirs(settings.TRACING_DIR, exist_ok=True)
+        path = os.path.join(
+            settings.TRACING_DIR,
+            f'traces-{time.strftime("%Y%m%d")}-{os.getpid()}.jsonl')
+        line = json.dumps({'resourceSpans': [{
+            'resource': {'attributes': [{
+                'key': 'service.name',
+                'value': {'stringValue': settings.TRACING_SERVICE_NAME},
+            }]},
+            'scopeSpans': [{
+                'scope': {'name': __name__},
+                'spans': [span.to_otlp() for span in batch],
+            }],
+        }]})
+        with self.lock, open(path, 'a') as file:
+            file.write(line + '\n')
+
+
+exporter = Exporter()
+atexit.register(exporter.flush)
+
+
+def parse_traceparent(header):
+    """(trace_id, parent_id, sampled) из заголовка или None."""
+    match = TRACEPARENT_RE.match(header or '')
+    if not match or match.group(1) == '0' * 32:
+        return None
+    trace_id, parent_id, flags = match.groups()
+    return trace_id, parent_id, bool(int(flags, 16) & 1)
+
+
+class TracingMiddleware:
+    """Корневой спан запроса; ставьте первым в MIDDLEWARE."""
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        parent = parse_traceparent(request.META.get('HTTP_TRACEPARENT'))
+        if parent:
+            trace_id, parent_id, sampled = parent
+        else:
+            trace_id, parent_id, sampled = os.urandom(16).hex(), None, None
+        if (sampled is None or request.META.get('REMOTE_ADDR')
+                not in settings.TRACING_TRUSTED_IPS):
+            sampled = random.random() < settings.TRACING_SAMPLE_RATE
+        if not sampled:
+            return self.get_response(request)
+
+        root = Span(trace_id, parent_id, f'{request.method} request',
+                    SPAN_KIND_SERVER,
+                    {'http.method': request.method,
+                     'http.target': request.path})
+        _trace.stack, _trace.spans = [root], []
+        response = None
+        try:
+            response = self.get_response(request)
+        finally:
+            root.end = time.time_ns()
+            spans = _trace.spans + [root]
+            _trace.stack = _trace.spans = None
+            match = request.resolver_match
+            if match:
+                root.name = f'{request.method} {match.view_name}'
+                root.attributes['http.route'] = match.route
+            if response is None:
+                root.error = True
+            else:
+                root.attributes['http.status_code'] = response.status_code
+                root.error = response.status_code >= 500
+            exporter.export(spans)
+        response['traceresponse'] = f'00-{trace_id}-{root.span_id}-01'
+        return response
+
+
+class TracingViewMiddleware:
+    """Спан самого view; ставьте последним в MIDDLEWARE."""
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        with span('view') as current:
+            response = self.get_response(request)
+            if current is not None and request.resolver_match:
+                current.name = f'view {request.resolver_match.view_name}'
+            return response
@@ -1,4 +1,22 @@
+import mimetypes
+import os
+from concurrent.futures.process import BrokenProcessPool
+from urllib.parse import quote
+
+from django.conf import settings
+from django.core.exceptions import PermissionDenied
+from django.http import (FileResponse, Http404, HttpResponse,
+                         StreamingHttpResponse)
 from django.shortcuts import render
+from django.utils._os import safe_join
+from django.utils.cache import get_conditional_response
+from django.utils.http import http_date
+from django.views.decorators.http import require_safe
+from PIL import Image
+
+from . import images
+from .metrics import merge_snapshots, registry, render_prometheus
+from .static import IMMUTABLE, parse_range, read_range
 
 
 def page_not_found(request, exception):
@@ -15,3 +33,109 @@ def permission_denied(request, exception):
 
 def csrf_failure(request, reason=''):
     return render(request, 'core/403csrf.html')
+
+
+def metrics(request):
+    if request.META.get('REMOTE_ADDR') not in settings.METRICS_ALLOWED_IPS:
+        raise PermissionDenied
+    registry.flush(force=True)
+    return HttpResponse(
+        render_prometheus(merge_snapshots()),
+        content_type='text/plain; version=0.0.4; charset=utf-8',
+    )
+
+
+@require_safe
+def media(request, path):
+    """Файлы MEDIA_ROOT в production.
+
+    Миниатюры sorl-thumbnail (THUMBNAIL_PREFIX) не меняются под своим
+    именем и кешируются навсегда, остальное — на MEDIA_MAX_AGE.
+    """
+    return serve_file(
+        request, path,
+        IMMUTABLE if path.startswith(settings.THUMBNAIL_PREFIX)
+        else f'public, max-age={settings.MEDIA_MAX_AGE}')
+
+
+@require_safe
+def image(request, signature, width, height, path):
+    """Картинка path размера width x height, см. core.images."""
+    if (not 0 < width <= settings.IMAGE_MAX_SIZE
+            or not 0 < height <= settings.IMAGE_MAX_SIZE
+            or not images.check_signature(signature, path, width, height)):
+        raise Http404(path)
+    try:
+        name = images.cache.resized(path, width, height)
+    except BrokenProcessPool:
+        # Рабочий процесс умер; пул уже заменён, повтор сожмёт картинку.
+        response = HttpResponse(status=503)
+        response['Retry-After'] = '1'
+        return response
+    except (OSError, ValueError, Image.DecompressionBombError):
+        raise Http404(path)
+    return serve_file(request, name, IMMUTABLE)
+
+
+def serve_file(request, path, cache_control):
+    """Ответ с файлом path из MEDIA_ROOT.
+
+    Поддерживаются ETag, Last-Modified и один диапазон Range. С
+    MEDIA_SENDFILE_HEADER тело отдаёт сам веб-сервер: nginx по
+    X-Accel-Redirect на MEDIA_INTERNAL_URL или Apache по X-Sendfile;
+    иначе FileResponse, которому WSGI-сервер может дать sendfile.
+    """
+    try:
+        full_path = safe_join(settings.MEDIA_ROOT, path)
+        stat = os.stat(full_path)
+    except (OSError, ValueError):
+        raise Http404(path)
+    if not os.path.isfile(full_path):
+        raise Http404(path)
+    etag = f'"{stat.st_size:x}-{int(stat.st_mtime):x}"'
+    headers = {'ETag': etag, 'Last-Modified': http_date(stat.st_mtime),
+               'Cache-Control': cache_control}
+    not_modified = get_conditional_response(
+        request, etag=etag, last_modified=int(stat.st_mtime))
+    if not_modified is not None:
+        return with_headers(not_modified, headers)
+
+    sendfile_header = settings.MEDIA_SENDFILE_HEADER
+    if sendfile_header:
+        response = HttpResponse()
+        # Тип и диапазоны определит веб-сервер.
+        del response['Content-Type']
+        # Заголовок — ASCII: имена с кириллицей и пробелами кодируются.
+        response[sendfile_header] = quote(
+            full_path if sendfile_header == 'X-Sendfile'
+            else settings.MEDIA_INTERNAL_URL + path)
+        return with_headers(response, headers)
+
+    try:
+        byte_range = parse_range(
+            request.META.get('HTTP_RANGE')
+            if request.META.get('HTTP_IF_RANGE', etag) == etag else None,
+            stat.st_size)
+    except ValueError:
+        response = HttpResponse(status=416)
+        response['Content-Range'] = f'bytes */{stat.st_size}'
+        return response
+    if byte_range is None:
+        response = FileResponse(open(full_path, 'rb'))
+    else:
+        start, end = byte_range
+        response = StreamingHttpResponse(
+            read_range(full_path, start, end - start + 1), status=206)
+        response['Content-Range'] = f'bytes {start}-{end}/{stat.st_size}'
+        response['Content-Length'] = str(end - start + 1)
+        content_type, _ = mimetypes.guess_type(full_path)
+        response['Content-Type'] = (content_type
+                                    or 'application/octet-stream')
+    response['Accept-Ranges'] = 'bytes'
+    return with_headers(response, headers)
+
+
+def with_headers(response, headers):
+    for name, value in headers.items():
+        response[name] = value
+    return response
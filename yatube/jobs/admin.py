@@ -0,0 +1,27 @@
+from django.contrib import admin
+
+from .models import Email, Job
+
+
+class JobAdmin(admin.ModelAdmin):
+    list_display = (
+        'pk',
+        'name',
+        'status',
+        'priority',
+        'run_at',
+        'attempts',
+    )
+    list_filter = ('status', 'name')
+    search_fields = ('dedup_key',)
+
+
+admin.site.register(Job, JobAdmin)
+
+
+class EmailAdmin(admin.ModelAdmin):
+    list_display = ('pk', 'status', 'run_at', 'attempts', 'created')
+    list_filter = ('status',)
+
+
+admin.site.register(Email, EmailAdmin)
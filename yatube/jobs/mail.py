@@ -0,0 +1,129 @@
+"""Исходящая почта через очередь.
+
+С EMAIL_BACKEND = 'jobs.mail.OutboxBackend' send_mail и
+PasswordResetView только записывают письма в таблицу Email, одним
+INSERT на вызов send_messages. Доставляет их `manage.py send_emails`:
+забирает пачку писем и отправляет через OUTBOX_EMAIL_BACKEND по одному
+соединению на пачку. Неотправленное письмо повторяется с той же
+задержкой, что и задачи jobs.queue.
+"""
+import json
+import logging
+import traceback
+from base64 import b64decode, b64encode
+from email.mime.base import MIMEBase
+
+from django.conf import settings
+from django.core.mail import EmailMultiAlternatives, get_connection
+from django.core.mail.backends.base import BaseEmailBackend
+from django.db import DatabaseError
+
+from . import queue
+from .models import Email
+from .worker import Worker
+
+logger = logging.getLogger(__name__)
+
+
+def serialize(message):
+    if any(isinstance(attachment, MIMEBase)
+           for attachment in message.attachments):
+        raise ValueError('Вложения MIMEBase нельзя поставить в очередь')
+    return json.dumps({
+        'subject': message.subject,
+        'body': message.body,
+        'from_email': message.from_email,
+        'to': message.to,
+        'cc': message.cc,
+        'bcc': message.bcc,
+        'reply_to': message.reply_to,
+        'headers': message.extra_headers,
+        'content_subtype': message.content_subtype,
+        'alternatives': getattr(message, 'alternatives', []),
+        'attachments': [
+            (filename, b64encode(content if isinstance(content, bytes)
+                                 else content.encode()).decode(), mimetype)
+            for filename, content, mimetype in message.attachments
+        ],
+    })
+
+
+def deserialize(data):
+    data = json.loads(data)
+    message = EmailMultiAlternatives(
+        subject=data['subject'],
+        body=data['body'],
+        from_email=data['from_email'],
+        to=data['to'],
+        cc=data['cc'],
+        bcc=data['bcc'],
+        reply_to=data['reply_to'],
+        headers=data['headers'],
+        alternatives=[tuple(item) for item in data['alternatives']],
+    )
+    message.content_subtype = data['content_subtype']
+    for filename, content, mimetype in data['attachments']:
+        message.attach(filename, b64decode(content), mimetype)
+    return message
+
+
+class OutboxBackend(BaseEmailBackend):
+    """Почтовый бэкенд, который ставит письма в очередь."""
+
+    def send_messages(self, email_messages):
+        emails = [Email(message=serialize(message),
+                        max_attempts=settings.JOBS_MAX_ATTEMPTS)
+                  for message in email_messages if message.recipients()]
+        try:
+            Email.objects.bulk_create(emails)
+        except DatabaseError:
+            if not self.fail_silently:
+                raise
+            return 0
+        return len(emails)
+
+
+def deliver(worker, batch_size=None):
+    """Отправляет пачку писем; возвращает (отправлено, не отправлено)."""
+    emails = queue.claim(worker, batch_size or settings.OUTBOX_BATCH_SIZE,
+                         model=Email)
+    if not emails:
+        return 0, 0
+    sent = []
+    connection = get_connection(settings.OUTBOX_EMAIL_BACKEND)
+    try:
+        for email in emails:
+            try:
+                connection.open()
+                connection.send_messages([deserialize(email.message)])
+            except Exception:
+                error = traceback.format_exc()
+                logger.warning('%s не отправлено (попытка %d из %d)\n%s',
+                               email, email.attempts, email.max_attempts,
+                               error)
+                queue.fail(email, worker, error)
+                # Следующее письмо — через новое соединение.
+                connection.close()
+            else:
+                sent.append(email)
+    finally:
+        connection.close()
+    queue.complete(sent, worker)
+    return len(sent), len(emails) - len(sent)
+
+
+class Sender(Worker):
+    """Цикл `manage.py send_emails`."""
+
+    def __init__(self, batch_size=None, **kwargs):
+        super().__init__(batch_size=batch_size or settings.OUTBOX_BATCH_SIZE,
+                         **kwargs)
+
+    def run_batch(self):
+        sent, failed = deliver(self.name, self.batch_size)
+        self.done += sent
+        self.failed += failed
+        return bool(sent or failed)
+
+    def requeue_stale(self):
+        queue.requeue_stale(Email)
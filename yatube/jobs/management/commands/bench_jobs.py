@@ -0,0 +1,55 @@
+import time
+from contextlib import nullcontext
+
+from django.core.management import call_command
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from jobs import queue
+from jobs.models import Job
+
+
+class Command(BaseCommand):
+    help = ('Пропускная способность очереди jobs: постановка задач '
+            'и выполнение пустых задач воркерами в 1, 2 и 4 процессах.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--number', type=int, default=5000)
+        parser.add_argument('--processes', type=int, nargs='+',
+                            default=[1, 2, 4])
+        parser.add_argument('--batch-size', type=int, default=50)
+
+    def handle(self, *args, **options):
+        number = options['number']
+        Job.objects.filter(name='jobs.noop').delete()
+        enqueues = {
+            'по одной': lambda: self.enqueue(number),
+            'в транзакции': lambda: self.enqueue(number, atomic=True),
+            'с dedup_key': lambda: self.enqueue(number, dedup=True),
+        }
+        for name, enqueue in enqueues.items():
+            start = time.perf_counter()
+            enqueue()
+            elapsed = time.perf_counter() - start
+            self.stdout.write(
+                f'постановка {name:>13}: {number / elapsed:8.0f} задач/с')
+            Job.objects.filter(name='jobs.noop').delete()
+
+        for processes in options['processes']:
+            self.enqueue(number, atomic=True)
+            start = time.perf_counter()
+            call_command('run_workers', processes=processes, burst=True,
+                         batch_size=options['batch_size'])
+            elapsed = time.perf_counter() - start
+            left = Job.objects.filter(name='jobs.noop').count()
+            self.stdout.write(
+                f'выполнение, процессов {processes}: '
+                f'{(number - left) / elapsed:8.0f} задач/с, '
+                f'осталось {left}')
+            Job.objects.filter(name='jobs.noop').delete()
+
+    def enqueue(self, number, atomic=False, dedup=False):
+        with transaction.atomic() if atomic else nullcontext():
+            for index in range(number):
+                queue.enqueue('jobs.noop', index,
+                              dedup_key=f'bench:{index}' if dedup else None)
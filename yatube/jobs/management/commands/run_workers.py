@@ -0,0 +1,52 @@
+import multiprocessing
+import signal
+
+from django.core.management.base import BaseCommand
+from django.db import connections
+
+from jobs.worker import Worker
+
+
+def work(options):
+    Worker(batch_size=options['batch_size'],
+           poll_interval=options['poll_interval'],
+           burst=options['burst']).run()
+
+
+class Command(BaseCommand):
+    help = ('Запускает воркеры очереди задач jobs. SIGTERM и Ctrl+C '
+            'останавливают их после текущей задачи.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--processes', type=int, default=1,
+                            help='Число процессов-воркеров.')
+        parser.add_argument('--batch-size', type=int,
+                            help='Задач, забираемых за раз '
+                                 '(по умолчанию JOBS_BATCH_SIZE).')
+        parser.add_argument('--poll-interval', type=float,
+                            help='Пауза при пустой очереди, секунд '
+                                 '(по умолчанию JOBS_POLL_INTERVAL).')
+        parser.add_argument('--burst', action='store_true',
+                            help='Выйти, когда готовых задач не останется.')
+
+    def handle(self, *args, **options):
+        if options['processes'] <= 1:
+            work(options)
+            return
+        # Дочерние процессы не должны делить соединения родителя.
+        connections.close_all()
+        context = multiprocessing.get_context('fork')
+        processes = [context.Process(target=work, args=(options,))
+                     for _ in range(options['processes'])]
+        for process in processes:
+            process.start()
+
+        def stop(signum, frame):
+            for process in processes:
+                if process.is_alive():
+                    process.terminate()
+
+        signal.signal(signal.SIGTERM, stop)
+        signal.signal(signal.SIGINT, stop)
+        for process in processes:
+            process.join()
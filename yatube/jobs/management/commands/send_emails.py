@@ -0,0 +1,25 @@
+from django.core.management.base import BaseCommand
+
+from jobs.mail import Sender
+
+
+class Command(BaseCommand):
+    help = ('Доставляет письма из очереди jobs.Email пачками через '
+            'OUTBOX_EMAIL_BACKEND. SIGTERM и Ctrl+C останавливают '
+            'отправку после текущей пачки.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int,
+                            help='Писем на одно соединение '
+                                 '(по умолчанию OUTBOX_BATCH_SIZE).')
+        parser.add_argument('--poll-interval', type=float,
+                            help='Пауза при пустой очереди, секунд '
+                                 '(по умолчанию JOBS_POLL_INTERVAL).')
+        parser.add_argument('--burst', action='store_true',
+                            help='Выйти, когда готовых писем не останется.')
+
+    def handle(self, *args, **options):
+        sent, failed = Sender(batch_size=options['batch_size'],
+                              poll_interval=options['poll_interval'],
+                              burst=options['burst']).run()
+        self.stdout.write(f'Отправлено: {sent}, с ошибкой: {failed}')
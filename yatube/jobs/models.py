@@ -0,0 +1,69 @@
+from django.db import models
+from django.db.models import Q
+from django.utils import timezone
+
+
+class Claimable(models.Model):
+    """Строка очереди, которую воркеры забирают через jobs.queue.claim.
+
+    Порядок выдачи задаёт CLAIM_ORDER.
+    """
+    QUEUED = 'queued'
+    RUNNING = 'running'
+    FAILED = 'failed'
+    STATUSES = (
+        (QUEUED, 'В очереди'),
+        (RUNNING, 'Выполняется'),
+        (FAILED, 'Ошибка'),
+    )
+    CLAIM_ORDER = ('run_at', 'id')
+
+    status = models.CharField(max_length=10, choices=STATUSES,
+                              default=QUEUED)
+    run_at = models.DateTimeField(default=timezone.now)
+    attempts = models.PositiveSmallIntegerField(default=0)
+    max_attempts = models.PositiveSmallIntegerField(default=5)
+    locked_by = models.CharField(max_length=100, blank=True)
+    locked_at = models.DateTimeField(blank=True, null=True)
+    last_error = models.TextField(blank=True)
+    created = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        abstract = True
+
+
+class Job(Claimable):
+    """Задача очереди, см. jobs.queue."""
+    CLAIM_ORDER = ('-priority', 'run_at', 'id')
+
+    name = models.CharField(max_length=100)
+    args = models.TextField(default='[]')
+    priority = models.SmallIntegerField(default=0)
+    dedup_key = models.CharField(max_length=200, blank=True, null=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['status', '-priority', 'run_at'],
+                         name='job_claim'),
+        ]
+        constraints = [
+            models.UniqueConstraint(fields=['dedup_key'],
+                                    condition=Q(status='queued'),
+                                    name='unique_queued_dedup_key'),
+        ]
+
+    def __str__(self):
+        return f'{self.name} #{self.pk}'
+
+
+class Email(Claimable):
+    """Письмо в исходящей очереди, см. jobs.mail."""
+    message = models.TextField()
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['status', 'run_at'], name='email_claim'),
+        ]
+
+    def __str__(self):
+        return f'Письмо #{self.pk}'
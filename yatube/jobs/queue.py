@@ -0,0 +1,220 @@
+"""Очередь фоновых задач в основной базе.
+
+Задача — вызов зарегистрированной функции с аргументами в JSON:
+
+    @task('posts.notify')
+    def notify(post_id):
+        ...
+
+    enqueue('posts.notify', post.id, priority=5, delay=60,
+            dedup_key=f'notify:{post.id}')
+
+Модули `<app>/tasks.py` импортируются при старте (JobsConfig.ready).
+enqueue внутри транзакции запроса создаёт задачу только вместе с её
+коммитом. Задачу с dedup_key не поставить, пока в очереди ждёт другая
+с тем же ключом.
+
+Воркеры (`manage.py run_workers`) забирают задачи одним UPDATE ...
+RETURNING, а без его поддержки — сравнением и заменой статуса, так что
+две задачи не достаются одному воркеру дважды. Задачи выполняются хотя
+бы один раз и должны быть идемпотентными. Упавшая задача повторяется
+с экспоненциальной задержкой до max_attempts раз; выполненные задачи
+удаляются, окончательно упавшие остаются со статусом failed. Попытка
+считается при выдаче, так что задача, которая роняет сам воркер, тоже
+становится failed после max_attempts выдач, а не крутится вечно.
+"""
+import json
+import logging
+import random
+import sqlite3
+import traceback
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import IntegrityError, connection, transaction
+from django.db.models import F
+from django.utils import timezone
+
+from core.routers import primary
+
+from .models import Job
+
+logger = logging.getLogger(__name__)
+
+REGISTRY = {}
+
+
+def task(name):
+    """Регистрирует функцию как задачу name."""
+    def decorator(function):
+        REGISTRY[name] = function
+        return function
+    return decorator
+
+
+def enqueue(name, *args, priority=0, run_at=None, delay=0, dedup_key=None,
+            max_attempts=None):
+    """Ставит задачу в очередь; None, если она отброшена как дубль."""
+    if name not in REGISTRY:
+        raise ValueError(f'Неизвестная задача {name!r}')
+    job = Job(
+        name=name,
+        args=json.dumps(args),
+        priority=priority,
+        run_at=run_at or timezone.now() + timedelta(seconds=delay),
+        dedup_key=dedup_key,
+        max_attempts=max_attempts or settings.JOBS_MAX_ATTEMPTS,
+    )
+    if dedup_key is None:
+        job.save()
+        return job
+    try:
+        with transaction.atomic():
+            job.save()
+    except IntegrityError:
+        return None
+    return job
+
+
+def supports_returning():
+    if connection.vendor == 'sqlite':
+        return sqlite3.sqlite_version_info >= (3, 35)
+    return connection.vendor == 'postgresql'
+
+
+def claim(worker, limit=1, model=Job):
+    """Забирает до limit готовых строк model в порядке CLAIM_ORDER."""
+    now = timezone.now()
+    if supports_returning():
+        pks = claim_returning(model, worker, limit, now)
+    else:
+        pks = claim_compare_and_set(model, worker, limit, now)
+    if not pks:
+        return []
+    return list(model.objects.filter(pk__in=pks)
+                .order_by(*model.CLAIM_ORDER))
+
+
+def claim_returning(model, worker, limit, now):
+    quote = connection.ops.quote_name
+    table = quote(model._meta.db_table)
+    order = ', '.join(
+        quote(field.lstrip('-')) + (' DESC' if field[0] == '-' else '')
+        for field in model.CLAIM_ORDER)
+    skip_locked = (' FOR UPDATE SKIP LOCKED'
+                   if connection.features.has_select_for_update_skip_locked
+                   else '')
+    adapt = connection.ops.adapt_datetimefield_value
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f'UPDATE {table} SET status = %s, locked_by = %s, '
+            f'locked_at = %s, attempts = attempts + 1 '
+            f'WHERE status = %s AND id IN ('
+            f'SELECT id FROM {table} WHERE status = %s AND run_at <= %s '
+            f'AND attempts < max_attempts '
+            f'ORDER BY {order} LIMIT %s{skip_locked}) RETURNING id',
+            [model.RUNNING, worker, adapt(now), model.QUEUED, model.QUEUED,
+             adapt(now), limit],
+        )
+        return [pk for pk, in cursor.fetchall()]
+
+
+def claim_compare_and_set(model, worker, limit, now):
+    candidates = list(
+        model.objects.filter(status=model.QUEUED, run_at__lte=now,
+                             attempts__lt=F('max_attempts'))
+        .order_by(*model.CLAIM_ORDER)
+        .values_list('id', flat=True)[:limit])
+    return [
+        pk for pk in candidates
+        if model.objects.filter(pk=pk, status=model.QUEUED).update(
+            status=model.RUNNING, locked_by=worker, locked_at=now,
+            attempts=F('attempts') + 1)
+    ]
+
+
+def backoff(attempt):
+    """Задержка перед повтором: экспонента со случайным разбросом."""
+    delay = min(settings.JOBS_MAX_BACKOFF,
+                settings.JOBS_BACKOFF_BASE * 2 ** (attempt - 1))
+    return delay * random.uniform(0.5, 1)
+
+
+def run(job, worker):
+    """Выполняет забранную задачу.
+
+    Задача читает из основной базы, даже если выполняется в запросе.
+    Упавшую задачу сразу возвращает в очередь или отмечает failed;
+    выполненные удаляйте через complete, пачкой.
+    """
+    try:
+        function = REGISTRY[job.name]
+        with primary():
+            function(*json.loads(job.args))
+    except Exception:
+        error = traceback.format_exc()
+        logger.warning('Задача %s упала (попытка %d из %d)\n%s',
+                       job, job.attempts, job.max_attempts, error)
+        fail(job, worker, error)
+        return False
+    return True
+
+
+def complete(jobs, worker):
+    """Удаляет выполненные задачи одним запросом."""
+    if jobs:
+        type(jobs[0]).objects.filter(pk__in=[job.pk for job in jobs],
+                                     locked_by=worker).delete()
+
+
+def fail(job, worker, error):
+    """Возвращает упавшую задачу в очередь с задержкой или, если
+    попытки кончились, отмечает failed.
+    """
+    mine = type(job).objects.filter(pk=job.pk, locked_by=worker)
+    if job.attempts >= job.max_attempts:
+        mine.update(status=job.FAILED, last_error=error, locked_by='')
+        return
+    requeue(mine, run_at=timezone.now()
+            + timedelta(seconds=backoff(job.attempts)), last_error=error)
+
+
+def requeue(jobs, **changes):
+    """Возвращает задачи в очередь.
+
+    Если тем временем поставлена задача с тем же dedup_key, эта
+    задача лишняя и удаляется.
+    """
+    model = jobs.model
+    if hasattr(model, 'dedup_key'):
+        for job in jobs.filter(dedup_key__isnull=False):
+            try:
+                with transaction.atomic():
+                    model.objects.filter(pk=job.pk).update(
+                        status=model.QUEUED, locked_by='', **changes)
+            except IntegrityError:
+                job.delete()
+        jobs = jobs.filter(dedup_key__isnull=True)
+    jobs.update(status=model.QUEUED, locked_by='', **changes)
+
+
+def release(jobs, worker):
+    """Возвращает забранные, но не начатые задачи без учёта попытки."""
+    if jobs:
+        requeue(type(jobs[0]).objects.filter(
+            pk__in=[job.pk for job in jobs], locked_by=worker),
+            attempts=F('attempts') - 1)
+
+
+def requeue_stale(model=Job):
+    """Возвращает в очередь задачи воркеров, которые не отвечают
+    дольше JOBS_LOCK_TIMEOUT; задачи без оставшихся попыток отмечает
+    failed.
+    """
+    deadline = timezone.now() - timedelta(seconds=settings.JOBS_LOCK_TIMEOUT)
+    stale = model.objects.filter(status=model.RUNNING,
+                                 locked_at__lt=deadline)
+    stale.filter(attempts__gte=F('max_attempts')).update(
+        status=model.FAILED, locked_by='',
+        last_error=f'Воркер не ответил за {settings.JOBS_LOCK_TIMEOUT} с')
+    requeue(stale.filter(attempts__lt=F('max_attempts')))
@@ -0,0 +1,6 @@
+from .queue import task
+
+
+@task('jobs.noop')
+def noop(*args):
+    """Пустая задача для проверки очереди и bench_jobs."""
@@ -0,0 +1,261 @@
+import socketserver
+import threading
+from datetime import timedelta
+from unittest import mock
+
+from django.contrib.auth import get_user_model
+from django.core import mail
+from django.core.mail.backends.locmem import EmailBackend
+from django.core.management import call_command
+from django.test import TestCase, override_settings
+from django.urls import reverse
+from django.utils import timezone
+
+from . import queue
+from .mail import deliver
+from .models import Email, Job
+
+User = get_user_model()
+
+CALLS = []
+
+
+@queue.task('jobs.tests.record')
+def record(*args):
+    CALLS.append(args)
+
+
+@queue.task('jobs.tests.fail')
+def fail():
+    raise RuntimeError('сбой')
+
+
+class QueueTest(TestCase):
+    def setUp(self):
+        CALLS.clear()
+
+    def test_unknown_task_is_rejected(self):
+        """ Задачу без регистрации не поставить в очередь."""
+        with self.assertRaises(ValueError):
+            queue.enqueue('jobs.tests.missing')
+
+    def test_claim_order_and_schedule(self):
+        """ Задачи забираются по приоритету, отложенные ждут run_at."""
+        low = queue.enqueue('jobs.tests.record', 1)
+        high = queue.enqueue('jobs.tests.record', 2, priority=5)
+        queue.enqueue('jobs.tests.record', 3, priority=9, delay=60)
+        jobs = queue.claim('w1', limit=10)
+        self.assertEqual([job.pk for job in jobs], [high.pk, low.pk])
+        self.assertEqual(jobs[0].attempts, 1)
+        self.assertEqual(Job.objects.get(pk=low.pk).status, Job.RUNNING)
+        self.assertEqual(queue.claim('w2', limit=10), [])
+
+    def test_compare_and_set_claim(self):
+        """ Без UPDATE ... RETURNING задачи забираются так же."""
+        job = queue.enqueue('jobs.tests.record', 1)
+        with mock.patch.object(queue, 'supports_returning',
+                               return_value=False):
+            self.assertEqual([claimed.pk for claimed
+                              in queue.claim('w1', limit=10)], [job.pk])
+            self.assertEqual(queue.claim('w2', limit=10), [])
+
+    def test_dedup_key(self):
+        """ Дубль по dedup_key отбрасывается, пока первая задача ждёт."""
+        self.assertIsNotNone(queue.enqueue('jobs.tests.record',
+                                           dedup_key='key'))
+        self.assertIsNone(queue.enqueue('jobs.tests.record',
+                                        dedup_key='key'))
+        queue.claim('w1')
+        self.assertIsNotNone(queue.enqueue('jobs.tests.record',
+                                           dedup_key='key'))
+
+    def test_run_and_complete(self):
+        """ Выполненная задача получает аргументы и удаляется."""
+        queue.enqueue('jobs.tests.record', 1, 'a')
+        jobs = queue.claim('w1')
+        self.assertTrue(queue.run(jobs[0], 'w1'))
+        queue.complete(jobs, 'w1')
+        self.assertEqual(CALLS, [(1, 'a')])
+        self.assertFalse(Job.objects.exists())
+
+    def test_retry_with_backoff(self):
+        """ Упавшая задача повторяется позже, затем остаётся failed."""
+        job = queue.enqueue('jobs.tests.fail', max_attempts=2)
+        with self.assertLogs('jobs.queue', 'WARNING'):
+            self.assertFalse(queue.run(queue.claim('w1')[0], 'w1'))
+        job.refresh_from_db()
+        self.assertEqual(job.status, Job.QUEUED)
+        self.assertGreater(job.run_at, timezone.now())
+        self.assertIn('RuntimeError', job.last_error)
+        Job.objects.filter(pk=job.pk).update(run_at=timezone.now())
+        with self.assertLogs('jobs.queue', 'WARNING'):
+            self.assertFalse(queue.run(queue.claim('w1')[0], 'w1'))
+        job.refresh_from_db()
+        self.assertEqual((job.status, job.attempts), (Job.FAILED, 2))
+
+    def test_retry_drops_duplicate(self):
+        """ Повтор не нарушает dedup_key: лишняя задача удаляется."""
+        queue.enqueue('jobs.tests.fail', dedup_key='key')
+        job = queue.claim('w1')[0]
+        queue.enqueue('jobs.tests.fail', dedup_key='key')
+        with self.assertLogs('jobs.queue', 'WARNING'):
+            queue.run(job, 'w1')
+        self.assertFalse(Job.objects.filter(pk=job.pk).exists())
+        self.assertEqual(Job.objects.count(), 1)
+
+    def test_release_and_stale(self):
+        """ Незавершённые задачи возвращаются в очередь."""
+        job = queue.enqueue('jobs.tests.record')
+        queue.release(queue.claim('w1'), 'w1')
+        job.refresh_from_db()
+        self.assertEqual((job.status, job.attempts), (Job.QUEUED, 0))
+        queue.claim('w1')
+        Job.objects.update(locked_at=timezone.now() - timedelta(days=1))
+        queue.requeue_stale()
+        self.assertEqual(Job.objects.get().status, Job.QUEUED)
+
+    def test_stale_job_without_attempts_fails(self):
+        """ Задача, ронявшая воркер max_attempts раз, становится failed."""
+        job = queue.enqueue('jobs.tests.record', max_attempts=2)
+        for _ in range(2):
+            self.assertEqual(len(queue.claim('w1')), 1)
+            Job.objects.update(locked_at=timezone.now() - timedelta(days=1))
+            queue.requeue_stale()
+        job.refresh_from_db()
+        self.assertEqual((job.status, job.attempts), (Job.FAILED, 2))
+        self.assertIn('Воркер не ответил', job.last_error)
+
+    def test_exhausted_jobs_are_not_claimed(self):
+        """ Задачу без оставшихся попыток не забрать."""
+        job = queue.enqueue('jobs.tests.record', max_attempts=1)
+        Job.objects.filter(pk=job.pk).update(attempts=1)
+        self.assertEqual(queue.claim('w1'), [])
+        with mock.patch.object(queue, 'supports_returning',
+                               return_value=False):
+            self.assertEqual(queue.claim('w1'), [])
+
+    def test_run_workers_burst(self):
+        """ run_workers --burst выполняет готовые задачи и выходит."""
+        for number in range(3):
+            queue.enqueue('jobs.tests.record', number)
+        queue.enqueue('jobs.tests.fail', max_attempts=1)
+        with self.assertLogs('jobs.queue', 'WARNING'):
+            call_command('run_workers', burst=True, batch_size=2)
+        self.assertEqual(sorted(CALLS), [(0,), (1,), (2,)])
+        self.assertEqual(Job.objects.get().status, Job.FAILED)
+
+
+class CountingBackend(EmailBackend):
+    """locmem, который считает соединения и не шлёт тему «сбой»."""
+    opened = 0
+
+    def open(self):
+        if not getattr(self, 'is_open', False):
+            CountingBackend.opened += 1
+            self.is_open = True
+
+    def close(self):
+        self.is_open = False
+
+    def send_messages(self, messages):
+        if any(message.subject == 'сбой' for message in messages):
+            raise ConnectionError('сбой')
+        return super().send_messages(messages)
+
+
+class SMTPHandler(socketserver.StreamRequestHandler):
+    """Минимальный SMTP-сервер: принимает всё, что ему шлют."""
+
+    def reply(self, line):
+        self.wfile.write(line.encode() + b'\r\n')
+
+    def handle(self):
+        self.server.connections += 1
+        self.reply('220 localhost')
+        for line in self.rfile:
+            command = line.decode().strip().upper()
+            if command.startswith('DATA'):
+                self.reply('354 go ahead')
+                data = b''.join(iter(self.rfile.readline, b'.\r\n'))
+                self.server.messages.append(data)
+                self.reply('250 ok')
+            elif command.startswith('QUIT'):
+                self.reply('221 bye')
+                return
+            else:
+                self.reply('250 ok')
+
+
+@override_settings(
+    EMAIL_BACKEND='jobs.mail.OutboxBackend',
+    OUTBOX_EMAIL_BACKEND='jobs.tests.CountingBackend',
+)
+class OutboxTest(TestCase):
+    def setUp(self):
+        CountingBackend.opened = 0
+
+    def test_password_reset_is_queued(self):
+        """ Сброс пароля ставит письмо в очередь, отправитель его шлёт."""
+        User.objects.create_user('user', 'user@example.com', 'password')
+        self.client.post(reverse('users:password_reset'),
+                         {'email': 'user@example.com'})
+        self.assertEqual(mail.outbox, [])
+        self.assertEqual(Email.objects.count(), 1)
+        self.assertEqual(deliver('w1'), (1, 0))
+        self.assertEqual(mail.outbox[0].to, ['user@example.com'])
+        self.assertFalse(Email.objects.exists())
+
+    def test_batch_uses_one_connection(self):
+        """ Пачка идёт через одно соединение, сбой письма не мешает
+        остальным и откладывает его.
+        """
+        mail.send_mass_mail([
+            ('первое', 'текст', 'from@example.com', ['a@example.com']),
+            ('сбой', 'текст', 'from@example.com', ['b@example.com']),
+            ('третье', 'текст', 'from@example.com', ['c@example.com']),
+        ])
+        with self.assertLogs('jobs.mail', 'WARNING'):
+            self.assertEqual(deliver('w1'), (2, 1))
+        self.assertEqual([message.subject for message in mail.outbox],
+                         ['первое', 'третье'])
+        self.assertEqual(CountingBackend.opened, 2)
+        failed = Email.objects.get()
+        self.assertEqual(failed.status, Email.QUEUED)
+        self.assertGreater(failed.run_at, timezone.now())
+
+    def test_message_round_trip(self):
+        """ Альтернативы, вложения и заголовки переживают очередь."""
+        message = mail.EmailMultiAlternatives(
+            'тема', 'текст', 'from@example.com', ['to@example.com'],
+            headers={'X-Tag': 'reset'})
+        message.attach_alternative('<p>текст</p>', 'text/html')
+        message.attach('data.bin', b'\x00\xff', 'application/octet-stream')
+        message.attach('note.txt', 'заметка', 'text/plain')
+        message.send()
+        deliver('w1')
+        sent = mail.outbox[0]
+        self.assertEqual(sent.alternatives, [('<p>текст</p>', 'text/html')])
+        self.assertEqual(sent.attachments, [
+            ('data.bin', b'\x00\xff', 'application/octet-stream'),
+            ('note.txt', 'заметка', 'text/plain'),
+        ])
+        self.assertEqual(sent.extra_headers, {'X-Tag': 'reset'})
+
+    def test_smtp_delivery(self):
+        """ Через SMTP пачка писем уходит за одно соединение."""
+        server = socketserver.ThreadingTCPServer(('127.0.0.1', 0),
+                                                 SMTPHandler)
+        server.connections, server.messages = 0, []
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        self.addCleanup(server.server_close)
+        self.addCleanup(server.shutdown)
+        for number in range(3):
+            mail.send_mail(f'письмо {number}', 'текст', 'from@example.com',
+                           ['to@example.com'])
+        with self.settings(
+                OUTBOX_EMAIL_BACKEND='django.core.mail.backends.smtp.'
+                                     'EmailBackend',
+                EMAIL_HOST='127.0.0.1', EMAIL_PORT=server.server_address[1],
+                EMAIL_USE_TLS=False):
+            self.assertEqual(deliver('w1'), (3, 0))
+        self.assertEqual((server.connections, len(server.messages)), (1, 3))
@@ -0,0 +1,63 @@
+import os
+import signal
+import socket
+import time
+
+from django.conf import settings
+
+from . import queue
+
+
+class Worker:
+    """Цикл одного процесса: забрать пачку задач, выполнить, повторить.
+
+    SIGTERM и SIGINT дают дожить текущей задаче; остальные задачи пачки
+    возвращаются в очередь.
+    """
+
+    def __init__(self, batch_size=None, poll_interval=None, burst=False):
+        self.name = f'{socket.gethostname()}:{os.getpid()}'
+        self.batch_size = batch_size or settings.JOBS_BATCH_SIZE
+        self.poll_interval = (settings.JOBS_POLL_INTERVAL
+                              if poll_interval is None else poll_interval)
+        self.burst = burst
+        self.stopping = False
+        self.done = self.failed = 0
+
+    def stop(self, signum=None, frame=None):
+        self.stopping = True
+
+    def run(self):
+        handlers = {signum: signal.signal(signum, self.stop)
+                    for signum in (signal.SIGTERM, signal.SIGINT)}
+        try:
+            while not self.stopping:
+                if not self.run_batch():
+                    if self.burst:
+                        break
+                    self.requeue_stale()
+                    time.sleep(self.poll_interval)
+        finally:
+            for signum, handler in handlers.items():
+                signal.signal(signum, handler)
+        return self.done, self.failed
+
+    def requeue_stale(self):
+        queue.requeue_stale()
+
+    def run_batch(self):
+        jobs = queue.claim(self.name, self.batch_size)
+        done = []
+        for index, job in enumerate(jobs):
+            if self.stopping:
+                queue.release(jobs[index:], self.name)
+                break
+            if queue.run(job, self.name):
+                done.append(job)
+            else:
+                self.failed += 1
+        # Одно удаление на пачку: коммит на каждую задачу в SQLite
+        # стоит дороже пустой задачи.
+        queue.complete(done, self.name)
+        self.done += len(done)
+        return bool(jobs)
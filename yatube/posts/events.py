@@ -0,0 +1,143 @@
+"""Журнал изменений (outbox) постов, комментариев, подписок и групп.
+
+Каждое сохранение и удаление Post, Comment, Follow и Group дописывает
+в Event строку с действием и полями объекта — в той же транзакции, что
+и само изменение (сигналы posts.signals, модели наследуют
+posts.models.Logged; массовые подписки follows.bulk_change пишут
+журнал сами). Производные данные — индексы, счётчики, кеши, ленты —
+читают журнал через Consumer:
+
+    consumer = Consumer('search_index')
+    consumer.consume(update_index)
+
+Consumer хранит позицию в EventOffset и отдаёт события пачками по
+диапазону id. consume() применяет пачку и сдвигает позицию в одной
+транзакции, так что изменения в базе применяются ровно один раз; для
+данных вне базы обработчик должен быть идемпотентным. reset() начинает
+чтение с начала журнала, чтобы пересобрать данные, — но только из
+событий, которые ещё не удалил prune(): для полной пересборки
+потребитель должен уметь строить данные по самим таблицам.
+
+Журнал упорядочен по id; позиция не перескакивает строки, пока id
+выдаются в порядке коммитов, — в SQLite с одним писателем так и есть.
+queryset.update(), bulk_create и SET_NULL при удалении группы
+журнал не пишут. `manage.py event_consumers --prune` удаляет
+события, прочитанные всеми потребителями.
+"""
+import json
+from collections import namedtuple
+
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import transaction
+from django.db.models import Min
+from django.db.models.fields.files import FieldFile
+
+from .models import Event, EventOffset
+
+Record = namedtuple('Record', 'id model action object_id data created')
+
+
+def serialize(instance):
+    data = {}
+    for field in instance._meta.concrete_fields:
+        value = field.value_from_object(instance)
+        data[field.attname] = (value.name if isinstance(value, FieldFile)
+                               else value)
+    return json.dumps(data, cls=DjangoJSONEncoder)
+
+
+def record(instance, action):
+    """Пишет изменение instance в журнал."""
+    Event.objects.create(
+        model=instance._meta.model_name,
+        action=action,
+        object_id=instance.pk,
+        data=serialize(instance),
+    )
+
+
+def record_many(instances, action):
+    Event.objects.bulk_create(
+        Event(model=instance._meta.model_name, action=action,
+              object_id=instance.pk, data=serialize(instance))
+        for instance in instances)
+
+
+def read(after, limit):
+    """События с id больше after, не больше limit штук."""
+    return [
+        Record(pk, model, action, object_id, json.loads(data), created)
+        for pk, model, action, object_id, data, created in
+        Event.objects.filter(id__gt=after).order_by('id').values_list(
+            'id', 'model', 'action', 'object_id', 'data', 'created')[:limit]
+    ]
+
+
+class Consumer:
+    """Читатель журнала со своей сохранённой позицией.
+
+    models ограничивает события нужными моделями ('post', 'comment',
+    'follow', 'group'): пачка читается по всему журналу, обработчик
+    получает только подходящие события, а позиция сдвигается до конца
+    пачки — иначе чужие события держали бы позицию и prune() на месте.
+    """
+
+    def __init__(self, name, models=None, batch_size=1000):
+        self.name = name
+        self.models = models
+        self.batch_size = batch_size
+
+    def position(self):
+        offset, _ = EventOffset.objects.get_or_create(consumer=self.name)
+        return offset.position
+
+    def commit(self, position):
+        EventOffset.objects.update_or_create(
+            consumer=self.name, defaults={'position': position})
+
+    def reset(self, position=0):
+        """Перечитать журнал с position; события до последнего prune()
+        уже удалены и не вернутся.
+        """
+        self.commit(position)
+
+    def consume(self, handler):
+        """Передаёт handler непрочитанные события пачками и сдвигает
+        позицию после каждой. Пачка без подходящих событий обработчику
+        не передаётся. Возвращает число переданных событий.
+        """
+        total = 0
+        while True:
+            with transaction.atomic():
+                offset, _ = (EventOffset.objects.select_for_update()
+                             .get_or_create(consumer=self.name))
+                batch = read(offset.position, self.batch_size)
+                if not batch:
+                    return total
+                events = [event for event in batch
+                          if self.models is None
+                          or event.model in self.models]
+                if events:
+                    handler(events)
+                offset.position = batch[-1].id
+                offset.save()
+            total += len(events)
+
+
+def lag():
+    """{потребитель: (позиция, непрочитанных событий)}."""
+    return {
+        offset.consumer: (offset.position, Event.objects.filter(
+            id__gt=offset.position).count())
+        for offset in EventOffset.objects.order_by('consumer')
+    }
+
+
+def prune():
+    """Удаляет события, прочитанные всеми потребителями."""
+    position = EventOffset.objects.aggregate(
+        position=Min('position'))['position']
+    if position is None:
+        return 0
+    deleted, _ = Event.objects.filter(id__lte=position).delete()
+    return deleted
@@ -0,0 +1,111 @@
+"""Граф подписок с кешем.
+
+Для каждого пользователя в кеше лежит отсортированный массив id
+авторов, на которых он подписан (array('l'), 8 байт на подписку).
+is_following ищет в нём двоичным поиском, following_ids отдаёт его
+целиком, так что страницы профиля не ходят за подписками в базу.
+Изменения подписок сбрасывают кеш: обычные save/delete через
+сигналы (posts.signals), массовые операции этого модуля — напрямую.
+
+Кеш свой у каждого процесса, и сброс виден только в том процессе, где
+подписка изменилась. Остальные перечитывают массив из базы раз в
+FOLLOW_CACHE_TIMEOUT секунд, поэтому срок короткий: дольше этого
+другие процессы устаревшие подписки не показывают.
+"""
+from array import array
+from bisect import bisect_left
+from collections import defaultdict
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+
+from . import events
+from .models import Event, Follow
+
+# Меньше лимита SQLite на число параметров запроса.
+DELETE_BATCH_SIZE = 500
+
+
+def cache_key(user_id):
+    return f'follows:{user_id}'
+
+
+def following_ids(user_id):
+    """Отсортированный массив id авторов, на которых подписан user_id."""
+    key = cache_key(user_id)
+    ids = cache.get(key)
+    if ids is None:
+        ids = array('l', Follow.objects.filter(user_id=user_id)
+                    .order_by('author_id')
+                    .values_list('author_id', flat=True))
+        cache.set(key, ids, settings.FOLLOW_CACHE_TIMEOUT)
+    return ids
+
+
+def is_following(user_id, author_id):
+    ids = following_ids(user_id)
+    index = bisect_left(ids, author_id)
+    return index < len(ids) and ids[index] == author_id
+
+
+def invalidate(user_ids):
+    """Сбрасывает кеш сразу и ещё раз после коммита.
+
+    Второй сброс нужен, если другой запрос успел закешировать
+    данные, которые видел до коммита.
+    """
+    keys = [cache_key(user_id) for user_id in set(user_ids)]
+    cache.delete_many(keys)
+    transaction.on_commit(lambda: cache.delete_many(keys))
+
+
+def bulk_change(added=(), removed=()):
+    """Применяет подписки и отписки одной транзакцией.
+
+    added и removed — пары (user_id, author_id). Подписки на себя
+    и уже существующие подписки пропускаются.
+    """
+    follow_by_user = defaultdict(set)
+    for user, author in added:
+        if user != author:
+            follow_by_user[user].add(author)
+    unfollow_by_user = defaultdict(set)
+    for user, author in removed:
+        unfollow_by_user[user].add(author)
+    with transaction.atomic():
+        for user, authors in follow_by_user.items():
+            add(user, sorted(authors))
+        for user, authors in unfollow_by_user.items():
+            authors = sorted(authors)
+            for start in range(0, len(authors), DELETE_BATCH_SIZE):
+                Follow.objects.filter(
+                    user_id=user,
+                    author_id__in=authors[start:start + DELETE_BATCH_SIZE],
+                ).delete()
+        invalidate(list(follow_by_user) + list(unfollow_by_user))
+
+
+def add(user, authors):
+    """Подписывает user на новых для него authors и пишет журнал
+    событий: bulk_create не посылает сигналов.
+    """
+    for start in range(0, len(authors), DELETE_BATCH_SIZE):
+        batch = authors[start:start + DELETE_BATCH_SIZE]
+        follows = Follow.objects.filter(user_id=user, author_id__in=batch)
+        existing = set(follows.values_list('author_id', flat=True))
+        Follow.objects.bulk_create(
+            [Follow(user_id=user, author_id=author)
+             for author in batch if author not in existing],
+            ignore_conflicts=True,
+        )
+        events.record_many(follows.exclude(author_id__in=existing),
+                           Event.CREATED)
+
+
+def follow(user_id, author_id):
+    bulk_change(added=[(user_id, author_id)])
+
+
+def unfollow(user_id, author_id):
+    bulk_change(removed=[(user_id, author_id)])
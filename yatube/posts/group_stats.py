@@ -0,0 +1,132 @@
+"""Статистика групп для каталога /groups/.
+
+GroupStats хранит число постов группы, время последнего поста и id
+самых активных авторов, GroupAuthorStats — число постов каждого автора
+в группе. Сигналы posts.signals обновляют их при создании, правке и
+удалении поста, в том числе при смене группы через list_editable
+в админке, так что каталог не группирует Post на каждый запрос.
+
+queryset.update() и bulk_create сигналов не посылают; после них
+запускайте `manage.py rebuild_group_stats`.
+"""
+from collections import defaultdict
+
+from django.conf import settings
+from django.db import IntegrityError, transaction
+from django.db.models import (Case, Count, DateTimeField, F, Max, OuterRef,
+                              Q, Subquery, Value, When)
+
+from .models import Group, GroupAuthorStats, GroupStats, Post, User
+
+
+def post_changed(old, new, pub_date=None):
+    """Учитывает изменение поста.
+
+    old и new — пары (group_id, author_id) до и после изменения или
+    None для созданного и удалённого поста.
+    """
+    if old == new:
+        return
+    if old is not None and old[0] is not None:
+        remove(*old)
+    if new is not None and new[0] is not None:
+        add(*new, pub_date)
+
+
+def add(group_id, author_id, pub_date):
+    stats = GroupStats.objects.filter(group_id=group_id)
+    changes = {
+        'post_count': F('post_count') + 1,
+        'last_post_at': Case(
+            When(Q(last_post_at__isnull=True) | Q(last_post_at__lt=pub_date),
+                 then=Value(pub_date, output_field=DateTimeField())),
+            default=F('last_post_at'),
+        ),
+    }
+    if not stats.update(**changes):
+        GroupStats.objects.get_or_create(group_id=group_id)
+        stats.update(**changes)
+    pair = GroupAuthorStats.objects.filter(group_id=group_id,
+                                           author_id=author_id)
+    if not pair.update(post_count=F('post_count') + 1):
+        try:
+            with transaction.atomic():
+                GroupAuthorStats.objects.create(
+                    group_id=group_id, author_id=author_id, post_count=1)
+        except IntegrityError:
+            pair.update(post_count=F('post_count') + 1)
+    refresh_top_authors(group_id)
+
+
+def remove(group_id, author_id):
+    last_post = (Post.objects.filter(group_id=OuterRef('group_id'))
+                 .order_by('-pub_date').values('pub_date')[:1])
+    GroupStats.objects.filter(group_id=group_id, post_count__gt=0).update(
+        post_count=F('post_count') - 1,
+        last_post_at=Subquery(last_post),
+    )
+    pair = GroupAuthorStats.objects.filter(group_id=group_id,
+                                           author_id=author_id)
+    pair.filter(post_count__gt=0).update(post_count=F('post_count') - 1)
+    pair.filter(post_count=0).delete()
+    refresh_top_authors(group_id)
+
+
+def refresh_top_authors(group_id):
+    ids = (GroupAuthorStats.objects.filter(group_id=group_id)
+           .order_by('-post_count', 'author_id')
+           .values_list('author_id', flat=True)
+           [:settings.GROUP_TOP_AUTHORS])
+    GroupStats.objects.filter(group_id=group_id).update(
+        top_author_ids=','.join(map(str, ids)))
+
+
+def attach_top_authors(groups):
+    """Заполняет group.top_authors одним запросом на всех."""
+    ids = {
+        group: [int(author) for author in
+                getattr(group, 'stats', GroupStats()).top_author_ids
+                .split(',') if author]
+        for group in groups
+    }
+    authors = User.objects.in_bulk(
+        {author for group_ids in ids.values() for author in group_ids})
+    for group, group_ids in ids.items():
+        group.top_authors = [authors[author] for author in group_ids
+                             if author in authors]
+
+
+def rebuild():
+    """Пересчитывает статистику всех групп по Post."""
+    posts = Post.objects.filter(group__isnull=False).order_by()
+    with transaction.atomic():
+        GroupAuthorStats.objects.all().delete()
+        GroupStats.objects.all().delete()
+        GroupAuthorStats.objects.bulk_create(
+            GroupAuthorStats(group_id=row['group_id'],
+                             author_id=row['author_id'],
+                             post_count=row['total'])
+            for row in posts.values('group_id', 'author_id')
+            .annotate(total=Count('id')).iterator()
+        )
+        top_authors = defaultdict(list)
+        pairs = (GroupAuthorStats.objects
+                 .order_by('group_id', '-post_count', 'author_id')
+                 .values_list('group_id', 'author_id').iterator())
+        for group_id, author_id in pairs:
+            if len(top_authors[group_id]) < settings.GROUP_TOP_AUTHORS:
+                top_authors[group_id].append(author_id)
+        totals = {
+            row['group_id']: row for row in
+            posts.values('group_id')
+            .annotate(total=Count('id'), last=Max('pub_date')).iterator()
+        }
+        GroupStats.objects.bulk_create(
+            GroupStats(
+                group_id=group_id,
+                post_count=totals.get(group_id, {}).get('total', 0),
+                last_post_at=totals.get(group_id, {}).get('last'),
+                top_author_ids=','.join(map(str, top_authors[group_id])),
+            )
+            for group_id in Group.objects.values_list('id', flat=True)
+        )
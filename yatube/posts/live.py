@@ -0,0 +1,239 @@
+"""Живые обновления лент и обсуждений через Server-Sent Events.
+
+Новые посты и комментарии дописываются в журнал Change (сигналы
+posts.signals) в той же транзакции, что и сами объекты, — по строке
+на канал: `feed`, `group/<id>`, `author/<id>` для поста и
+`post/<id>` для комментария. id строки служит id события SSE.
+
+Клиенты подключаются к ASGI-приложению `application`
+(`LIVE_URL<канал>/`, см. yatube.asgi). Журнал читает один Hub на
+процесс: раз в LIVE_POLL_INTERVAL, пока есть подписчики, он забирает
+новые строки одним запросом и раскладывает их по очередям подписчиков
+канала. Простаивающее соединение — это корутина и пустая очередь,
+без своих запросов к базе; раз в LIVE_KEEPALIVE секунд оно шлёт
+комментарий, чтобы прокси не закрыли его. Клиент, отставший на
+LIVE_QUEUE_SIZE событий, отключается и при переподключении получает
+пропущенное по заголовку Last-Event-ID. Если в канале пропущено больше
+LIVE_BACKLOG_SIZE событий, вместо них приходит одно событие `reset`:
+страница устарела, и её пора перезагрузить.
+
+Журнал упорядочен по id, поэтому поллер не пропускает строки, только
+если id выдаются в порядке коммитов. В SQLite так и есть: писатель
+один. Журнал всегда читается из основной базы, мимо ReplicaRouter:
+с отстающей реплики события приходили бы с опозданием. Старые записи
+удаляет `manage.py prune_changes`.
+"""
+import asyncio
+import json
+import re
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS
+from django.utils import timezone
+
+from .models import Change
+
+CHANNEL = re.compile(r'(feed|(group|author|post)/\d+)/')
+RESET_EVENT = b'event: reset\ndata: {}\n\n'
+
+
+def post_created(post):
+    data = json.dumps({'post_id': post.pk})
+    channels = ['feed', f'author/{post.author_id}']
+    if post.group_id is not None:
+        channels.append(f'group/{post.group_id}')
+    Change.objects.bulk_create(
+        Change(scope=channel, kind=Change.POST, data=data)
+        for channel in channels)
+
+
+def comment_created(comment):
+    Change.objects.create(
+        scope=f'post/{comment.post_id}',
+        kind=Change.COMMENT,
+        data=json.dumps({'comment_id': comment.pk,
+                         'post_id': comment.post_id}),
+    )
+
+
+def prune(now=None):
+    """Удаляет записи журнала старше LIVE_CHANGES_KEEP."""
+    deadline = (now or timezone.now()) - timedelta(
+        seconds=settings.LIVE_CHANGES_KEEP)
+    deleted, _ = Change.objects.filter(created__lt=deadline).delete()
+    return deleted
+
+
+def last_change_id():
+    return (Change.objects.using(DEFAULT_DB_ALIAS).order_by('-id')
+            .values_list('id', flat=True).first() or 0)
+
+
+def changes_after(last_id, scope=None, limit=None):
+    """Строки журнала после last_id: (id, канал, тип, данные)."""
+    changes = Change.objects.using(DEFAULT_DB_ALIAS).filter(id__gt=last_id)
+    if scope is not None:
+        changes = changes.filter(scope=scope)
+    return list(changes.order_by('id')
+                .values_list('id', 'scope', 'kind', 'data')
+                [:limit or settings.LIVE_BATCH_SIZE])
+
+
+def format_event(change_id, kind, data):
+    return f'id: {change_id}\nevent: {kind}\ndata: {data}\n\n'.encode()
+
+
+class Subscriber:
+    def __init__(self):
+        self.queue = asyncio.Queue(settings.LIVE_QUEUE_SIZE)
+        self.overflowed = False
+
+    def put(self, event):
+        try:
+            self.queue.put_nowait(event)
+        except asyncio.QueueFull:
+            self.overflowed = True
+
+
+class Hub:
+    """Единственный на процесс читатель журнала."""
+
+    def __init__(self):
+        self.subscribers = defaultdict(set)
+        self.last_id = None
+        self.task = None
+        # Все запросы к базе — в одном потоке с одним соединением.
+        self.executor = ThreadPoolExecutor(1, 'live')
+
+    async def query(self, function, *args):
+        return await asyncio.get_event_loop().run_in_executor(
+            self.executor, function, *args)
+
+    def subscribe(self, scope):
+        subscriber = Subscriber()
+        self.subscribers[scope].add(subscriber)
+        if self.task is None or self.task.done():
+            self.task = asyncio.ensure_future(self.run())
+        return subscriber
+
+    def unsubscribe(self, scope, subscriber):
+        self.subscribers[scope].discard(subscriber)
+        if not self.subscribers[scope]:
+            del self.subscribers[scope]
+
+    async def run(self):
+        """Читает журнал, пока есть подписчики; события до подписки
+        им не достаются.
+        """
+        self.last_id = await self.query(last_change_id)
+        try:
+            while self.subscribers:
+                await asyncio.sleep(settings.LIVE_POLL_INTERVAL)
+                await self.poll()
+        finally:
+            self.last_id = None
+
+    async def poll(self):
+        while True:
+            changes = await self.query(changes_after, self.last_id)
+            for change_id, scope, kind, data in changes:
+                event = (change_id, format_event(change_id, kind, data))
+                for subscriber in self.subscribers.get(scope, ()):
+                    subscriber.put(event)
+                self.last_id = change_id
+            if len(changes) < settings.LIVE_BATCH_SIZE:
+                return
+
+    async def backlog(self, scope, last_id):
+        """События канала после last_id или None, если их больше
+        LIVE_BACKLOG_SIZE.
+        """
+        changes = await self.query(changes_after, last_id, scope,
+                                   settings.LIVE_BACKLOG_SIZE + 1)
+        if len(changes) > settings.LIVE_BACKLOG_SIZE:
+            return None
+        return [(change_id, format_event(change_id, kind, data))
+                for change_id, _, kind, data in changes]
+
+
+hub = Hub()
+
+
+async def application(scope, receive, send):
+    """ASGI-приложение LIVE_URL."""
+    if scope['type'] == 'lifespan':
+        while True:
+            message = await receive()
+            await send({'type': message['type'] + '.complete'})
+            if message['type'] == 'lifespan.shutdown':
+                return
+    path = scope['path']
+    match = (CHANNEL.fullmatch(path[len(settings.LIVE_URL):])
+             if path.startswith(settings.LIVE_URL) else None)
+    if scope['type'] != 'http' or match is None:
+        await send({'type': 'http.response.start', 'status': 404,
+                    'headers': [(b'content-type', b'text/plain')]})
+        await send({'type': 'http.response.body', 'body': b'Not Found'})
+        return
+    headers = dict(scope['headers'])
+    last_id = headers.get(b'last-event-id', b'')
+    await stream(match.group(1), int(last_id) if last_id.isdigit() else None,
+                 receive, send)
+
+
+async def disconnected(receive):
+    while (await receive())['type'] != 'http.disconnect':
+        pass
+
+
+async def stream(channel, last_id, receive, send):
+    subscriber = hub.subscribe(channel)
+    disconnect = asyncio.ensure_future(disconnected(receive))
+    try:
+        await send({
+            'type': 'http.response.start',
+            'status': 200,
+            'headers': [
+                (b'content-type', b'text/event-stream'),
+                (b'cache-control', b'no-cache'),
+                (b'x-accel-buffering', b'no'),
+            ],
+        })
+        retry = int(settings.LIVE_RETRY * 1000)
+        await send({'type': 'http.response.body',
+                    'body': f'retry: {retry}\n\n'.encode(),
+                    'more_body': True})
+        sent = last_id or 0
+        if last_id is not None:
+            backlog = await hub.backlog(channel, last_id)
+            if backlog is None:
+                backlog = [(sent, RESET_EVENT)]
+            for change_id, event in backlog:
+                await send({'type': 'http.response.body', 'body': event,
+                            'more_body': True})
+                sent = change_id
+        while not subscriber.overflowed:
+            get = asyncio.ensure_future(subscriber.queue.get())
+            done, _ = await asyncio.wait(
+                {get, disconnect}, timeout=settings.LIVE_KEEPALIVE,
+                return_when=asyncio.FIRST_COMPLETED)
+            if disconnect in done:
+                get.cancel()
+                return
+            if get not in done:
+                get.cancel()
+                body = b': keepalive\n\n'
+            else:
+                change_id, body = get.result()
+                if change_id <= sent:
+                    continue
+                sent = change_id
+            await send({'type': 'http.response.body', 'body': body,
+                        'more_body': True})
+        await send({'type': 'http.response.body', 'body': b''})
+    finally:
+        disconnect.cancel()
+        hub.unsubscribe(channel, subscriber)
@@ -0,0 +1,99 @@
+import asyncio
+import time
+import tracemalloc
+
+from django.core.management.base import BaseCommand
+
+from core.bench import peak_rss_kb
+from posts import live
+from posts.models import Change
+
+
+class Client:
+    """Соединение SSE без сервера: считает полученные события."""
+
+    def __init__(self, path, delivered):
+        self.scope = {'type': 'http', 'method': 'GET', 'path': path,
+                      'headers': []}
+        self.delivered = delivered
+        self.closed = asyncio.Event()
+        self.requested = False
+
+    async def receive(self):
+        if not self.requested:
+            self.requested = True
+            return {'type': 'http.request', 'body': b''}
+        await self.closed.wait()
+        return {'type': 'http.disconnect'}
+
+    async def send(self, message):
+        if message.get('body', b'').startswith(b'id: '):
+            self.delivered.append(time.perf_counter())
+
+    def start(self):
+        self.task = asyncio.ensure_future(
+            live.application(self.scope, self.receive, self.send))
+
+
+class Command(BaseCommand):
+    help = ('Стоимость простаивающих соединений posts.live и время '
+            'доставки события всем подписчикам канала.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--connections', type=int, nargs='+',
+                            default=[1000, 5000, 10000])
+        parser.add_argument('--idle', type=float, default=2,
+                            help='Секунд простоя для подсчёта опросов.')
+
+    def handle(self, *args, **options):
+        polls = []
+        changes_after = live.changes_after
+
+        def counted(*args):
+            polls.append(None)
+            return changes_after(*args)
+
+        live.changes_after = counted
+        try:
+            for number in options['connections']:
+                result = asyncio.new_event_loop().run_until_complete(
+                    self.measure(number, options['idle'], polls))
+                self.stdout.write(
+                    f'{number:>6} соединений: '
+                    f'{result["memory"] / number / 1024:5.1f} КиБ '
+                    f'на соединение, опросов базы за {options["idle"]} с '
+                    f'простоя: {result["polls"]}, событие всем за '
+                    f'{result["delivery"] * 1000:6.1f} мс')
+        finally:
+            live.changes_after = changes_after
+        self.stdout.write(f'Пиковый RSS: {peak_rss_kb() / 1024:.0f} МиБ')
+
+    async def measure(self, number, idle, polls):
+        delivered = []
+        tracemalloc.start()
+        before = tracemalloc.get_traced_memory()[0]
+        clients = [Client('/live/feed/', delivered) for _ in range(number)]
+        for client in clients:
+            client.start()
+        await asyncio.sleep(0.5)
+        memory = tracemalloc.get_traced_memory()[0] - before
+        tracemalloc.stop()
+
+        polls.clear()
+        await asyncio.sleep(idle)
+        idle_polls = len(polls)
+
+        change = await live.hub.query(
+            lambda: Change.objects.create(scope='feed', kind=Change.POST,
+                                          data='{"post_id": 0}'))
+        start = time.perf_counter()
+        while len(delivered) < number:
+            await asyncio.sleep(0.001)
+        delivery = max(delivered) - start
+        await live.hub.query(change.delete)
+
+        for client in clients:
+            client.closed.set()
+        await asyncio.gather(*(client.task for client in clients))
+        await live.hub.task
+        return {'memory': memory, 'polls': idle_polls, 'delivery': delivery}
@@ -0,0 +1,68 @@
+import timeit
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand
+from django.core.paginator import Paginator
+from django.template import Context, engines
+from django.utils import timezone
+
+from posts.models import Group, Post
+from posts.renderers import render_post_card
+
+User = get_user_model()
+
+PAGE = (
+    "{% for post in page_obj %}{% include 'includes/post.html' %}"
+    "{% endfor %}"
+)
+PAGINATOR = "{% include 'includes/paginator.html' %}"
+
+
+class Command(BaseCommand):
+    help = ('Микробенчмарк рендера карточек постов и паджинатора: '
+            'шаблоны Django против posts.renderers.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--sizes', type=int, nargs='+',
+                            default=[1, 10, 50, 100])
+        parser.add_argument('--repeat', type=int, default=5)
+        parser.add_argument('--number', type=int, default=20)
+
+    def handle(self, *args, **options):
+        engine = engines['django'].engine
+        page_template = engine.from_string(PAGE)
+        paginator_template = engine.from_string(PAGINATOR)
+        for size in options['sizes']:
+            page_obj = Paginator(self.posts(size * 3), size).get_page(2)
+            context = Context({'page_obj': page_obj})
+            timings = {
+                'django': lambda: page_template.render(context),
+                'python': lambda: ''.join(
+                    render_post_card(post) for post in page_obj),
+                'paginator': lambda: paginator_template.render(context),
+            }
+            results = {
+                name: min(timeit.repeat(
+                    func, repeat=options['repeat'], number=options['number'],
+                )) / options['number'] * 1000
+                for name, func in timings.items()
+            }
+            self.stdout.write(
+                f'{size:>4} постов: django {results["django"]:8.3f} мс, '
+                f'python {results["python"]:8.3f} мс '
+                f'(x{results["django"] / results["python"]:.1f}), '
+                f'паджинатор {results["paginator"]:6.3f} мс'
+            )
+
+    def posts(self, count):
+        """Несохранённые посты: бенчмарку не нужна база."""
+        author = User(username='bench', first_name='Лев',
+                      last_name='Толстой')
+        group = Group(title='Группа', slug='bench')
+        now = timezone.now()
+        return [
+            Post(id=number, author=author, pub_date=now,
+                 group=group if number % 2 else None,
+                 text='Строка поста\n' * 5)
+            for number in range(1, count + 1)
+        ]
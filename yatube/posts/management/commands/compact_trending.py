@@ -0,0 +1,26 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from posts import trending
+
+
+class Command(BaseCommand):
+    help = ('Удаляет остывшие посты из рейтинга обсуждаемых. '
+            'Запускайте по расписанию.')
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--rebuild', action='store_true',
+            help='Пересчитать рейтинг по всем комментариям, например '
+                 'после смены TRENDING_HALF_LIFE.',
+        )
+
+    def handle(self, *args, **options):
+        now = time.time()
+        if options['rebuild']:
+            total = trending.rebuild(now)
+            self.stdout.write(f'Пересчитано постов: {total}')
+        else:
+            deleted = trending.compact(now)
+            self.stdout.write(f'Удалено остывших постов: {deleted}')
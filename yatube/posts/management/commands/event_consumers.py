@@ -0,0 +1,26 @@
+from django.core.management.base import BaseCommand
+
+from posts import events
+
+
+class Command(BaseCommand):
+    help = ('Позиции и отставание потребителей журнала posts.events; '
+            'сброс позиции для пересборки и удаление прочитанных всеми '
+            'событий.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--reset', metavar='NAME', action='append',
+                            default=[],
+                            help='Начать чтение журнала заново (с событий, '
+                                 'которые ещё не удалил --prune).')
+        parser.add_argument('--prune', action='store_true',
+                            help='Удалить события, прочитанные всеми.')
+
+    def handle(self, *args, **options):
+        for name in options['reset']:
+            events.Consumer(name).reset()
+            self.stdout.write(f'Позиция {name} сброшена')
+        if options['prune']:
+            self.stdout.write(f'Удалено событий: {events.prune()}')
+        for name, (position, lag) in events.lag().items():
+            self.stdout.write(f'{name}: позиция {position}, отставание {lag}')
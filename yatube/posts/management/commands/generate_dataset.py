@@ -0,0 +1,228 @@
+import os
+import random
+from itertools import accumulate
+from multiprocessing import Pool
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from faker import Faker
+from PIL import Image
+
+from posts.models import Comment, Follow, Group, Post, User
+
+IMAGE_VARIANTS = 20
+USERNAME_PREFIX = 'dataset_user_'
+
+# Параметры, с которыми инициализирован процесс-генератор.
+_worker = {}
+
+
+def zipf_weights(count, alpha=1.1):
+    """Накопленные веса степенного распределения: первые ранги популярнее."""
+    return list(accumulate(1 / rank ** alpha for rank in range(1, count + 1)))
+
+
+def init_worker(seed, author_count, group_count, image_ratio):
+    _worker.update(
+        seed=seed,
+        authors=zipf_weights(author_count),
+        groups=zipf_weights(group_count) if group_count else None,
+        image_ratio=image_ratio,
+    )
+
+
+def generate_posts(chunk):
+    """Возвращает строки постов для чанка: (текст, автор, группа, картинка)."""
+    number, size = chunk
+    seed = _worker['seed'] + number
+    rng = random.Random(seed)
+    fake = Faker('ru_RU')
+    fake.seed_instance(seed)
+    author_range = range(len(_worker['authors']))
+    rows = []
+    for _ in range(size):
+        group = None
+        if _worker['groups'] and rng.random() < 0.7:
+            group = rng.choices(range(len(_worker['groups'])),
+                                cum_weights=_worker['groups'])[0]
+        image = None
+        if rng.random() < _worker['image_ratio']:
+            image = rng.randrange(IMAGE_VARIANTS)
+        author = rng.choices(author_range, cum_weights=_worker['authors'])[0]
+        rows.append((fake.text(max_nb_chars=400), author, group, image))
+    return rows
+
+
+def generate_comments(chunk):
+    """Возвращает строки комментариев: (текст, индекс поста, автор)."""
+    number, size, post_count = chunk
+    seed = _worker['seed'] + 1_000_000 + number
+    rng = random.Random(seed)
+    fake = Faker('ru_RU')
+    fake.seed_instance(seed)
+    if _worker.get('post_count') != post_count:
+        _worker.update(post_count=post_count,
+                       posts=zipf_weights(post_count, alpha=1.3))
+    posts = _worker['posts']
+    author_count = len(_worker['authors'])
+    return [
+        (fake.sentence(),
+         rng.choices(range(post_count), cum_weights=posts)[0],
+         rng.randrange(author_count))
+        for _ in range(size)
+    ]
+
+
+class Command(BaseCommand):
+    help = 'Генерирует воспроизводимый набор данных заданного размера.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=1000)
+        parser.add_argument('--groups', type=int, default=50)
+        parser.add_argument('--posts', type=int, default=100_000)
+        parser.add_argument('--comments', type=int, default=200_000)
+        parser.add_argument(
+            '--follows', type=int, default=20,
+            help='Среднее число подписок на пользователя.',
+        )
+        parser.add_argument(
+            '--images', type=float, default=0,
+            help='Доля постов с картинкой.',
+        )
+        parser.add_argument('--seed', type=int, default=42)
+        parser.add_argument('--batch-size', type=int, default=5000)
+        parser.add_argument('--workers', type=int, default=os.cpu_count())
+
+    def handle(self, *args, **options):
+        self.options = options
+        self.rng = random.Random(options['seed'])
+        self.fake = Faker('ru_RU')
+        self.fake.seed_instance(options['seed'])
+
+        groups = self.create_groups()
+        users = self.create_users()
+        if options['images']:
+            self.create_images()
+        init_args = (options['seed'], len(users), len(groups),
+                     options['images'])
+        if options['workers'] > 1:
+            pool = Pool(options['workers'], init_worker, init_args)
+            imap = pool.imap
+        else:
+            pool = None
+            init_worker(*init_args)
+            imap = map
+        try:
+            posts = self.create_posts(imap, users, groups)
+            self.create_follows(users)
+            self.create_comments(imap, users, posts)
+        finally:
+            if pool is not None:
+                pool.close()
+                pool.join()
+
+    def chunks(self, total):
+        size = self.options['batch_size']
+        for number, start in enumerate(range(0, total, size)):
+            yield number, min(size, total - start)
+
+    def create_groups(self):
+        first = Group.objects.filter(slug__startswith='dataset-').count()
+        Group.objects.bulk_create(
+            Group(
+                title=self.fake.catch_phrase()[:200],
+                slug=f'dataset-{first + number}',
+                description=self.fake.paragraph(),
+            )
+            for number in range(self.options['groups'])
+        )
+        groups = list(Group.objects.filter(
+            slug__startswith='dataset-').order_by('id')
+            .values_list('id', flat=True))
+        self.stdout.write(f'Групп: {len(groups)}')
+        return groups
+
+    def create_users(self):
+        first = User.objects.filter(
+            username__startswith=USERNAME_PREFIX).count()
+        User.objects.bulk_create(
+            (User(
+                username=f'{USERNAME_PREFIX}{first + number}',
+                first_name=self.fake.first_name(),
+                last_name=self.fake.last_name(),
+                password='!',
+            ) for number in range(self.options['users'])),
+        )
+        users = list(User.objects.filter(
+            username__startswith=USERNAME_PREFIX).order_by('id')
+            .values_list('id', flat=True))
+        self.stdout.write(f'Пользователей: {len(users)}')
+        return users
+
+    def create_images(self):
+        directory = os.path.join(settings.MEDIA_ROOT, 'posts')
+        os.makedirs(directory, exist_ok=True)
+        for number in range(IMAGE_VARIANTS):
+            color = tuple(self.rng.randrange(256) for _ in range(3))
+            Image.new('RGB', (960, 540), color).save(
+                os.path.join(directory, f'dataset_{number}.png'))
+
+    def create_posts(self, imap, users, groups):
+        last_id = Post.objects.order_by('-id').values_list(
+            'id', flat=True).first() or 0
+        for rows in imap(generate_posts, self.chunks(self.options['posts'])):
+            with transaction.atomic():
+                Post.objects.bulk_create(
+                    Post(
+                        text=text,
+                        author_id=users[author],
+                        group_id=None if group is None else groups[group],
+                        image=(None if image is None
+                               else f'posts/dataset_{image}.png'),
+                    )
+                    for text, author, group, image in rows
+                )
+        posts = list(Post.objects.filter(id__gt=last_id).order_by('id')
+                     .values_list('id', flat=True))
+        self.stdout.write(f'Постов: {len(posts)}')
+        return posts
+
+    def create_follows(self, users):
+        popularity = zipf_weights(len(users))
+        follows = []
+        total = 0
+        for user in users:
+            count = min(int(self.rng.paretovariate(1.5)
+                            * self.options['follows'] / 3),
+                        len(users) - 1)
+            authors = {
+                users[index] for index in self.rng.choices(
+                    range(len(users)), cum_weights=popularity, k=count)
+            }
+            authors.discard(user)
+            follows.extend(Follow(user_id=user, author_id=author)
+                           for author in sorted(authors))
+            if len(follows) >= self.options['batch_size']:
+                total += len(follows)
+                Follow.objects.bulk_create(follows, ignore_conflicts=True)
+                follows = []
+        Follow.objects.bulk_create(follows, ignore_conflicts=True)
+        total += len(follows)
+        self.stdout.write(f'Подписок: {total}')
+
+    def create_comments(self, imap, users, posts):
+        if not posts:
+            return
+        chunks = ((number, size, len(posts)) for number, size
+                  in self.chunks(self.options['comments']))
+        total = 0
+        for rows in imap(generate_comments, chunks):
+            with transaction.atomic():
+                Comment.objects.bulk_create(
+                    Comment(text=text, post_id=posts[post],
+                            author_id=users[author])
+                    for text, post, author in rows
+                )
+            total += len(rows)
+        self.stdout.write(f'Комментариев: {total}')
@@ -0,0 +1,12 @@
+from django.core.management.base import BaseCommand
+
+from posts import live
+
+
+class Command(BaseCommand):
+    help = ('Удаляет из журнала живых обновлений записи старше '
+            'LIVE_CHANGES_KEEP. Запускайте по расписанию.')
+
+    def handle(self, *args, **options):
+        deleted = live.prune()
+        self.stdout.write(f'Удалено записей журнала: {deleted}')
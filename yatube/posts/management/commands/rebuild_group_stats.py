@@ -0,0 +1,13 @@
+from django.core.management.base import BaseCommand
+
+from posts import group_stats
+from posts.models import GroupStats
+
+
+class Command(BaseCommand):
+    help = ('Пересчитывает статистику групп для каталога, например '
+            'после bulk_create или queryset.update() постов.')
+
+    def handle(self, *args, **options):
+        group_stats.rebuild()
+        self.stdout.write(f'Групп: {GroupStats.objects.count()}')
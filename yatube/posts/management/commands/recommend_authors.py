@@ -0,0 +1,67 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+
+from posts.models import Recommendation
+
+
+class Command(BaseCommand):
+    help = ('Пересчитывает рекомендации «на кого подписаться» '
+            'по подпискам и комментариям. Нужны numpy и scipy из '
+            'requirements-recommendations.txt.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--top', type=int, default=20,
+                            help='Рекомендаций на пользователя.')
+        parser.add_argument('--neighbors', type=int, default=50,
+                            help='Похожих авторов на автора.')
+        parser.add_argument(
+            '--comment-weight', type=float, default=0.5,
+            help='Вес комментариев к постам автора относительно подписки.',
+        )
+        parser.add_argument(
+            '--block-size', type=int, default=1000,
+            help='Наибольшее число строк матрицы за один шаг.',
+        )
+        parser.add_argument(
+            '--budget', type=int, default=2_000_000,
+            help='Ненулевых элементов в произведении за один шаг; '
+                 'ограничивает память.',
+        )
+        parser.add_argument('--chunk-size', type=int, default=10000,
+                            help='Строк, читаемых из базы за раз.')
+
+    def handle(self, *args, **options):
+        try:
+            from posts.recommendations import recommend
+        except ImportError as error:
+            raise CommandError(
+                f'{error}. Установите numpy и scipy: '
+                'pip install -r requirements-recommendations.txt')
+        start = time.perf_counter()
+        total = 0
+        blocks = recommend(
+            top=options['top'],
+            neighbors=options['neighbors'],
+            comment_weight=options['comment_weight'],
+            block_size=options['block_size'],
+            budget=options['budget'],
+            chunk_size=options['chunk_size'],
+        )
+        for first_id, next_id, rows in blocks:
+            stale = Recommendation.objects.all()
+            if first_id is not None:
+                stale = stale.filter(user_id__gte=first_id)
+            if next_id is not None:
+                stale = stale.filter(user_id__lt=next_id)
+            with transaction.atomic():
+                stale.delete()
+                Recommendation.objects.bulk_create(
+                    (Recommendation(user_id=user, author_id=author,
+                                    score=score)
+                     for user, author, score in rows),
+                )
+            total += len(rows)
+        self.stdout.write(f'Рекомендаций: {total} за '
+                          f'{time.perf_counter() - start:.1f} с')
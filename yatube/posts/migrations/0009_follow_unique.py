@@ -0,0 +1,50 @@
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+def remove_broken_follows(apps, schema_editor):
+    Follow = apps.get_model('posts', 'Follow')
+    Follow.objects.filter(
+        models.Q(user__isnull=True) | models.Q(author__isnull=True)
+    ).delete()
+    seen = set()
+    duplicates = []
+    for pk, user, author in Follow.objects.order_by('pk').values_list(
+            'pk', 'user', 'author'):
+        if (user, author) in seen:
+            duplicates.append(pk)
+        seen.add((user, author))
+    Follow.objects.filter(pk__in=duplicates).delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('posts', '0008_auto_20221227_1630'),
+    ]
+
+    operations = [
+        migrations.RunPython(remove_broken_follows,
+                             migrations.RunPython.noop),
+        migrations.AlterField(
+            model_name='follow',
+            name='author',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='following', to=settings.AUTH_USER_MODEL),
+        ),
+        migrations.AlterField(
+            model_name='follow',
+            name='user',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='follower', to=settings.AUTH_USER_MODEL),
+        ),
+        migrations.AlterField(
+            model_name='post',
+            name='image',
+            field=models.ImageField(blank=True, help_text='Выберите изображение к посту', null=True, upload_to='posts/', verbose_name='Картинка'),
+        ),
+        migrations.AddConstraint(
+            model_name='follow',
+            constraint=models.UniqueConstraint(fields=('user', 'author'), name='unique_follow'),
+        ),
+    ]
@@ -0,0 +1,83 @@
+# Generated by Django 2.2.16 on 2026-10-19 10:49
+
+from collections import defaultdict
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+# GROUP_TOP_AUTHORS at the time of the migration.
+TOP_AUTHORS = 3
+
+
+def fill_group_stats(apps, schema_editor):
+    Group = apps.get_model('posts', 'Group')
+    Post = apps.get_model('posts', 'Post')
+    GroupStats = apps.get_model('posts', 'GroupStats')
+    GroupAuthorStats = apps.get_model('posts', 'GroupAuthorStats')
+    posts = Post.objects.filter(group__isnull=False).order_by()
+    GroupAuthorStats.objects.bulk_create(
+        GroupAuthorStats(group_id=row['group_id'], author_id=row['author_id'],
+                         post_count=row['total'])
+        for row in posts.values('group_id', 'author_id').annotate(
+            total=models.Count('id')).iterator()
+    )
+    top_authors = defaultdict(list)
+    pairs = GroupAuthorStats.objects.order_by(
+        'group_id', '-post_count', 'author_id').values_list(
+        'group_id', 'author_id').iterator()
+    for group_id, author_id in pairs:
+        if len(top_authors[group_id]) < TOP_AUTHORS:
+            top_authors[group_id].append(author_id)
+    totals = {
+        row['group_id']: row for row in posts.values('group_id').annotate(
+            total=models.Count('id'), last=models.Max('pub_date')).iterator()
+    }
+    GroupStats.objects.bulk_create(
+        GroupStats(
+            group_id=group_id,
+            post_count=totals.get(group_id, {}).get('total', 0),
+            last_post_at=totals.get(group_id, {}).get('last'),
+            top_author_ids=','.join(map(str, top_authors[group_id])),
+        )
+        for group_id in Group.objects.values_list('id', flat=True)
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('posts', '0011_postscore'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='GroupStats',
+            fields=[
+                ('group', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='stats', serialize=False, to='posts.Group')),
+                ('post_count', models.PositiveIntegerField(default=0)),
+                ('last_post_at', models.DateTimeField(blank=True, null=True)),
+                ('top_author_ids', models.CharField(blank=True, max_length=255)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='GroupAuthorStats',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('post_count', models.PositiveIntegerField(default=0)),
+                ('author', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to=settings.AUTH_USER_MODEL)),
+                ('group', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='posts.Group')),
+            ],
+        ),
+        migrations.AddIndex(
+            model_name='groupauthorstats',
+            index=models.Index(fields=['group', '-post_count'], name='groupauthor_group_count'),
+        ),
+        migrations.AddConstraint(
+            model_name='groupauthorstats',
+            constraint=models.UniqueConstraint(fields=('group', 'author'), name='unique_group_author'),
+        ),
+        migrations.RunPython(fill_group_stats, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,36 @@
+# Generated by Django 2.2.16 on 2026-10-19 11:02
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0013_notification'),
+    ]
+
+    operations = [
+        migrations.RemoveConstraint(
+            model_name='notification',
+            name='unique_unread_notification',
+        ),
+        migrations.AddField(
+            model_name='notification',
+            name='comment',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='+', to='posts.Comment'),
+        ),
+        migrations.AddField(
+            model_name='notification',
+            name='kind',
+            field=models.CharField(choices=[('post', 'Новые посты'), ('comment', 'Новые комментарии')], default='post', max_length=10),
+        ),
+        migrations.AddConstraint(
+            model_name='notification',
+            constraint=models.UniqueConstraint(condition=models.Q(('is_read', False), ('kind', 'post')), fields=('user', 'author'), name='unique_unread_post_notification'),
+        ),
+        migrations.AddConstraint(
+            model_name='notification',
+            constraint=models.UniqueConstraint(condition=models.Q(('is_read', False), ('kind', 'comment')), fields=('user', 'post'), name='unique_unread_comment_notification'),
+        ),
+    ]
@@ -0,0 +1,27 @@
+# Generated by Django 2.2.16 on 2026-10-19 11:04
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0014_comment_notification'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Change',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('scope', models.CharField(max_length=50)),
+                ('kind', models.CharField(choices=[('post', 'Новый пост'), ('comment', 'Новый комментарий')], max_length=10)),
+                ('data', models.TextField()),
+                ('created', models.DateTimeField(auto_now_add=True, db_index=True)),
+            ],
+        ),
+        migrations.AddIndex(
+            model_name='change',
+            index=models.Index(fields=['scope', 'id'], name='change_scope_id'),
+        ),
+    ]
@@ -1,10 +1,29 @@
 from django.contrib.auth import get_user_model
-from django.db import models
+from django.db import models, router, transaction
+from django.utils import timezone
 
 User = get_user_model()
 
 
-class Group(models.Model):
+class Logged(models.Model):
+    """Модель, изменения которой пишутся в журнал Event (posts.events).
+
+    save() выполняется в транзакции, чтобы запись журнала из сигнала
+    post_save не разошлась с самим изменением; delete() и так
+    транзакционен.
+    """
+
+    class Meta:
+        abstract = True
+
+    def save(self, *args, **kwargs):
+        using = kwargs.get('using') or router.db_for_write(
+            type(self), instance=self)
+        with transaction.atomic(using=using, savepoint=False):
+            super().save(*args, **kwargs)
+
+
+class Group(Logged):
     title = models.CharField(max_length=200)
     slug = models.SlugField(unique=True)
     description = models.TextField()
@@ -13,7 +32,7 @@ class Group(models.Model):
         return self.title
 
 
-class Post(models.Model):
+class Post(Logged):
     text = models.TextField(
         'Текст поста',
         help_text='Введите текст поста')
@@ -47,7 +66,7 @@ class Post(models.Model):
         return self.text[:15]
 
 
-class Comment(models.Model):
+class Comment(Logged):
     post = models.ForeignKey(
         Post,
         on_delete=models.CASCADE,
@@ -69,7 +88,7 @@ class Comment(models.Model):
         return self.text[:15]
 
 
-class Follow(models.Model):
+class Follow(Logged):
     user = models.ForeignKey(
         User,
         on_delete=models.CASCADE,
@@ -80,3 +99,186 @@ class Follow(models.Model):
         on_delete=models.CASCADE,
         related_name='following',
     )
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['user', 'author'],
+                                    name='unique_follow'),
+        ]
+
+
+class Recommendation(models.Model):
+    """Рекомендованный автор, см. команду recommend_authors."""
+    user = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        related_name='recommendations',
+    )
+    author = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        related_name='+',
+    )
+    score = models.FloatField()
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['user', '-score'],
+                         name='recommendation_user_score'),
+        ]
+
+
+class PostScore(models.Model):
+    """Счёт поста в рейтинге обсуждаемых, см. posts.trending."""
+    post = models.OneToOneField(
+        Post,
+        on_delete=models.CASCADE,
+        primary_key=True,
+        related_name='trending_score',
+    )
+    log_score = models.FloatField()
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['-log_score'], name='postscore_log_score'),
+        ]
+
+
+class GroupStats(models.Model):
+    """Статистика группы для каталога, см. posts.group_stats."""
+    group = models.OneToOneField(
+        Group,
+        on_delete=models.CASCADE,
+        primary_key=True,
+        related_name='stats',
+    )
+    post_count = models.PositiveIntegerField(default=0)
+    last_post_at = models.DateTimeField(blank=True, null=True)
+    top_author_ids = models.CharField(max_length=255, blank=True)
+
+
+class GroupAuthorStats(models.Model):
+    """Число постов автора в группе."""
+    group = models.ForeignKey(
+        Group,
+        on_delete=models.CASCADE,
+        related_name='+',
+    )
+    author = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        related_name='+',
+    )
+    post_count = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['group', 'author'],
+                                    name='unique_group_author'),
+        ]
+        indexes = [
+            models.Index(fields=['group', '-post_count'],
+                         name='groupauthor_group_count'),
+        ]
+
+
+class Notification(models.Model):
+    """Сводка о новых постах автора или комментариях к посту,
+    см. posts.notifications.
+    """
+    POST = 'post'
+    COMMENT = 'comment'
+    KINDS = (
+        (POST, 'Новые посты'),
+        (COMMENT, 'Новые комментарии'),
+    )
+
+    user = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        related_name='notifications',
+    )
+    kind = models.CharField(max_length=10, choices=KINDS, default=POST)
+    author = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        related_name='+',
+    )
+    post = models.ForeignKey(
+        Post,
+        on_delete=models.CASCADE,
+        related_name='+',
+    )
+    comment = models.ForeignKey(
+        Comment,
+        on_delete=models.CASCADE,
+        related_name='+',
+        blank=True,
+        null=True,
+    )
+    count = models.PositiveIntegerField(default=1)
+    is_read = models.BooleanField(default=False)
+    updated = models.DateTimeField(default=timezone.now)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=['user', 'author'],
+                condition=models.Q(is_read=False, kind='post'),
+                name='unique_unread_post_notification'),
+            models.UniqueConstraint(
+                fields=['user', 'post'],
+                condition=models.Q(is_read=False, kind='comment'),
+                name='unique_unread_comment_notification'),
+        ]
+        indexes = [
+            models.Index(fields=['user', '-updated'],
+                         name='notification_user_updated'),
+        ]
+
+
+class Change(models.Model):
+    """Запись журнала изменений для живых обновлений, см. posts.live."""
+    POST = 'post'
+    COMMENT = 'comment'
+    KINDS = (
+        (POST, 'Новый пост'),
+        (COMMENT, 'Новый комментарий'),
+    )
+
+    scope = models.CharField(max_length=50)
+    kind = models.CharField(max_length=10, choices=KINDS)
+    data = models.TextField()
+    created = models.DateTimeField(auto_now_add=True, db_index=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['scope', 'id'], name='change_scope_id'),
+        ]
+
+
+class Event(models.Model):
+    """Запись журнала изменений Post, Comment, Follow и Group,
+    см. posts.events.
+    """
+    CREATED = 'created'
+    UPDATED = 'updated'
+    DELETED = 'deleted'
+    ACTIONS = (
+        (CREATED, 'Создан'),
+        (UPDATED, 'Изменён'),
+        (DELETED, 'Удалён'),
+    )
+
+    model = models.CharField(max_length=20)
+    action = models.CharField(max_length=10, choices=ACTIONS)
+    object_id = models.BigIntegerField()
+    data = models.TextField()
+    created = models.DateTimeField(auto_now_add=True)
+
+
+class EventOffset(models.Model):
+    """Позиция потребителя журнала Event."""
+    consumer = models.CharField(max_length=100, primary_key=True)
+    position = models.BigIntegerField(default=0)
+    updated = models.DateTimeField(auto_now=True)
@@ -0,0 +1,167 @@
+"""Уведомления о новых постах и комментариях.
+
+Новый пост ставит задачу `posts.notify_followers`, новый комментарий —
+`posts.notify_comment` (jobs.queue). Первая раздаёт уведомления
+подписчикам автора, вторая — автору поста и тем, кто уже писал к нему
+комментарии; обе пачками по NOTIFICATIONS_CHUNK_SIZE.
+
+Уведомление — сводка. Пока пользователь её не прочитал, новые посты
+того же автора (или комментарии к тому же посту) только увеличивают
+счётчик и сдвигают ссылку на последнее событие. Поэтому непрочитанных
+строк у пользователя не больше, чем авторов в подписках и
+обсуждений, в которых он участвует. Раздача идемпотентна: сводка,
+в которой уже учтено это или более новое событие, не меняется, так
+что повтор упавшей задачи ничего не учитывает дважды.
+
+Прочитанной сводку делает только POST — кнопка у уведомления или
+«прочитать все»; просмотр инбокса в базу не пишет.
+
+Число непрочитанных сводок для шапки лежит в кеше: раздача и прочтение
+меняют его incr/decr без COUNT. Значение в кеше живёт
+NOTIFICATIONS_CACHE_TIMEOUT, после чего пересчитывается по базе —
+так сверяются расхождения (гонки, локальный кеш воркера).
+"""
+from datetime import timedelta
+from itertools import islice
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import F
+from django.utils import timezone
+
+from jobs.queue import enqueue
+
+from .models import Comment, Follow, Notification, Post
+
+# Поле, по которому события сводятся в одну сводку, и поле с id
+# события, по которому сводка отличает новые события от учтённых.
+DIGESTS = {
+    Notification.POST: ('author_id', 'post_id'),
+    Notification.COMMENT: ('post_id', 'comment_id'),
+}
+
+
+def cache_key(user_id):
+    return f'notifications:unread:{user_id}'
+
+
+def post_published(post):
+    enqueue('posts.notify_followers', post.pk,
+            dedup_key=f'notify_followers:{post.pk}')
+
+
+def comment_added(comment):
+    enqueue('posts.notify_comment', comment.pk,
+            dedup_key=f'notify_comment:{comment.pk}')
+
+
+def fan_out(post_id, chunk_size=None):
+    """Раздаёт уведомление о посте подписчикам его автора."""
+    post = Post.objects.filter(pk=post_id).values(
+        'author_id', 'pub_date').first()
+    if post is None:
+        return 0
+    followers = (Follow.objects.filter(author_id=post['author_id'])
+                 .order_by('user_id').values_list('user_id', flat=True))
+    return notify_all(followers, Notification.POST, post['pub_date'],
+                      chunk_size, author_id=post['author_id'],
+                      post_id=post_id)
+
+
+def fan_out_comment(comment_id, chunk_size=None):
+    """Раздаёт уведомление о комментарии участникам обсуждения."""
+    comment = (Comment.objects.filter(pk=comment_id)
+               .values('author_id', 'post_id', 'post__author_id', 'created')
+               .first())
+    if comment is None or comment['post_id'] is None:
+        return 0
+    participants = {comment['post__author_id']}
+    participants.update(
+        Comment.objects.filter(post_id=comment['post_id'], pk__lt=comment_id)
+        .values_list('author_id', flat=True).distinct().iterator())
+    participants.discard(comment['author_id'])
+    return notify_all(sorted(participants), Notification.COMMENT,
+                      comment['created'], chunk_size,
+                      author_id=comment['author_id'],
+                      post_id=comment['post_id'], comment_id=comment_id)
+
+
+def notify_all(user_ids, kind, when, chunk_size=None, **fields):
+    chunk_size = chunk_size or settings.NOTIFICATIONS_CHUNK_SIZE
+    if hasattr(user_ids, 'iterator'):
+        user_ids = user_ids.iterator(chunk_size=chunk_size)
+    user_ids = iter(user_ids)
+    total = 0
+    while True:
+        chunk = list(islice(user_ids, chunk_size))
+        if not chunk:
+            return total
+        notify(chunk, kind, when, **fields)
+        total += len(chunk)
+
+
+def notify(user_ids, kind, when, **fields):
+    """Добавляет событие в сводки пользователей user_ids."""
+    group, event = DIGESTS[kind]
+    unread = Notification.objects.filter(
+        user_id__in=user_ids, kind=kind, is_read=False,
+        **{group: fields[group]})
+    with transaction.atomic():
+        existing = set(unread.values_list('user_id', flat=True))
+        unread.filter(**{f'{event}__lt': fields[event]}).update(
+            count=F('count') + 1, updated=when, **fields)
+        created = [user_id for user_id in user_ids
+                   if user_id not in existing]
+        Notification.objects.bulk_create(
+            [Notification(user_id=user_id, kind=kind, updated=when,
+                          **fields)
+             for user_id in created],
+            ignore_conflicts=True,
+        )
+    change_counts(created, 1)
+
+
+def unread_count(user_id):
+    key = cache_key(user_id)
+    count = cache.get(key)
+    if count is None:
+        count = Notification.objects.filter(
+            user_id=user_id, is_read=False).count()
+        cache.set(key, count, settings.NOTIFICATIONS_CACHE_TIMEOUT)
+    return count
+
+
+def change_counts(user_ids, delta):
+    """Меняет закешированные счётчики; отсутствующие посчитает
+    unread_count.
+    """
+    for user_id in user_ids:
+        try:
+            if cache.incr(cache_key(user_id), delta) < 0:
+                cache.delete(cache_key(user_id))
+        except ValueError:
+            pass
+
+
+def mark_read(user_id, ids):
+    """Отмечает прочитанными уведомления ids и удаляет прочитанные
+    старше NOTIFICATIONS_KEEP_DAYS.
+    """
+    notifications = Notification.objects.filter(user_id=user_id)
+    if ids:
+        read = notifications.filter(pk__in=ids, is_read=False).update(
+            is_read=True)
+        change_counts([user_id], -read)
+    notifications.filter(
+        is_read=True,
+        updated__lt=timezone.now() - timedelta(
+            days=settings.NOTIFICATIONS_KEEP_DAYS),
+    ).delete()
+
+
+def mark_all_read(user_id):
+    """Отмечает прочитанными все уведомления одним UPDATE."""
+    Notification.objects.filter(user_id=user_id, is_read=False).update(
+        is_read=True)
+    cache.set(cache_key(user_id), 0, settings.NOTIFICATIONS_CACHE_TIMEOUT)
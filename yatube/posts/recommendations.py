@@ -0,0 +1,164 @@
+"""Рекомендации «на кого подписаться».
+
+Матрица взаимодействий R (пользователь × автор) разреженная: подписка
+даёт вес 1, комментарии к постам автора — comment_weight * log(1 + n).
+Сходство авторов — косинус столбцов R, у каждого автора остаются
+neighbors ближайших. Оценки кандидатов для блока пользователей —
+R[блок] · S, из них выбрасываются сам пользователь и авторы, на которых
+он уже подписан.
+
+Все произведения считаются блоками строк. Размер блока подбирается
+по оценке числа ненулевых элементов произведения (не больше budget),
+поэтому, кроме самих рёбер, в памяти держится только блок произведения
+и по neighbors соседей на автора. Нужны numpy и scipy; сайту они
+не нужны, поэтому они не в requirements.txt, а в необязательном
+requirements-recommendations.txt.
+"""
+from array import array
+
+import numpy as np
+from django.db.models import Count, F
+from scipy import sparse
+
+from .models import Comment, Follow
+
+
+def fetch_columns(queryset, chunk_size):
+    """Столбцы values_list в виде массивов int64."""
+    columns = None
+    for row in queryset.iterator(chunk_size=chunk_size):
+        if columns is None:
+            columns = [array('q') for _ in row]
+        for column, value in zip(columns, row):
+            column.append(value)
+    return [np.frombuffer(column, dtype=np.int64)
+            for column in columns or ()]
+
+
+def load_matrices(comment_weight, chunk_size):
+    """(ids, R, F): id пользователей по индексам строк и столбцов,
+    матрица взаимодействий и матрица подписок.
+    """
+    follows = fetch_columns(
+        Follow.objects.values_list('user_id', 'author_id'), chunk_size)
+    comments = fetch_columns(
+        Comment.objects.filter(post__isnull=False)
+        .exclude(post__author_id=F('author_id'))
+        .values('author_id', 'post__author_id')
+        .annotate(total=Count('id'))
+        .values_list('author_id', 'post__author_id', 'total')
+        .order_by(),
+        chunk_size)
+    if not follows:
+        follows = [np.empty(0, np.int64)] * 2
+    if not comments:
+        comments = [np.empty(0, np.int64)] * 3
+    ids = np.unique(np.concatenate(follows + comments[:2]))
+    size = len(ids)
+
+    follow_rows = np.searchsorted(ids, follows[0])
+    follow_columns = np.searchsorted(ids, follows[1])
+    followed = sparse.csr_matrix(
+        (np.ones(len(follow_rows), np.float32),
+         (follow_rows, follow_columns)),
+        shape=(size, size))
+    commented = sparse.csr_matrix(
+        ((comment_weight * np.log1p(comments[2])).astype(np.float32),
+         (np.searchsorted(ids, comments[0]),
+          np.searchsorted(ids, comments[1]))),
+        shape=(size, size))
+    return ids, followed + commented, followed
+
+
+def top_per_row(matrix, k):
+    """Оставляет в каждой строке k наибольших значений."""
+    matrix = matrix.tocsr()
+    matrix.eliminate_zeros()
+    rows = np.repeat(np.arange(matrix.shape[0]), np.diff(matrix.indptr))
+    order = np.lexsort((-matrix.data, rows))
+    rank = np.arange(len(order)) - matrix.indptr[rows[order]]
+    keep = order[rank < k]
+    return sparse.csr_matrix(
+        (matrix.data[keep], (rows[keep], matrix.indices[keep])),
+        shape=matrix.shape)
+
+
+def product_sizes(left, right):
+    """Оценка сверху числа ненулевых в каждой строке left @ right."""
+    pattern = left.copy()
+    pattern.data = np.ones_like(pattern.data, dtype=np.int64)
+    return pattern @ np.diff(right.indptr).astype(np.int64)
+
+
+def row_blocks(sizes, budget, block_size):
+    """Границы блоков строк: сумма sizes не больше budget (кроме
+    одиночных строк, которые больше budget сами по себе) и не больше
+    block_size строк.
+    """
+    total = np.cumsum(sizes)
+    start = 0
+    while start < len(sizes):
+        done = total[start - 1] if start else 0
+        end = int(np.searchsorted(total, done + budget, side='right'))
+        end = min(max(end, start + 1), start + block_size)
+        yield start, end
+        start = end
+
+
+def without(matrix, start, excluded=None):
+    """matrix без диагонали, сдвинутой на start, и позиций excluded.
+
+    Строки matrix — строки start, start + 1, ... полной матрицы, так
+    что диагональ соответствует самому пользователю или автору.
+    """
+    mask = sparse.eye(*matrix.shape, k=start, format='csr')
+    if excluded is not None:
+        mask = mask + excluded
+    return matrix - matrix.multiply(mask.astype(bool))
+
+
+def author_similarity(interactions, neighbors, block_size, budget):
+    """Разреженная матрица сходства авторов, по neighbors на строку."""
+    norms = np.sqrt(np.asarray(
+        interactions.multiply(interactions).sum(axis=0))).ravel()
+    scale = np.divide(1, norms, out=np.zeros_like(norms), where=norms > 0)
+    normalized = (interactions @ sparse.diags(scale)).tocsr()
+    by_author = normalized.T.tocsr()
+    size = interactions.shape[1]
+    blocks = [sparse.csr_matrix((0, size), dtype=np.float32)]
+    sizes = product_sizes(by_author, normalized)
+    for start, end in row_blocks(sizes, budget, block_size):
+        block = by_author[start:end] @ normalized
+        blocks.append(top_per_row(without(block, start), neighbors))
+    return sparse.vstack(blocks, format='csr')
+
+
+def recommend(top=20, neighbors=50, comment_weight=0.5, block_size=1000,
+              budget=2_000_000, chunk_size=10000):
+    """Генерирует блоки (first_id, next_id, rows).
+
+    rows — тройки (user_id, author_id, score) для пользователей с id
+    first_id <= id < next_id; None означает «без границы». Блоки
+    покрывают все id, так что по границам можно заменять старые
+    рекомендации целиком.
+    """
+    ids, interactions, followed = load_matrices(comment_weight, chunk_size)
+    similarity = author_similarity(interactions, neighbors, block_size,
+                                   budget)
+    size = len(ids)
+    if not size:
+        yield None, None, []
+        return
+    sizes = product_sizes(interactions, similarity)
+    for start, end in row_blocks(sizes, budget, block_size):
+        scores = top_per_row(
+            without(interactions[start:end] @ similarity, start,
+                    followed[start:end]),
+            top).tocoo()
+        yield (
+            None if start == 0 else int(ids[start]),
+            None if end == size else int(ids[end]),
+            list(zip(ids[scores.row + start].tolist(),
+                     ids[scores.col].tolist(),
+                     scores.data.tolist())),
+        )
@@ -0,0 +1,106 @@
+"""Обработчики сигналов моделей posts.
+
+Все они читают из основной базы (core.routers.primary): в запросе
+чтения постов идут с реплики, а она может ещё не видеть старую группу
+поста или только что созданную строку.
+"""
+from django.db.models.signals import post_delete, post_save, pre_save
+from django.dispatch import receiver
+
+from core.routers import primary
+
+from . import events, follows, group_stats, live, notifications, trending
+from .models import Comment, Event, Follow, Group, GroupStats, Post
+
+LOGGED = (Group, Post, Comment, Follow)
+
+
+@receiver(post_save, sender=Follow)
+@receiver(post_delete, sender=Follow)
+@primary()
+def invalidate_follows(sender, instance, **kwargs):
+    follows.invalidate([instance.user_id])
+
+
+@receiver(post_save, sender=Comment)
+@primary()
+def notify_comment(sender, instance, created, raw, **kwargs):
+    if created and not raw and instance.post_id is not None:
+        notifications.comment_added(instance)
+
+
+@receiver(post_save, sender=Comment)
+@primary()
+def log_comment(sender, instance, created, raw, **kwargs):
+    if created and not raw and instance.post_id is not None:
+        live.comment_created(instance)
+
+
+@receiver(post_save, sender=Comment)
+@primary()
+def score_comment(sender, instance, created, raw, **kwargs):
+    if created and not raw and instance.post_id is not None:
+        trending.record(instance.post_id, instance.created.timestamp())
+
+
+@receiver(post_save, sender=Group)
+@primary()
+def create_group_stats(sender, instance, created, raw, **kwargs):
+    if created and not raw:
+        GroupStats.objects.get_or_create(group=instance)
+
+
+@receiver(pre_save, sender=Post)
+@primary()
+def remember_post_group(sender, instance, raw, **kwargs):
+    instance._stats_before = None
+    if instance.pk is not None and not raw:
+        instance._stats_before = Post.objects.filter(
+            pk=instance.pk).values_list('group_id', 'author_id').first()
+
+
+@receiver(post_save, sender=Post)
+@primary()
+def notify_followers(sender, instance, created, raw, **kwargs):
+    if created and not raw:
+        notifications.post_published(instance)
+
+
+@receiver(post_save, sender=Post)
+@primary()
+def log_post(sender, instance, created, raw, **kwargs):
+    if created and not raw:
+        live.post_created(instance)
+
+
+@receiver(post_save, sender=Post)
+@primary()
+def count_saved_post(sender, instance, raw, **kwargs):
+    if not raw:
+        group_stats.post_changed(
+            instance._stats_before,
+            (instance.group_id, instance.author_id),
+            instance.pub_date,
+        )
+
+
+@receiver(post_delete, sender=Post)
+@primary()
+def count_deleted_post(sender, instance, **kwargs):
+    group_stats.post_changed((instance.group_id, instance.author_id), None)
+
+
+@primary()
+def record_saved(sender, instance, created, raw, **kwargs):
+    if not raw:
+        events.record(instance, Event.CREATED if created else Event.UPDATED)
+
+
+@primary()
+def record_deleted(sender, instance, **kwargs):
+    events.record(instance, Event.DELETED)
+
+
+for model in LOGGED:
+    post_save.connect(record_saved, sender=model)
+    post_delete.connect(record_deleted, sender=model)
@@ -0,0 +1,13 @@
+from jobs.queue import task
+
+from . import notifications
+
+
+@task('posts.notify_followers')
+def notify_followers(post_id):
+    notifications.fan_out(post_id)
+
+
+@task('posts.notify_comment')
+def notify_comment(comment_id):
+    notifications.fan_out_comment(comment_id)
@@ -0,0 +1,26 @@
+from django import template
+from django.conf import settings
+
+from core.tracing import span
+
+from ..renderers import render_post_card
+
+register = template.Library()
+
+POST_CARD_TEMPLATE = 'includes/post.html'
+
+
+@register.simple_tag(takes_context=True)
+def post_card(context, post):
+    """Карточка поста: шаблоном или быстрым рендером, см. POST_CARD_RENDERER.
+    """
+    with span('post_card', renderer=settings.POST_CARD_RENDERER):
+        if settings.POST_CARD_RENDERER == 'python':
+            return render_post_card(post, context.get('group'))
+        cache = context.render_context.dicts[0].setdefault('post_card', {})
+        card = cache.get(POST_CARD_TEMPLATE)
+        if card is None:
+            card = context.template.engine.get_template(POST_CARD_TEMPLATE)
+            cache[POST_CARD_TEMPLATE] = card
+        with context.push(post=post):
+            return card.render(context)
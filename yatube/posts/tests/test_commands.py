@@ -0,0 +1,83 @@
+from importlib.util import find_spec
+from io import StringIO
+from unittest import mock, skipUnless
+
+from django.core.management import CommandError, call_command
+from django.db.models import F
+from django.test import TestCase
+
+from ..models import Comment, Follow, Group, Post, Recommendation, User
+
+
+class GenerateDatasetTest(TestCase):
+    def generate(self):
+        call_command(
+            'generate_dataset', users=20, groups=3, posts=120, comments=90,
+            follows=4, batch_size=50, workers=1, stdout=StringIO(),
+        )
+
+    def test_generates_requested_sizes(self):
+        """ Команда создаёт заданное число объектов. """
+        self.generate()
+        self.assertEqual(User.objects.count(), 20)
+        self.assertEqual(Group.objects.count(), 3)
+        self.assertEqual(Post.objects.count(), 120)
+        self.assertEqual(Comment.objects.count(), 90)
+        self.assertFalse(Follow.objects.filter(
+            user_id=F('author_id')).exists())
+
+    def test_dataset_is_reproducible(self):
+        """ Один и тот же seed даёт одинаковые данные. """
+        self.generate()
+        first = list(Post.objects.order_by('id').values_list(
+            'text', 'author__username', 'group__slug'))
+        Post.objects.all().delete()
+        User.objects.all().delete()
+        Group.objects.all().delete()
+        self.generate()
+        second = list(Post.objects.order_by('id').values_list(
+            'text', 'author__username', 'group__slug'))
+        self.assertEqual(first, second)
+
+
+class RecommendAuthorsDependenciesTest(TestCase):
+    def test_missing_scipy_is_reported(self):
+        """ Без numpy и scipy команда объясняет, что установить. """
+        with mock.patch.dict('sys.modules', {'posts.recommendations': None}):
+            with self.assertRaisesMessage(
+                    CommandError, 'requirements-recommendations.txt'):
+                call_command('recommend_authors', stdout=StringIO())
+
+
+@skipUnless(find_spec('scipy'), 'нужны numpy и scipy')
+class RecommendAuthorsTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.users = [User.objects.create_user(username=f'user{i}')
+                     for i in range(5)]
+
+    def test_recommends_authors_followed_by_similar_users(self):
+        """ Рекомендуются авторы, которых читают вместе с подписками
+        пользователя, кроме уже подписанных и его самого.
+        """
+        user, first, second, third, reader = self.users
+        Follow.objects.bulk_create([
+            Follow(user=user, author=first),
+            Follow(user=reader, author=first),
+            Follow(user=reader, author=second),
+            Follow(user=reader, author=user),
+        ])
+        post = Post.objects.create(author=third, text='Тестовый пост')
+        Comment.objects.create(post=post, author=reader, text='Комментарий')
+        call_command('recommend_authors', block_size=2, stdout=StringIO())
+        recommended = set(Recommendation.objects.filter(user=user)
+                          .values_list('author', flat=True))
+        self.assertEqual(recommended, {second.id, third.id})
+
+    def test_rerun_replaces_recommendations(self):
+        """ Повторный запуск заменяет старые рекомендации. """
+        user, author = self.users[:2]
+        Recommendation.objects.create(user=user, author=author, score=1)
+        call_command('recommend_authors', stdout=StringIO())
+        self.assertFalse(Recommendation.objects.exists())
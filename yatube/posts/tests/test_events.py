@@ -0,0 +1,107 @@
+from io import StringIO
+
+from django.contrib.auth import get_user_model
+from django.core.management import call_command
+from django.db import transaction
+from django.test import TestCase
+
+from .. import events, follows
+from ..models import Comment, Event, EventOffset, Follow, Post
+
+User = get_user_model()
+
+
+class EventLogTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create_user(username='author')
+        cls.reader = User.objects.create_user(username='reader')
+
+    def setUp(self):
+        Event.objects.all().delete()
+
+    def test_changes_are_logged(self):
+        """ Создание, правка и удаление пишутся в журнал. """
+        post = Post.objects.create(author=self.author, text='Пост')
+        post.text = 'Правка'
+        post.save()
+        pk = post.pk
+        post.delete()
+        self.assertEqual(
+            list(Event.objects.values_list('model', 'action', 'object_id')),
+            [('post', Event.CREATED, pk),
+             ('post', Event.UPDATED, pk),
+             ('post', Event.DELETED, pk)])
+        self.assertEqual(events.read(0, 10)[1].data['text'], 'Правка')
+
+    def test_event_rolls_back_with_change(self):
+        """ Откат изменения откатывает и запись журнала. """
+        try:
+            with transaction.atomic():
+                Post.objects.create(author=self.author, text='Пост')
+                raise RuntimeError
+        except RuntimeError:
+            pass
+        self.assertFalse(Event.objects.exists())
+
+    def test_consume_advances_offset_once(self):
+        """ Потребитель получает каждое событие один раз. """
+        post = Post.objects.create(author=self.author, text='Пост')
+        Comment.objects.create(post=post, author=self.reader, text='Текст')
+        received = []
+        consumer = events.Consumer('test', models=['comment'], batch_size=1)
+        self.assertEqual(consumer.consume(received.extend), 1)
+        self.assertEqual(consumer.consume(received.extend), 0)
+        self.assertEqual([event.model for event in received], ['comment'])
+        self.assertEqual(consumer.position(), Event.objects.last().pk)
+
+    def test_consume_skips_other_models(self):
+        """ Чужие события сдвигают позицию, но не передаются. """
+        for text in ('Первый', 'Второй'):
+            Post.objects.create(author=self.author, text=text)
+        received = []
+        consumer = events.Consumer('test', models=['comment'], batch_size=1)
+        self.assertEqual(consumer.consume(received.extend), 0)
+        self.assertEqual(received, [])
+        self.assertEqual(consumer.position(), Event.objects.last().pk)
+
+    def test_failed_handler_keeps_offset(self):
+        """ Ошибка обработчика не сдвигает позицию. """
+        Post.objects.create(author=self.author, text='Пост')
+        consumer = events.Consumer('test')
+
+        def fail(batch):
+            raise RuntimeError
+
+        with self.assertRaises(RuntimeError):
+            consumer.consume(fail)
+        self.assertEqual(consumer.position(), 0)
+
+    def test_reset_and_prune(self):
+        """ Сброс перечитывает журнал, prune удаляет прочитанное всеми. """
+        for text in ('Первый', 'Второй'):
+            Post.objects.create(author=self.author, text=text)
+        first, second = events.Consumer('first'), events.Consumer('second')
+        first.consume(lambda batch: None)
+        second.commit(Event.objects.first().pk)
+        call_command('event_consumers', prune=True, stdout=StringIO())
+        self.assertEqual(Event.objects.count(), 1)
+        first.reset()
+        received = []
+        first.consume(received.extend)
+        self.assertEqual([event.data['text'] for event in received],
+                         ['Второй'])
+        self.assertEqual(set(EventOffset.objects.values_list(
+            'consumer', flat=True)), {'first', 'second'})
+
+    def test_bulk_follow_is_logged(self):
+        """ Массовые подписки и отписки тоже попадают в журнал. """
+        follows.follow(self.reader.id, self.author.id)
+        follows.follow(self.reader.id, self.author.id)
+        follow = Follow.objects.get()
+        follows.unfollow(self.reader.id, self.author.id)
+        self.assertEqual(
+            list(Event.objects.values_list('model', 'action', 'object_id')),
+            [('follow', Event.CREATED, follow.pk),
+             ('follow', Event.DELETED, follow.pk)])
@@ -0,0 +1,64 @@
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.test import Client, TestCase
+from django.urls import reverse
+
+from .. import follows
+from ..models import Follow, Post
+
+User = get_user_model()
+
+
+class FollowGraphTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='auth')
+        cls.authors = [User.objects.create_user(username=f'author{i}')
+                       for i in range(3)]
+
+    def setUp(self):
+        cache.clear()
+
+    def test_following_is_answered_from_cache(self):
+        """ Повторные проверки подписки не обращаются к базе. """
+        Follow.objects.create(user=self.user, author=self.authors[1])
+        follows.following_ids(self.user.id)
+        with self.assertNumQueries(0):
+            self.assertTrue(
+                follows.is_following(self.user.id, self.authors[1].id))
+            self.assertFalse(
+                follows.is_following(self.user.id, self.authors[0].id))
+
+    def test_changes_invalidate_cache(self):
+        """ Подписка и отписка сразу видны в кеше. """
+        author = self.authors[0]
+        self.assertFalse(follows.is_following(self.user.id, author.id))
+        Follow.objects.create(user=self.user, author=author)
+        self.assertTrue(follows.is_following(self.user.id, author.id))
+        follows.unfollow(self.user.id, author.id)
+        self.assertFalse(follows.is_following(self.user.id, author.id))
+
+    def test_bulk_change(self):
+        """ Массовые подписки пропускают себя и повторы. """
+        Follow.objects.create(user=self.user, author=self.authors[0])
+        follows.bulk_change(
+            added=[(self.user.id, author.id) for author in self.authors]
+            + [(self.user.id, self.user.id)],
+            removed=[(self.user.id, self.authors[2].id)],
+        )
+        self.assertEqual(list(follows.following_ids(self.user.id)),
+                         [self.authors[0].id, self.authors[1].id])
+        self.assertEqual(Follow.objects.count(), 2)
+
+    def test_feed_reads_follows_from_database(self):
+        """ Лента не зависит от кеша подписок этого процесса. """
+        post = Post.objects.create(author=self.authors[0], text='Пост')
+        follows.following_ids(self.user.id)
+        # Подписка из другого процесса: здешний кеш о ней не знает.
+        Follow.objects.bulk_create([Follow(user=self.user,
+                                           author=self.authors[0])])
+        client = Client()
+        client.force_login(self.user)
+        response = client.get(reverse('posts:follow_index'))
+        self.assertEqual(list(response.context['page_obj']), [post])
@@ -0,0 +1,89 @@
+from django.contrib.auth import get_user_model
+from django.test import TestCase
+from django.urls import reverse
+
+from .. import group_stats
+from ..admin import PostAdmin
+from ..models import Group, GroupStats, Post
+
+User = get_user_model()
+
+
+class GroupStatsTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='auth')
+        cls.other = User.objects.create_user(username='other')
+        cls.groups = [
+            Group.objects.create(title=f'Тестовая группа {i}',
+                                 slug=f'test-slug-{i}',
+                                 description='Тестовое описание группы')
+            for i in range(2)
+        ]
+
+    def stats(self, group):
+        return GroupStats.objects.get(group=group)
+
+    def test_stats_follow_post_changes(self):
+        """ Статистика учитывает создание, перенос и удаление постов. """
+        first, second = self.groups
+        post = Post.objects.create(author=self.user, text='Пост',
+                                   group=first)
+        Post.objects.create(author=self.other, text='Пост', group=first)
+        Post.objects.create(author=self.other, text='Пост', group=first)
+        self.assertEqual(self.stats(first).post_count, 3)
+        self.assertEqual(self.stats(first).top_author_ids,
+                         f'{self.other.id},{self.user.id}')
+
+        post.group = second
+        post.save()
+        self.assertEqual(self.stats(first).post_count, 2)
+        self.assertEqual(self.stats(first).top_author_ids, str(self.other.id))
+        self.assertEqual(self.stats(second).post_count, 1)
+        self.assertEqual(self.stats(second).last_post_at, post.pub_date)
+
+        post.delete()
+        self.assertEqual(self.stats(second).post_count, 0)
+        self.assertIsNone(self.stats(second).last_post_at)
+        self.assertEqual(self.stats(second).top_author_ids, '')
+
+    def test_admin_list_editable_updates_stats(self):
+        """ Смена группы в списке постов админки обновляет статистику. """
+        first, second = self.groups
+        post = Post.objects.create(author=self.user, text='Пост',
+                                   group=first)
+        admin = User.objects.create_superuser('admin', 'admin@ya.ru', 'pwd')
+        self.client.force_login(admin)
+        self.assertIn('group', PostAdmin.list_editable)
+        self.client.post(reverse('admin:posts_post_changelist'), {
+            'form-TOTAL_FORMS': 1,
+            'form-INITIAL_FORMS': 1,
+            'form-0-id': post.id,
+            'form-0-group': second.id,
+            '_save': 'Сохранить',
+        })
+        self.assertEqual(self.stats(first).post_count, 0)
+        self.assertEqual(self.stats(second).post_count, 1)
+
+    def test_rebuild_matches_incremental_stats(self):
+        """ Пересчёт даёт ту же статистику, что и сигналы. """
+        authors = [self.user, self.other, self.other, self.other]
+        for group, author in zip(self.groups * 2, authors):
+            Post.objects.create(author=author, text='Пост', group=group)
+        fields = ('group', 'post_count', 'last_post_at', 'top_author_ids')
+        incremental = list(GroupStats.objects.order_by('group')
+                           .values_list(*fields))
+        group_stats.rebuild()
+        self.assertEqual(list(GroupStats.objects.order_by('group')
+                              .values_list(*fields)), incremental)
+
+    def test_directory_doesnt_aggregate_posts(self):
+        """ Каталог групп читает готовую статистику. """
+        for group in self.groups:
+            Post.objects.create(author=self.user, text='Пост', group=group)
+        with self.assertNumQueries(3):
+            response = self.client.get(reverse('posts:group_index'))
+        self.assertEqual(list(response.context['page_obj']), self.groups)
+        self.assertEqual(response.context['page_obj'][0].top_authors,
+                         [self.user])
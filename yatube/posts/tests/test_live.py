@@ -0,0 +1,212 @@
+import asyncio
+from unittest import mock
+
+from django.contrib.auth import get_user_model
+from django.test import Client, TestCase, override_settings
+from django.urls import reverse
+
+from core.routers import pin_to_primary, unpin
+
+from .. import live
+from ..models import Comment, Group, Post
+
+User = get_user_model()
+
+
+async def query(self, function, *args):
+    # В тестах база видна только из потока теста.
+    return function(*args)
+
+
+class Connection:
+    """Клиент SSE поверх ASGI-приложения без сервера."""
+
+    def __init__(self, path, last_event_id=None):
+        headers = [(b'accept', b'text/event-stream')]
+        if last_event_id is not None:
+            headers.append((b'last-event-id', str(last_event_id).encode()))
+        self.scope = {'type': 'http', 'method': 'GET', 'path': path,
+                      'headers': headers}
+        self.messages = []
+        self.closed = asyncio.Event()
+        self.requested = False
+
+    async def receive(self):
+        if not self.requested:
+            self.requested = True
+            return {'type': 'http.request', 'body': b''}
+        await self.closed.wait()
+        return {'type': 'http.disconnect'}
+
+    async def send(self, message):
+        self.messages.append(message)
+
+    def start(self):
+        self.task = asyncio.ensure_future(
+            live.application(self.scope, self.receive, self.send))
+        return self
+
+    @property
+    def body(self):
+        return b''.join(message.get('body', b'')
+                        for message in self.messages).decode()
+
+    async def wait_for(self, text, timeout=2):
+        for _ in range(int(timeout / 0.01)):
+            if text in self.body:
+                return
+            await asyncio.sleep(0.01)
+        raise AssertionError(f'{text!r} не пришло: {self.body!r}')
+
+    async def close(self):
+        self.closed.set()
+        await self.task
+
+
+@override_settings(LIVE_POLL_INTERVAL=0.01, LIVE_KEEPALIVE=5)
+@mock.patch.object(live.Hub, 'query', query)
+class LiveTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create_user(username='author')
+        cls.group = Group.objects.create(title='Группа', slug='group')
+        cls.post = Post.objects.create(author=cls.author, text='Пост')
+        cls.other = Post.objects.create(author=cls.author, text='Другой')
+
+    def setUp(self):
+        patcher = mock.patch.object(live, 'hub', live.Hub())
+        self.hub = patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def run_async(self, coroutine):
+        async def main():
+            result = await coroutine
+            if self.hub.task is not None:
+                # Без подписчиков поллер останавливается сам.
+                await self.hub.task
+            return result
+
+        loop = asyncio.new_event_loop()
+        try:
+            return loop.run_until_complete(main())
+        finally:
+            loop.close()
+
+    def test_comments_stream_to_post_channel(self):
+        """ Новые комментарии приходят подписчикам своего поста. """
+        async def scenario():
+            connection = Connection(f'/live/post/{self.post.pk}/').start()
+            other = Connection(f'/live/post/{self.other.pk}/').start()
+            await asyncio.sleep(0.05)
+            comment = Comment.objects.create(
+                post=self.post, author=self.author, text='Текст')
+            await connection.wait_for('event: comment')
+            await asyncio.sleep(0.05)
+            await connection.close()
+            await other.close()
+            return connection, other, comment
+
+        connection, other, comment = self.run_async(scenario())
+        self.assertEqual(connection.messages[0]['headers'][0],
+                         (b'content-type', b'text/event-stream'))
+        self.assertIn(f'"comment_id": {comment.pk}', connection.body)
+        self.assertNotIn('event: comment', other.body)
+        self.assertEqual(dict(self.hub.subscribers), {})
+
+    def test_post_channels(self):
+        """ Новый пост приходит в ленту, группу и профиль автора. """
+        async def scenario():
+            connections = [
+                Connection(path).start() for path in (
+                    '/live/feed/',
+                    f'/live/group/{self.group.pk}/',
+                    f'/live/author/{self.author.pk}/',
+                )
+            ]
+            await asyncio.sleep(0.05)
+            post = Post.objects.create(author=self.author, group=self.group,
+                                       text='Новый')
+            for connection in connections:
+                await connection.wait_for(f'"post_id": {post.pk}')
+                await connection.close()
+
+        self.run_async(scenario())
+
+    def test_reconnect_replays_missed_events(self):
+        """ По Last-Event-ID переподключение получает пропущенное. """
+        first = Comment.objects.create(post=self.post, author=self.author,
+                                       text='Первый')
+        second = Comment.objects.create(post=self.post, author=self.author,
+                                        text='Второй')
+        last_seen = live.changes_after(0, f'post/{self.post.pk}')[0][0]
+
+        async def scenario():
+            connection = Connection(f'/live/post/{self.post.pk}/',
+                                    last_event_id=last_seen).start()
+            await connection.wait_for(f'"comment_id": {second.pk}')
+            await connection.close()
+            return connection
+
+        body = self.run_async(scenario()).body
+        self.assertNotIn(f'"comment_id": {first.pk}', body)
+
+    @override_settings(LIVE_BACKLOG_SIZE=1)
+    def test_reconnect_after_long_gap_gets_reset(self):
+        """ Если пропущено больше LIVE_BACKLOG_SIZE, приходит reset. """
+        for text in ('Первый', 'Второй'):
+            Comment.objects.create(post=self.post, author=self.author,
+                                   text=text)
+
+        async def scenario():
+            connection = Connection(f'/live/post/{self.post.pk}/',
+                                    last_event_id=0).start()
+            await connection.wait_for('event: reset')
+            await connection.close()
+            return connection
+
+        body = self.run_async(scenario()).body
+        self.assertNotIn('event: comment', body)
+
+    @override_settings(REPLICA_DATABASES=['lagging'],
+                       REPLICA_READ_MODELS=('posts.change',))
+    def test_changes_are_read_from_primary(self):
+        """ Журнал читается из основной базы даже в запросе. """
+        Comment.objects.create(post=self.post, author=self.author,
+                               text='Текст')
+        unpin()
+        try:
+            self.assertEqual(
+                len(live.changes_after(0, f'post/{self.post.pk}')), 1)
+            self.assertGreater(live.last_change_id(), 0)
+        finally:
+            pin_to_primary()
+
+    @override_settings(LIVE_KEEPALIVE=0.05)
+    def test_idle_connection_gets_keepalive(self):
+        """ Простаивающее соединение получает комментарии-пинги. """
+        async def scenario():
+            connection = Connection('/live/feed/').start()
+            await connection.wait_for(': keepalive')
+            await connection.close()
+
+        self.run_async(scenario())
+
+    def test_unknown_channel(self):
+        """ Неизвестный канал — 404. """
+        async def scenario():
+            connection = Connection('/live/unknown/').start()
+            await connection.task
+            return connection
+
+        connection = self.run_async(scenario())
+        self.assertEqual(connection.messages[0]['status'], 404)
+
+    def test_pages_subscribe_to_channels(self):
+        """ Страницы поста и ленты подключаются к своим каналам. """
+        response = Client().get(
+            reverse('posts:post_detail', args=[self.post.pk]))
+        self.assertContains(response,
+                            f'data-live="/live/post/{self.post.pk}/"')
+        response = Client().get(reverse('posts:index'))
+        self.assertContains(response, 'data-live="/live/feed/"')
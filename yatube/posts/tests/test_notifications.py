@@ -0,0 +1,183 @@
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.core.management import call_command
+from django.test import Client, TestCase, override_settings
+from django.urls import reverse
+
+from core.middleware import PIN_COOKIE
+from jobs.models import Job
+
+from .. import notifications
+from ..models import Comment, Follow, Notification, Post
+
+User = get_user_model()
+
+
+class NotificationTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create_user(username='author')
+        cls.followers = [User.objects.create_user(username=f'follower{i}')
+                         for i in range(5)]
+        cls.stranger = User.objects.create_user(username='stranger')
+        Follow.objects.bulk_create(
+            Follow(user=follower, author=cls.author)
+            for follower in cls.followers)
+
+    def setUp(self):
+        cache.clear()
+        self.client = Client()
+        self.client.force_login(self.followers[0])
+
+    def publish(self, text='Пост'):
+        post = Post.objects.create(author=self.author, text=text)
+        notifications.fan_out(post.pk, chunk_size=2)
+        return post
+
+    def test_new_post_queues_fan_out(self):
+        """ Новый пост раздаётся подписчикам фоновой задачей. """
+        author_client = Client()
+        author_client.force_login(self.author)
+        author_client.post(reverse('posts:post_create'), {'text': 'Новый'})
+        self.assertEqual(Notification.objects.count(), 0)
+        self.assertEqual(Job.objects.get().name, 'posts.notify_followers')
+        call_command('run_workers', burst=True)
+        self.assertEqual(
+            set(Notification.objects.values_list('user_id', flat=True)),
+            {follower.id for follower in self.followers})
+
+    def test_posts_are_coalesced_until_read(self):
+        """ Непрочитанная сводка копит посты автора в одной строке. """
+        self.publish()
+        latest = self.publish()
+        notification = Notification.objects.get(user=self.followers[0])
+        self.assertEqual((notification.count, notification.post_id),
+                         (2, latest.pk))
+        notifications.mark_read(self.followers[0].id, [notification.pk])
+        self.publish()
+        self.assertEqual(
+            Notification.objects.filter(user=self.followers[0]).count(), 2)
+
+    def test_fan_out_is_idempotent(self):
+        """ Повтор раздачи не учитывает пост дважды. """
+        post = self.publish()
+        notifications.fan_out(post.pk)
+        self.assertEqual(
+            list(Notification.objects.values_list('count', flat=True)),
+            [1] * len(self.followers))
+
+    def test_unread_count_is_kept_in_cache(self):
+        """ Раздача и прочтение меняют счётчик в кеше без COUNT. """
+        user_id = self.followers[0].id
+        self.assertEqual(notifications.unread_count(user_id), 0)
+        self.publish()
+        with self.assertNumQueries(0):
+            self.assertEqual(notifications.unread_count(user_id), 1)
+        notifications.mark_read(user_id, list(
+            Notification.objects.filter(user_id=user_id)
+            .values_list('pk', flat=True)))
+        with self.assertNumQueries(0):
+            self.assertEqual(notifications.unread_count(user_id), 0)
+
+    def test_comment_notifies_participants(self):
+        """ Комментарий уведомляет автора поста и прежних комментаторов. """
+        post = Post.objects.create(author=self.author, text='Пост')
+        first, second, third = self.followers[:3]
+        comments = [
+            Comment.objects.create(post=post, author=user, text='Текст')
+            for user in (first, second, first, third)
+        ]
+        for comment in comments:
+            notifications.fan_out_comment(comment.pk)
+            notifications.fan_out_comment(comment.pk)
+        digests = {
+            notification.user_id: (notification.count,
+                                   notification.comment_id)
+            for notification in Notification.objects.filter(
+                kind=Notification.COMMENT)
+        }
+        self.assertEqual(digests, {
+            self.author.id: (4, comments[3].pk),
+            first.id: (2, comments[3].pk),
+            second.id: (2, comments[3].pk),
+        })
+
+    def test_mark_all_read(self):
+        """ Все уведомления читаются одним UPDATE. """
+        self.publish()
+        Comment.objects.create(
+            post=Post.objects.create(author=self.followers[0], text='Свой'),
+            author=self.author, text='Комментарий')
+        notifications.fan_out_comment(Comment.objects.get().pk)
+        user_id = self.followers[0].id
+        self.assertEqual(notifications.unread_count(user_id), 2)
+        with self.assertNumQueries(1):
+            notifications.mark_all_read(user_id)
+        self.assertEqual(notifications.unread_count(user_id), 0)
+        self.assertFalse(Notification.objects.filter(
+            user_id=user_id, is_read=False).exists())
+
+    def test_read_all_view(self):
+        """ Кнопка «прочитать все» отмечает все уведомления. """
+        self.publish()
+        response = self.client.post(
+            reverse('posts:notification_read_all'))
+        self.assertRedirects(response,
+                             reverse('posts:notification_index'))
+        self.assertFalse(Notification.objects.filter(
+            user=self.followers[0], is_read=False).exists())
+
+    def test_inbox_shows_digests_without_reading_them(self):
+        """ Просмотр инбокса не отмечает уведомления прочитанными. """
+        post = self.publish('Текст уведомления')
+        response = self.client.get(reverse('posts:notification_index'))
+        self.assertContains(response, 'Текст уведомления')
+        self.assertContains(
+            response, reverse('posts:post_detail', args=[post.pk]))
+        self.assertTrue(Notification.objects.filter(
+            user=self.followers[0], is_read=False).exists())
+        response = self.client.get(reverse('posts:index'))
+        self.assertContains(response, 'badge')
+
+    def test_read_view(self):
+        """ Уведомление читается только POST-запросом. """
+        self.publish()
+        notification = Notification.objects.get(user=self.followers[0])
+        url = reverse('posts:notification_read', args=[notification.pk])
+        self.client.get(url)
+        notification.refresh_from_db()
+        self.assertFalse(notification.is_read)
+        response = self.client.post(url)
+        self.assertRedirects(response,
+                             reverse('posts:notification_index'))
+        notification.refresh_from_db()
+        self.assertTrue(notification.is_read)
+        response = self.client.get(reverse('posts:index'))
+        self.assertNotContains(response, 'badge')
+
+    def test_read_views_pin_to_primary(self):
+        """ После прочтения страницы читаются из основной базы, а не с
+        отстающей реплики.
+        """
+        self.publish()
+        notification = Notification.objects.get(user=self.followers[0])
+        urls = (
+            reverse('posts:notification_read', args=[notification.pk]),
+            reverse('posts:notification_read_all'),
+        )
+        # Алиаса 'lagging' нет в DATABASES: чтение с реплики упадёт.
+        with override_settings(REPLICA_DATABASES=['lagging']):
+            for url in urls:
+                with self.subTest(url=url):
+                    client = Client()
+                    client.force_login(self.followers[0])
+                    response = client.post(url)
+                    self.assertIn(PIN_COOKIE, response.cookies)
+                    response = client.get(reverse('posts:index'))
+                    self.assertNotContains(response, 'badge')
+
+    def test_inbox_requires_login(self):
+        """ Инбокс доступен только вошедшим. """
+        response = Client().get(reverse('posts:notification_index'))
+        self.assertEqual(response.status_code, 302)
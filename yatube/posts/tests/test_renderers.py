@@ -0,0 +1,82 @@
+import shutil
+import tempfile
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.template.loader import render_to_string
+from django.test import TestCase, override_settings
+
+from ..models import Group, Post
+from ..renderers import render_post_card
+
+User = get_user_model()
+TEMP_MEDIA_ROOT = tempfile.mkdtemp(dir=settings.BASE_DIR)
+
+
+@override_settings(MEDIA_ROOT=TEMP_MEDIA_ROOT)
+class PostCardRendererTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        small_gif = (
+            b'\x47\x49\x46\x38\x39\x61\x02\x00'
+            b'\x01\x00\x80\x00\x00\x00\x00\x00'
+            b'\xFF\xFF\xFF\x21\xF9\x04\x00\x00'
+            b'\x00\x00\x00\x2C\x00\x00\x00\x00'
+            b'\x02\x00\x01\x00\x00\x02\x02\x0C'
+            b'\x0A\x00\x3B'
+        )
+        cls.user = User.objects.create_user(
+            username='auth', first_name='<Имя>', last_name='"Фамилия"')
+        cls.group = Group.objects.create(
+            title='Группа & <компания>',
+            slug='test-slug',
+            description='Тестовое описание группы',
+        )
+        cls.posts = [
+            Post.objects.create(
+                author=cls.user,
+                text='Пост без группы',
+            ),
+            Post.objects.create(
+                author=cls.user,
+                text='<b>Строка</b>\nвторая строка\n\nтретья',
+                group=cls.group,
+            ),
+            Post.objects.create(
+                author=cls.user,
+                text='Пост с картинкой',
+                group=cls.group,
+                image=SimpleUploadedFile(
+                    name='small.gif',
+                    content=small_gif,
+                    content_type='image/gif'
+                ),
+            ),
+        ]
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        shutil.rmtree(TEMP_MEDIA_ROOT, ignore_errors=True)
+
+    def test_renderer_matches_template(self):
+        """ Быстрый рендер карточки совпадает с includes/post.html. """
+        for post in self.posts:
+            for group in (None, self.group):
+                with self.subTest(post=post.text, group=group):
+                    self.assertEqual(
+                        render_post_card(post, group),
+                        render_to_string('includes/post.html',
+                                         {'post': post, 'group': group}),
+                    )
+
+    def test_pages_are_identical_with_both_renderers(self):
+        """ Лента выглядит одинаково с любым POST_CARD_RENDERER. """
+        pages = {}
+        for renderer in ('django', 'python'):
+            with override_settings(POST_CARD_RENDERER=renderer):
+                pages[renderer] = self.client.get(
+                    f'/group/{self.group.slug}/').content
+        self.assertEqual(pages['django'], pages['python'])
@@ -0,0 +1,80 @@
+import time
+from datetime import timedelta
+from io import StringIO
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.core.management import call_command
+from django.test import TestCase
+from django.urls import reverse
+from django.utils import timezone
+
+from .. import trending
+from ..models import Comment, Post, PostScore
+
+User = get_user_model()
+
+
+class TrendingTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='auth')
+        cls.posts = [Post.objects.create(author=cls.user,
+                                         text=f'Тестовый пост {i}')
+                     for i in range(3)]
+
+    def setUp(self):
+        cache.clear()
+
+    def comment(self, post, count=1):
+        for _ in range(count):
+            Comment.objects.create(post=post, author=self.user,
+                                   text='Комментарий')
+
+    def test_comments_update_score_incrementally(self):
+        """ Счёт равен сумме затухающих весов комментариев. """
+        now = time.time()
+        trending.record(self.posts[0].id, now)
+        trending.record(self.posts[0].id, now - settings.TRENDING_HALF_LIFE)
+        score = PostScore.objects.get(post=self.posts[0])
+        self.assertAlmostEqual(trending.current_score(score.log_score, now),
+                               1.5)
+
+    def test_fixtures_are_not_scored(self):
+        """ Загрузка фикстур (raw) не меняет рейтинг. """
+        Comment(post=self.posts[0], author=self.user, text='Фикстура',
+                created=timezone.now()).save_base(raw=True)
+        self.assertFalse(PostScore.objects.exists())
+
+    def test_trending_page_orders_by_score(self):
+        """ Страница обсуждаемого упорядочена по счёту. """
+        self.comment(self.posts[1], 3)
+        self.comment(self.posts[2], 1)
+        response = self.client.get(reverse('posts:trending'))
+        self.assertEqual(list(response.context['page_obj']),
+                         [self.posts[1], self.posts[2]])
+
+    def test_rebuild_matches_incremental_scores(self):
+        """ Пересчёт даёт те же счета, что и сигналы. """
+        self.comment(self.posts[0], 2)
+        self.comment(self.posts[1], 1)
+        incremental = dict(PostScore.objects.values_list('post',
+                                                         'log_score'))
+        call_command('compact_trending', rebuild=True, stdout=StringIO())
+        for post, log_score in PostScore.objects.values_list('post',
+                                                             'log_score'):
+            with self.subTest(post=post):
+                self.assertAlmostEqual(log_score, incremental[post])
+
+    def test_compaction_removes_cold_posts(self):
+        """ Компактизация удаляет посты с маленьким счётом. """
+        now = time.time()
+        month_ago = now - timedelta(days=30).total_seconds()
+        trending.record(self.posts[0].id, month_ago)
+        trending.record(self.posts[1].id, now)
+        call_command('compact_trending', stdout=StringIO())
+        self.assertEqual(
+            list(PostScore.objects.values_list('post', flat=True)),
+            [self.posts[1].id])
@@ -12,7 +12,7 @@ from django.test import Client, TestCase, override_settings
 from django.urls import reverse
 
 from ..forms import PostForm
-from ..models import Comment, Follow, Group, Post
+from ..models import Comment, Follow, Group, Post, Recommendation
 
 User = get_user_model()
 TEMP_MEDIA_ROOT = tempfile.mkdtemp(dir=settings.BASE_DIR)
@@ -78,6 +78,7 @@ class PostViewTest(TestCase):
         self.guest_client = Client()
         self.authorized_client = Client()
         self.authorized_client.force_login(self.user)
+        cache.clear()
 
     def test_pages_uses_correct_template(self):
         """URL-адрес использует соответствующий шаблон."""
@@ -241,6 +242,21 @@ class PostViewTest(TestCase):
         )
         self.assertEqual(Follow.objects.count(), 0)
 
+    def test_profile_shows_recommendations(self):
+        """ В профиле показываются рекомендации без тех авторов,
+        на которых пользователь уже подписан.
+        """
+        author = User.objects.create_user(username='recommended')
+        Recommendation.objects.bulk_create([
+            Recommendation(user=self.user, author=author, score=2),
+            Recommendation(user=self.user, author=self.user2, score=1),
+        ])
+        Follow.objects.create(user=self.user, author=self.user2)
+        response = self.authorized_client.get(
+            reverse(self.urls['profile'].name,
+                    kwargs=self.urls['profile'].kwargs))
+        self.assertEqual(response.context['recommended'], [author])
+
     def test_new_user_entry_appears_in_the_feed(self):
         """ Новая запись пользователя появляется в ленте тех,
         кто на него подписан.
@@ -349,3 +365,52 @@ class CommentViewsTest(TestCase):
             data=form_data, follow=True
         )
         self.assertEqual(Comment.objects.count(), post_count)
+
+
+class QueryCountViewsTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='auth')
+        cls.reader = User.objects.create_user(username='reader')
+        Follow.objects.create(user=cls.reader, author=cls.user)
+        cls.group = Group.objects.create(
+            title='Тестовая группа',
+            slug='test-slug',
+            description='Тестовое описание группы',
+        )
+        for i in range(1, settings.PAGINATION + 4):
+            Post.objects.create(
+                author=cls.user,
+                text=f'Тестовый пост {i}',
+                group=cls.group
+            )
+
+    def setUp(self):
+        self.guest_client = Client()
+        self.reader_client = Client()
+        self.reader_client.force_login(self.reader)
+
+    def test_read_views_dont_query_per_post(self):
+        """ Страницы чтения выполняют фиксированное число запросов,
+        не зависящее от количества постов на странице.
+        """
+        pages = {
+            reverse('posts:index'): (self.guest_client, 2),
+            reverse('posts:group_list', kwargs={'slug': 'test-slug'}): (
+                self.guest_client, 3),
+            reverse('posts:profile', kwargs={'username': 'auth'}): (
+                self.guest_client, 3),
+            reverse('posts:post_detail',
+                    kwargs={'post_id': Post.objects.first().id}): (
+                self.guest_client, 3),
+            reverse('posts:follow_index'): (self.reader_client, 5),
+        }
+        for page_size in (2, settings.PAGINATION):
+            for page, (client, num_queries) in pages.items():
+                with self.subTest(page=page, page_size=page_size):
+                    cache.clear()
+                    with override_settings(PAGINATION=page_size), \
+                            self.assertNumQueries(num_queries):
+                        response = client.get(page)
+                    self.assertEqual(response.status_code, 200)
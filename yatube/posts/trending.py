@@ -0,0 +1,112 @@
+"""Рейтинг обсуждаемых постов с экспоненциальным затуханием.
+
+Используется прямое затухание (forward decay): событие с весом w
+в момент t добавляет к счёту поста w * exp(λ(t - L)), где L —
+TRENDING_LANDMARK, а λ = ln 2 / TRENDING_HALF_LIFE. Текущий счёт равен
+накопленному, умноженному на exp(-λ(now - L)), — общему множителю всех
+постов, поэтому порядок постов задаёт сам накопленный счёт и старые
+записи не нужно пересчитывать со временем. Чтобы экспонента не
+переполнялась, в PostScore хранится его логарифм, а события
+складываются как logaddexp прямо в UPDATE.
+
+Комментарии записываются сигналом (posts.signals). Удалённые
+комментарии не вычитаются: их учтёт `manage.py compact_trending
+--rebuild`. Та же команда удаляет остывшие посты. Топ каждый процесс
+кеширует у себя и перечитывает раз в TRENDING_CACHE_TIMEOUT секунд.
+"""
+import math
+from itertools import groupby
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import IntegrityError, transaction
+from django.db.models import F, FloatField, Value
+from django.db.models.functions import Abs, Exp, Greatest, Ln
+
+from .models import Comment, PostScore
+
+TOP_CACHE_KEY = 'trending:top'
+
+
+def decay_rate():
+    return math.log(2) / settings.TRENDING_HALF_LIFE
+
+
+def log_weight(timestamp, weight=1.0):
+    """log(w * exp(λ(t - L))) для события в момент timestamp."""
+    return (math.log(weight)
+            + decay_rate() * (timestamp - settings.TRENDING_LANDMARK))
+
+
+def current_score(log_score, now):
+    """Счёт поста на момент now с учётом затухания."""
+    return math.exp(
+        log_score - decay_rate() * (now - settings.TRENDING_LANDMARK))
+
+
+def record(post_id, timestamp, kind='comment'):
+    """Добавляет событие kind к счёту поста."""
+    value = log_weight(timestamp, settings.TRENDING_WEIGHTS[kind])
+    event = Value(value, output_field=FloatField())
+    updated = PostScore.objects.filter(post_id=post_id).update(
+        log_score=Greatest(F('log_score'), event)
+        + Ln(1 + Exp(-Abs(F('log_score') - event))))
+    if updated:
+        return
+    try:
+        with transaction.atomic():
+            PostScore.objects.create(post_id=post_id, log_score=value)
+    except IntegrityError:
+        record(post_id, timestamp, kind)
+
+
+def top_ids():
+    """id постов топа, от самого обсуждаемого."""
+    ids = cache.get(TOP_CACHE_KEY)
+    if ids is None:
+        ids = refresh_top()
+    return ids
+
+
+def refresh_top():
+    ids = list(PostScore.objects.order_by('-log_score')
+               .values_list('post_id', flat=True)
+               [:settings.TRENDING_TOP_SIZE])
+    cache.set(TOP_CACHE_KEY, ids, settings.TRENDING_CACHE_TIMEOUT)
+    return ids
+
+
+def threshold(now):
+    """log_score, ниже которого текущий счёт меньше TRENDING_MIN_SCORE."""
+    return (math.log(settings.TRENDING_MIN_SCORE)
+            + decay_rate() * (now - settings.TRENDING_LANDMARK))
+
+
+def compact(now):
+    """Удаляет остывшие посты."""
+    deleted, _ = PostScore.objects.filter(
+        log_score__lt=threshold(now)).delete()
+    return deleted
+
+
+def rebuild(now, chunk_size=10000):
+    """Пересчитывает все счета по комментариям."""
+    minimum = threshold(now)
+    comments = (Comment.objects.filter(post__isnull=False)
+                .order_by('post_id')
+                .values_list('post_id', 'created')
+                .iterator(chunk_size=chunk_size))
+    scores = []
+    for post_id, rows in groupby(comments, key=lambda row: row[0]):
+        values = [log_weight(created.timestamp(),
+                             settings.TRENDING_WEIGHTS['comment'])
+                  for _, created in rows]
+        top = max(values)
+        log_score = top + math.log(
+            sum(math.exp(value - top) for value in values))
+        if log_score >= minimum:
+            scores.append(PostScore(post_id=post_id, log_score=log_score))
+    with transaction.atomic():
+        PostScore.objects.all().delete()
+        PostScore.objects.bulk_create(scores)
+    return len(scores)
@@ -6,6 +6,7 @@ app_name = 'posts'
 
 urlpatterns = [
     path('', views.index, name='index'),
+    path('groups/', views.group_index, name='group_index'),
     path('group/<slug:slug>/', views.group_posts, name='group_list'),
     path('profile/<str:username>/', views.profile, name='profile'),
     path('posts/<int:post_id>/', views.post_detail, name='post_detail'),
@@ -14,6 +15,13 @@ urlpatterns = [
     path('posts/<int:post_id>/comment/', views.add_comment,
          name='add_comment'),
     path('follow/', views.follow_index, name='follow_index'),
+    path('trending/', views.trending_index, name='trending'),
+    path('notifications/', views.notification_index,
+         name='notification_index'),
+    path('notifications/read/', views.notification_read_all,
+         name='notification_read_all'),
+    path('notifications/<int:notification_id>/read/',
+         views.notification_read, name='notification_read'),
     path(
         'profile/<str:username>/follow/',
         views.profile_follow,
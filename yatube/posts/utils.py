@@ -1,9 +1,35 @@
+from functools import partial
+
 from django.core.paginator import Paginator
 from django.conf import settings
 
+from core.asgi import gather
+
 
 def paginat(request, posts):
     paginator = Paginator(posts, settings.PAGINATION)
     page_number = request.GET.get('page')
     page_obj = paginator.get_page(page_number)
     return page_obj
+
+
+async def paginat_async(request, posts):
+    """Как paginat, но COUNT и запрос страницы идут одновременно.
+
+    Номер страницы сверяется с числом страниц уже после запросов; за
+    последней страницей запрос повторяется, как get_page.
+    """
+    paginator = Paginator(posts, settings.PAGINATION)
+    try:
+        number = max(int(request.GET.get('page', 1)), 1)
+    except ValueError:
+        number = 1
+    bottom = (number - 1) * paginator.per_page
+    paginator.count, objects = await gather(
+        posts.count, partial(list, posts[bottom:bottom + paginator.per_page]))
+    if number > paginator.num_pages:
+        number = paginator.num_pages
+        bottom = (number - 1) * paginator.per_page
+        objects, = await gather(
+            partial(list, posts[bottom:bottom + paginator.per_page]))
+    return paginator._get_page(objects, number, paginator)
@@ -1,55 +1,116 @@
+from functools import partial
+
+from django.conf import settings
 from django.contrib.auth.decorators import login_required
 from django.shortcuts import get_object_or_404, redirect, render
 
+from core.asgi import async_view, gather, run
+from core.db import serialized_write
+
+from . import follows, group_stats, notifications, trending
 from .forms import CommentForm, PostForm
-from .models import Follow, Group, Post, User
-from .utils import paginat
+from .models import (Comment, Group, Notification, Post, Recommendation,
+                     User)
+from .utils import paginat, paginat_async
 
 
-def index(request):
+@async_view
+async def index(request):
     posts = Post.objects.select_related('group', 'author')
-    page_obj = paginat(request, posts)
+    page_obj = await paginat_async(request, posts)
     context = {
         'page_obj': page_obj,
     }
-    return render(request, 'posts/index.html', context)
+    return await run(render, request, 'posts/index.html', context)
 
 
-def group_posts(request, slug):
-    group = get_object_or_404(Group, slug=slug)
-    posts = group.posts.select_related('author')
-    page_obj = paginat(request, posts)
+def group_index(request):
+    groups = Group.objects.select_related('stats').order_by(
+        '-stats__post_count', 'title')
+    page_obj = paginat(request, groups)
+    group_stats.attach_top_authors(page_obj)
     context = {
-        'group': group,
         'page_obj': page_obj,
     }
-    return render(request, 'posts/group_list.html', context)
+    return render(request, 'posts/group_index.html', context)
 
 
-def profile(request, username):
-    author = get_object_or_404(User, username=username)
-    posts = author.posts.select_related('group')
-    page_obj = paginat(request, posts)
-    following = request.user.is_authenticated and Follow.objects.filter(
-        user=request.user, author=author).exists()
+@async_view
+async def group_posts(request, slug):
+    posts = Post.objects.filter(group__slug=slug).select_related(
+        'author', 'group')
+    group, page_obj = await gather(
+        partial(get_object_or_404, Group, slug=slug),
+        paginat_async(request, posts),
+    )
+    context = {
+        'group': group,
+        'page_obj': page_obj,
+    }
+    return await run(render, request, 'posts/group_list.html', context)
+
+
+@async_view
+async def profile(request, username):
+    posts = Post.objects.filter(author__username=username).select_related(
+        'author', 'group')
+    author, page_obj, following_ids, recommendations = await gather(
+        partial(get_object_or_404, User, username=username),
+        paginat_async(request, posts),
+        partial(user_following_ids, request.user),
+        partial(user_recommendations, request.user),
+    )
     context = {
         'author': author,
         'page_obj': page_obj,
-        'following': following,
+        'following': author.id in following_ids,
+        'recommended': recommended_authors(request.user, author,
+                                           recommendations),
     }
-    return render(request, 'posts/profile.html', context)
+    return await run(render, request, 'posts/profile.html', context)
 
 
-def post_detail(request, post_id):
-    post = get_object_or_404(Post, id=post_id)
-    form = CommentForm()
-    comments = post.comments.select_related('author')
+def user_following_ids(user):
+    if not user.is_authenticated:
+        return ()
+    return follows.following_ids(user.id)
+
+
+def user_recommendations(user):
+    if not user.is_authenticated:
+        return []
+    return list(Recommendation.objects.filter(user=user)
+                .select_related('author').order_by('-score')
+                [:settings.RECOMMENDATIONS_SHOWN * 2])
+
+
+def recommended_authors(user, author, recommendations):
+    """Рекомендации для боковой колонки профиля.
+
+    Рекомендации считаются офлайн, поэтому те, на кого пользователь
+    успел подписаться, отсеиваются по кешу подписок.
+    """
+    return [
+        recommendation.author for recommendation in recommendations
+        if recommendation.author_id != author.id
+        and not follows.is_following(user.id, recommendation.author_id)
+    ][:settings.RECOMMENDATIONS_SHOWN]
+
+
+@async_view
+async def post_detail(request, post_id):
+    post, comments = await gather(
+        partial(get_object_or_404,
+                Post.objects.select_related('author', 'group'), id=post_id),
+        partial(list, Comment.objects.filter(post_id=post_id)
+                .select_related('author')),
+    )
     context = {
         'post': post,
-        'form': form,
+        'form': CommentForm(),
         'comments': comments,
     }
-    return render(request, 'posts/post_detail.html', context)
+    return await run(render, request, 'posts/post_detail.html', context)
 
 
 @login_required
@@ -59,7 +120,8 @@ def post_create(request):
         return render(request, 'posts/create_post.html', {'form': form})
     post = form.save(commit=False)
     post.author = request.user
-    post.save()
+    with serialized_write():
+        post.save()
     return redirect('posts:profile', username=post.author)
 
 
@@ -74,7 +136,8 @@ def post_edit(request, post_id):
     if not form.is_valid():
         context = {'form': form, 'is_edit': True, 'post_id': post_id}
         return render(request, 'posts/create_post.html', context)
-    form.save()
+    with serialized_write():
+        form.save()
     return redirect('posts:post_detail', post_id)
 
 
@@ -86,33 +149,76 @@ def add_comment(request, post_id):
         comment = form.save(commit=False)
         comment.author = request.user
         comment.post = post
-        comment.save()
+        with serialized_write():
+            comment.save()
     return redirect('posts:post_detail', post_id=post_id)
 
 
 @login_required
-def follow_index(request):
-    posts = Post.objects.filter(author__following__user=request.user)
-    page_obj = paginat(request, posts)
+@async_view
+async def follow_index(request):
+    posts = Post.objects.select_related('group', 'author').filter(
+        author__following__user=request.user)
+    page_obj = await paginat_async(request, posts)
     context = {
         'page_obj': page_obj,
     }
-    return render(request, 'posts/follow.html', context)
+    return await run(render, request, 'posts/follow.html', context)
+
+
+def trending_index(request):
+    page_obj = paginat(request, trending.top_ids())
+    posts = Post.objects.select_related('group', 'author').in_bulk(
+        page_obj.object_list)
+    page_obj.object_list = [posts[post_id] for post_id in page_obj
+                            if post_id in posts]
+    context = {
+        'page_obj': page_obj,
+        'trending': True,
+    }
+    return render(request, 'posts/trending.html', context)
+
+
+@login_required
+def notification_index(request):
+    page_obj = paginat(request, Notification.objects.filter(
+        user=request.user).select_related('author', 'post')
+        .order_by('-updated', '-id'))
+    # Просмотр ничего не меняет: прочитанными уведомления отмечают
+    # POST-запросы notification_read и notification_read_all.
+    context = {
+        'page_obj': page_obj,
+    }
+    return render(request, 'posts/notifications.html', context)
+
+
+@login_required
+def notification_read(request, notification_id):
+    if request.method == 'POST':
+        with serialized_write():
+            notifications.mark_read(request.user.id, [notification_id])
+    return redirect('posts:notification_index')
+
+
+@login_required
+def notification_read_all(request):
+    if request.method == 'POST':
+        with serialized_write():
+            notifications.mark_all_read(request.user.id)
+    return redirect('posts:notification_index')
 
 
 @login_required
 def profile_follow(request, username):
     author = get_object_or_404(User, username=username)
-    if request.user != author:
-        Follow.objects.get_or_create(
-            user=request.user,
-            author=author
-        )
+    with serialized_write():
+        follows.follow(request.user.id, author.id)
     return redirect('posts:profile', username=username)
 
 
 @login_required
 def profile_unfollow(request, username):
     author = get_object_or_404(User, username=username)
-    Follow.objects.filter(user=request.user, author=author).delete()
+    with serialized_write():
+        follows.unfollow(request.user.id, author.id)
     return redirect('posts:profile', username=username)
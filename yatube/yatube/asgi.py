@@ -0,0 +1,31 @@
+"""
+ASGI config for yatube project.
+
+Serves the Server-Sent Events under LIVE_URL (see posts.live) and the
+rest of the site through core.asgi.ASGIHandler, which runs the WSGI
+application in a thread pool and the async read views on the event
+loop. Run it with any ASGI server, e.g. ``uvicorn yatube.asgi:application``.
+"""
+
+import os
+
+import django
+
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'yatube.settings')
+django.setup()
+
+from django.conf import settings  # noqa: E402
+
+from core.asgi import ASGIHandler  # noqa: E402
+from posts import live  # noqa: E402
+from yatube.wsgi import application as wsgi_application  # noqa: E402
+
+site = ASGIHandler(wsgi_application)
+
+
+async def application(scope, receive, send):
+    if (scope['type'] == 'lifespan'
+            or scope['path'].startswith(settings.LIVE_URL)):
+        await live.application(scope, receive, send)
+    else:
+        await site(scope, receive, send)
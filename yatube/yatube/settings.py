@@ -11,6 +11,7 @@ https://docs.djangoproject.com/en/2.2/ref/settings/
 """
 
 import os
+import sys
 
 # Build paths inside the project like this: os.path.join(BASE_DIR, ...)
 BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
@@ -22,6 +23,12 @@ BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
 # SECURITY WARNING: keep the secret key used in production secret!
 SECRET_KEY = '+u&n@k$bxl550(=**d(sqmiu$s@4muy82m)&5n*_1_&1=()&q6'
 
+# 'production' switches on the tuned database profile below.
+YATUBE_PROFILE = os.getenv('YATUBE_PROFILE', 'development')
+
+# `manage.py test` or pytest: nothing is written to the project directories.
+TESTING = sys.argv[1:2] == ['test'] or 'pytest' in sys.modules
+
 # SECURITY WARNING: don't run with debug turned on in production!
 DEBUG = True
 
@@ -46,10 +53,15 @@ INSTALLED_APPS = [
     'users.apps.UsersConfig',
     'core.apps.CoreConfig',
     'about.apps.AboutConfig',
+    'jobs.apps.JobsConfig',
     'sorl.thumbnail',
 ]
 
 MIDDLEWARE = [
+    'core.tracing.TracingMiddleware',
+    'core.metrics.MetricsMiddleware',
+    'core.profiling.SamplingProfilerMiddleware',
+    'core.compression.CompressionMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -57,13 +69,17 @@ MIDDLEWARE = [
     'django.contrib.auth.middleware.AuthenticationMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
+    'core.ratelimit.RateLimitMiddleware',
+    'core.middleware.ReplicaPinMiddleware',
+    'core.tracing.TracingViewMiddleware',
 ]
 
 ROOT_URLCONF = 'yatube.urls'
 
 TEMPLATES = [
     {
-        'BACKEND': 'django.template.backends.django.DjangoTemplates',
+        'BACKEND': 'core.backends.templates.InstrumentedDjangoTemplates',
+        'NAME': 'django',
         'DIRS': [os.path.join(BASE_DIR, 'templates')],
         'APP_DIRS': True,
         'OPTIONS': {
@@ -73,6 +89,8 @@ TEMPLATES = [
                 'django.contrib.auth.context_processors.auth',
                 'django.contrib.messages.context_processors.messages',
                 'core.context_processors.year.year',
+                'core.context_processors.notifications.unread_notifications',
+                'core.context_processors.live.live_url',
             ],
         },
     },
@@ -86,11 +104,69 @@ WSGI_APPLICATION = 'yatube.wsgi.application'
 
 DATABASES = {
     'default': {
-        'ENGINE': 'django.db.backends.sqlite3',
+        'ENGINE': 'core.backends.sqlite3',
         'NAME': os.path.join(BASE_DIR, 'db.sqlite3'),
+        'OPTIONS': {
+            # Seconds a connection waits for a lock before raising
+            # `database is locked`.
+            'timeout': 20,
+        },
     }
 }
 
+# Applied to every new SQLite connection, see core.db.configure_sqlite.
+SQLITE_PRAGMAS = {}
+
+SQLITE_PRODUCTION_PRAGMAS = {
+    'journal_mode': 'WAL',
+    'synchronous': 'NORMAL',
+    'mmap_size': 256 * 1024 * 1024,
+    'cache_size': -64 * 1024,
+    'busy_timeout': 20000,
+}
+
+if YATUBE_PROFILE == 'production':
+    DATABASES['default']['CONN_MAX_AGE'] = 600
+    SQLITE_PRAGMAS = SQLITE_PRODUCTION_PRAGMAS
+
+# Read replicas: extra SQLite files refreshed by `manage.py sync_replicas`.
+DB_REPLICAS = int(os.getenv('DB_REPLICAS', 0))
+
+for number in range(1, DB_REPLICAS + 1):
+    DATABASES[f'replica{number}'] = {
+        'ENGINE': 'core.backends.sqlite3',
+        'NAME': os.path.join(BASE_DIR, f'db.replica{number}.sqlite3'),
+        'CONN_MAX_AGE': DATABASES['default'].get('CONN_MAX_AGE', 0),
+        'OPTIONS': DATABASES['default']['OPTIONS'],
+        'TEST': {'MIRROR': 'default'},
+    }
+
+DATABASE_ROUTERS = ['core.routers.ReplicaRouter']
+
+REPLICA_DATABASES = [alias for alias in DATABASES if alias != 'default']
+
+# Only the feed and detail pages read these models from a replica, and
+# only inside requests: workers, commands, signal handlers and jobs read
+# the primary (core.routers). Users stay on the primary too: signup,
+# login and password change read the user right after writing it, and a
+# lagging replica would fail the login or log the user out on a stale
+# password hash.
+REPLICA_READ_MODELS = ('posts.group', 'posts.post', 'posts.comment',
+                       'posts.follow')
+
+# After these views the user reads from the primary for a while.
+REPLICA_STICKY_VIEWS = (
+    'posts:post_create',
+    'posts:post_edit',
+    'posts:add_comment',
+    'posts:profile_follow',
+    'posts:profile_unfollow',
+    'posts:notification_read',
+    'posts:notification_read_all',
+)
+
+REPLICA_PIN_SECONDS = 5
+
 
 # Password validation
 # https://docs.djangoproject.com/en/2.2/ref/settings/#auth-password-validators
@@ -132,22 +208,211 @@ STATIC_URL = '/static/'
 
 STATICFILES_DIRS = (os.path.join(BASE_DIR, 'static'),)
 
+# `manage.py collectstatic` gathers assets into STATIC_ROOT. In production
+# they get content-hashed names, a staticfiles.json manifest and
+# precompressed .gz/.br copies (brotli is optional), and yatube.wsgi serves
+# them through core.static.StaticFiles: hashed files are immutable, the
+# rest are cached for STATIC_MAX_AGE seconds. Templates link the hashed
+# names only with DEBUG off.
+STATIC_ROOT = os.path.join(BASE_DIR, 'collected_static')
+STATIC_MAX_AGE = 60
+
+if YATUBE_PROFILE == 'production':
+    STATICFILES_STORAGE = (
+        'core.backends.storage.CompressedManifestStaticFilesStorage')
+
+# core.compression.CompressionMiddleware compresses text responses of at
+# least COMPRESSION_MIN_LENGTH bytes. Compressed bodies are kept in a
+# per-process LRU of COMPRESSION_CACHE_SIZE bytes keyed by a hash of the
+# uncompressed body, so repeated pages are not compressed again. See
+# `manage.py bench_compression` for the cost of each level.
+COMPRESSION_MIN_LENGTH = 200
+COMPRESSION_LEVELS = {'gzip': 6, 'br': 5}
+COMPRESSION_CACHE_SIZE = 16 * 1024 * 1024
+
 LOGIN_URL = 'users:login'
 LOGIN_REDIRECT_URL = 'posts:index'
 # LOGOUT_REDIRECT_URL = 'posts:index'
 
-EMAIL_BACKEND = 'django.core.mail.backends.filebased.EmailBackend'
+# Mail is queued in the jobs.Email table and delivered in batches by
+# `manage.py send_emails` through OUTBOX_EMAIL_BACKEND, see jobs.mail.
+# Set OUTBOX_EMAIL_BACKEND=django.core.mail.backends.smtp.EmailBackend
+# and EMAIL_HOST/EMAIL_PORT to deliver to an SMTP server.
+EMAIL_BACKEND = 'jobs.mail.OutboxBackend'
+OUTBOX_EMAIL_BACKEND = os.getenv(
+    'OUTBOX_EMAIL_BACKEND', 'django.core.mail.backends.filebased.EmailBackend')
+OUTBOX_BATCH_SIZE = 100
+EMAIL_HOST = os.getenv('EMAIL_HOST', 'localhost')
+EMAIL_PORT = int(os.getenv('EMAIL_PORT', 25))
 EMAIL_FILE_PATH = os.path.join(BASE_DIR, 'sent_emails')
 
 PAGINATION = 10
 
+# 'django' renders post cards with includes/post.html, 'python' with the
+# equivalent precompiled renderer in posts.renderers.
+POST_CARD_RENDERER = 'python' if YATUBE_PROFILE == 'production' else 'django'
+
 CSRF_FAILURE_VIEW = 'core.views.csrf_failure'
 
 MEDIA_URL = '/media/'
 MEDIA_ROOT = os.path.join(BASE_DIR, 'media')
 
+# Uploads are served by core.views.media, also in production. Thumbnails
+# under THUMBNAIL_PREFIX are immutable, other files are cached for
+# MEDIA_MAX_AGE seconds. Set MEDIA_SENDFILE_HEADER to 'X-Accel-Redirect'
+# (nginx, with an internal location at MEDIA_INTERNAL_URL pointing to
+# MEDIA_ROOT) or 'X-Sendfile' (Apache) to hand the body off to the web
+# server.
+MEDIA_MAX_AGE = 24 * 60 * 60
+MEDIA_SENDFILE_HEADER = os.getenv('MEDIA_SENDFILE_HEADER', '')
+MEDIA_INTERNAL_URL = '/protected-media/'
+THUMBNAIL_PREFIX = 'cache/'
+
+# Signed /img/<signature>/<w>x<h>/<path> URLs resize uploads on first
+# request in a pool of IMAGE_WORKERS processes (0 resizes in the request
+# thread) and keep the results under MEDIA_ROOT/IMAGE_CACHE_PREFIX, see
+# core.images. The cache is trimmed to 90% of IMAGE_CACHE_SIZE bytes,
+# least recently used first, when it overflows and by
+# `manage.py prune_images`.
+IMAGE_CACHE_PREFIX = 'resized/'
+IMAGE_CACHE_SIZE = 1024 * 1024 * 1024
+IMAGE_CACHE_TOUCH = 60 * 60
+IMAGE_MAX_SIZE = 2000
+IMAGE_QUALITY = 85
+IMAGE_WORKERS = int(os.getenv('IMAGE_WORKERS', 2))
+IMAGE_RESIZE_TIMEOUT = 30
+
 CACHES = {
     'default': {
-        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
-    }
+        'BACKEND': 'core.backends.cache.InstrumentedLocMemCache',
+    },
 }
+
+# Sliding-window rate limits per URL name, see core.ratelimit. Rates are
+# `N/s|m|h|d`: at most N requests per period. RATE_LIMIT_STORE 'database'
+# keeps the counters in a table of the main database, shared by every
+# worker; 'cache' keeps them in RATE_LIMIT_CACHE, which needs an atomic
+# incr that keeps the timeout (locmem, memcached, Redis; not the database
+# or file cache). Behind a proxy set RATE_LIMIT_IP_META to the header
+# with the client address, e.g. 'HTTP_X_REAL_IP'.
+RATE_LIMIT_STORE = 'database' if YATUBE_PROFILE == 'production' else 'cache'
+RATE_LIMIT_CACHE = 'default'
+RATE_LIMIT_IP_META = 'REMOTE_ADDR'
+RATE_LIMITS = {
+    'posts:post_create': {'user': '10/m', 'ip': '30/m'},
+    'posts:add_comment': {'user': '20/m', 'ip': '60/m'},
+    'posts:profile_follow': {
+        'user': '30/m', 'ip': '100/m', 'methods': ('GET', 'POST'),
+    },
+    'users:signup': {'ip': '5/h'},
+}
+
+# Followed author ids per user, see posts.follows. The cache is per
+# process and invalidation only reaches the current one, so other
+# processes pick up follow changes when the entry expires.
+FOLLOW_CACHE_TIMEOUT = 15
+
+# Authors in the profile sidebar, see `manage.py recommend_authors`.
+RECOMMENDATIONS_SHOWN = 5
+
+# Trending posts, see posts.trending. Changing the half-life or the
+# landmark requires `manage.py compact_trending --rebuild`.
+TRENDING_HALF_LIFE = 6 * 60 * 60
+TRENDING_LANDMARK = 1640995200  # 2022-01-01 UTC
+TRENDING_WEIGHTS = {
+    'comment': 1.0,
+}
+TRENDING_MIN_SCORE = 0.01
+TRENDING_TOP_SIZE = 100
+TRENDING_CACHE_TIMEOUT = 60
+
+# Most active authors shown per group in /groups/, see posts.group_stats.
+GROUP_TOP_AUTHORS = 3
+
+# Sampling profiler, see core.profiling. Requests with a signed
+# X-Profile header (`manage.py profiles --token`) are always profiled.
+PROFILER_SAMPLE_RATE = float(os.getenv('PROFILER_SAMPLE_RATE', 0))
+PROFILER_INTERVAL = 0.005
+PROFILER_TOKEN_MAX_AGE = 24 * 60 * 60
+PROFILER_DIR = os.path.join(BASE_DIR, 'profiles')
+PROFILER_MAX_FILES = 200
+
+# Slow query log and per-fingerprint statistics, see core.querylog.
+SLOW_QUERY_MS = 100
+QUERY_STATS_INTERVAL = 60
+QUERY_STATS_FILE = os.path.join(BASE_DIR, 'logs', 'query_stats.jsonl')
+
+LOGGING = {
+    'version': 1,
+    'disable_existing_loggers': False,
+    'handlers': {
+        'console': {
+            'class': 'logging.StreamHandler',
+        },
+    },
+    'loggers': {
+        'core.querylog': {
+            'handlers': ['console'],
+            'level': 'WARNING',
+            'propagate': False,
+        },
+    },
+}
+
+THUMBNAIL_BACKEND = 'core.backends.thumbnail.InstrumentedThumbnailBackend'
+
+# Per-view metrics served at /metrics, see core.metrics. Without
+# METRICS_DIR (test runs) each process keeps its histograms to itself.
+METRICS_DIR = None if TESTING else os.path.join(BASE_DIR, 'metrics')
+METRICS_FLUSH_INTERVAL = 5
+METRICS_ALLOWED_IPS = ('127.0.0.1', '::1')
+
+# Request tracing, see core.tracing. A sampled `traceparent` header
+# forces tracing only when it comes from TRACING_TRUSTED_IPS (a proxy
+# that strips the header from clients); other requests are sampled at
+# TRACING_SAMPLE_RATE.
+TRACING_SAMPLE_RATE = float(os.getenv('TRACING_SAMPLE_RATE', 0))
+TRACING_TRUSTED_IPS = ()
+TRACING_EXPORT_INTERVAL = 2
+TRACING_DIR = os.path.join(BASE_DIR, 'traces')
+TRACING_SERVICE_NAME = 'yatube'
+
+# Background jobs stored in the main database, see jobs.queue. Failed
+# jobs are retried after JOBS_BACKOFF_BASE * 2 ** (attempt - 1) seconds
+# (capped at JOBS_MAX_BACKOFF, with jitter); running jobs locked longer
+# than JOBS_LOCK_TIMEOUT are assumed lost and put back into the queue.
+JOBS_MAX_ATTEMPTS = 5
+JOBS_BACKOFF_BASE = 10
+JOBS_MAX_BACKOFF = 60 * 60
+JOBS_LOCK_TIMEOUT = 10 * 60
+JOBS_BATCH_SIZE = 10
+JOBS_POLL_INTERVAL = 1
+
+# Post and comment notifications, see posts.notifications. Recipients
+# are notified in chunks of NOTIFICATIONS_CHUNK_SIZE (kept below the
+# SQLite parameter limit). Unread counters are kept up to date in the
+# cache and recounted from the database every
+# NOTIFICATIONS_CACHE_TIMEOUT seconds; with a per-process cache this is
+# also how web processes see the workers' changes. Read notifications
+# are deleted after NOTIFICATIONS_KEEP_DAYS.
+NOTIFICATIONS_CHUNK_SIZE = 500
+NOTIFICATIONS_CACHE_TIMEOUT = 60
+NOTIFICATIONS_KEEP_DAYS = 30
+
+# The ASGI entry point yatube.asgi serves the whole site, see core.asgi:
+# requests run in ASGI_THREADS threads, and the independent lookups of
+# the async read views run concurrently in ASGI_QUERY_THREADS more.
+ASGI_THREADS = 8
+ASGI_QUERY_THREADS = 8
+
+# Live updates over Server-Sent Events, served by yatube.asgi under
+# LIVE_URL, see posts.live. One poller per process reads the change log
+# every LIVE_POLL_INTERVAL seconds.
+LIVE_URL = '/live/'
+LIVE_POLL_INTERVAL = 0.5
+LIVE_BATCH_SIZE = 500
+LIVE_BACKLOG_SIZE = 100
+LIVE_QUEUE_SIZE = 100
+LIVE_KEEPALIVE = 15
+LIVE_RETRY = 3
+LIVE_CHANGES_KEEP = 24 * 60 * 60
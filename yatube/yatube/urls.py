@@ -1,8 +1,9 @@
 from django.conf import settings
-from django.conf.urls.static import static
 from django.contrib import admin
 from django.urls import include, path
 
+from core.views import image, media, metrics
+
 urlpatterns = [
     path('', include('posts.urls', namespace='posts')),
     path('admin/', admin.site.urls),
@@ -10,13 +11,12 @@ urlpatterns = [
     path('auth/', include('django.contrib.auth.urls')),
     path('users/', include('users.urls', namespace='users')),
     path('about/', include('about.urls', namespace='about')),
+    path('metrics', metrics, name='metrics'),
+    path(settings.MEDIA_URL.lstrip('/') + '<path:path>', media, name='media'),
+    path('img/<signature>/<int:width>x<int:height>/<path:path>', image,
+         name='image'),
 ]
 
 handler404 = 'core.views.page_not_found'
 handler500 = 'core.views.server_error'
 handler403 = 'core.views.permission_denied'
-
-if settings.DEBUG:
-    urlpatterns += static(
-        settings.MEDIA_URL, document_root=settings.MEDIA_ROOT
-    )